@@ -0,0 +1,60 @@
+"""Benchmark methylene spacer construction.
+
+Times ``mb.recipes.Alkane(n, cap_front=False, cap_end=False)`` against the template-backed ``Spacer(n)`` for spacer
+lengths 1-20, along with the betaine monomers that use them.
+
+Usage
+-----
+python devtools/benchmark_spacers.py --repeats 5 --max-length 20
+"""
+
+import argparse
+import time
+
+import mbuild as mb
+
+from mbuild_polybuild.aa_fragments import Spacer
+from mbuild_polybuild.aa_monomers import Cbma, Sbaa, Sbma
+
+
+def _best_time(func, repeats):
+    """Return the fastest of ``repeats`` calls in milliseconds."""
+
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+
+    return best * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--repeats", type=int, default=5, help="Number of repeats, the fastest is reported.")
+    parser.add_argument("--max-length", type=int, default=20, help="Longest spacer length to time.")
+    args = parser.parse_args(argv)
+
+    # Build the template once so that its one-time cost is not attributed to the first length
+    Spacer(n=args.max_length)
+
+    header = "{:>6} {:>12} {:>12} {:>8} {:>12} {:>12} {:>12}".format(
+        "n", "Alkane (ms)", "Spacer (ms)", "speedup", "Sbma (ms)", "Sbaa (ms)", "Cbma (ms)"
+    )
+    print(header)
+    print("-" * len(header))
+    for n in range(1, args.max_length + 1):
+        t_alkane = _best_time(lambda: mb.recipes.Alkane(n=n, cap_front=False, cap_end=False), args.repeats)
+        t_spacer = _best_time(lambda: Spacer(n=n), args.repeats)
+        t_monomers = [
+            _best_time(lambda: monomer(spacer_backbone=n, spacer_ion=n), args.repeats) for monomer in (Sbma, Sbaa, Cbma)
+        ]
+        print(
+            "{:>6d} {:>12.2f} {:>12.2f} {:>8.1f} {:>12.2f} {:>12.2f} {:>12.2f}".format(
+                n, t_alkane, t_spacer, t_alkane / t_spacer, *t_monomers
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,7 @@ with other components to build complex molecular systems.
 Available Fragments
 -------------------
 - `C`: A quaternary carbon moiety.
+- `Spacer`: A methylene spacer, -(CH2)n-.
 
 Examples
 --------
@@ -16,3 +17,4 @@ Examples
 """
 
 from mbuild_polybuild.aa_fragments.c_quaternary import C as C
+from mbuild_polybuild.aa_fragments.spacer import Spacer as Spacer
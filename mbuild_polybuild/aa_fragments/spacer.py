@@ -0,0 +1,136 @@
+"""
+This module defines the `Spacer` class, representing a methylene spacer, -(CH2)n-.
+
+The `Spacer` class is a specialized `mb.Compound` that slices its coordinates from an all-trans methylene template
+computed once per process, so spacers of any length are created without building the chain one CH2 at a time.
+
+Examples
+--------
+>>> from mbuild_polybuild.aa_fragments.spacer import Spacer
+>>> spacer = Spacer(n=3)
+>>> spacer.save("spacer.mol2", overwrite=True)
+"""
+
+import numpy as np
+
+import mbuild as mb
+
+_BOND_CC = 0.154  # nm
+_BOND_CH = 0.109  # nm
+_ANGLE_CCC = np.deg2rad(112.0)
+_ANGLE_HCH = np.deg2rad(107.8)
+
+_SPACER_TABLE = {"length": 0, "carbons": None, "hydrogens": None}
+
+
+def _spacer_table(n):
+    """
+    Return the all-trans methylene template, extending it if it has fewer than ``n`` carbons.
+
+    The template is a planar zigzag with carbon ``k`` at row ``k + 1`` of the carbon array. Rows 0 and ``length + 1``
+    are virtual carbons marking where the neighboring groups would bond, and are used to orient the ports.
+
+    Parameters
+    ----------
+    n : int
+        Minimum number of methylene units required.
+
+    Returns
+    -------
+    carbons : numpy.ndarray
+        Array of shape (length + 2, 3) of carbon positions in nm, including the virtual carbons at either end.
+    hydrogens : numpy.ndarray
+        Array of shape (length, 2, 3) of hydrogen positions in nm.
+    """
+
+    if _SPACER_TABLE["length"] < n:
+        length = max(n, 2 * _SPACER_TABLE["length"], 20)
+
+        index = np.arange(-1, length + 1)
+        carbons = np.zeros((length + 2, 3))
+        carbons[:, 0] = index * _BOND_CC * np.sin(_ANGLE_CCC / 2)
+        carbons[:, 1] = (index % 2) * _BOND_CC * np.cos(_ANGLE_CCC / 2)
+
+        # Hydrogens lie in the plane bisecting each H-C-H angle, pointing away from both carbon neighbors
+        bisector = 2 * carbons[1:-1] - carbons[:-2] - carbons[2:]
+        bisector /= np.linalg.norm(bisector, axis=1)[:, None]
+        normal = np.array([0.0, 0.0, 1.0])
+        hydrogens = np.empty((length, 2, 3))
+        for i, sign in enumerate([1, -1]):
+            hydrogens[:, i] = carbons[1:-1] + _BOND_CH * (
+                np.cos(_ANGLE_HCH / 2) * bisector + sign * np.sin(_ANGLE_HCH / 2) * normal
+            )
+
+        _SPACER_TABLE.update({"length": length, "carbons": carbons, "hydrogens": hydrogens})
+
+    return _SPACER_TABLE["carbons"], _SPACER_TABLE["hydrogens"]
+
+
+class Spacer(mb.Compound):
+    """
+    A methylene spacer, -(CH2)n-.
+
+    This class slices an all-trans methylene chain from a template computed once per process, and replaces
+    ``mb.recipes.Alkane(n=n, cap_front=False, cap_end=False)`` in the betaine monomers.
+
+    Ports
+    -----
+    - `up`: Connection to the first carbon atom.
+    - `down`: Connection to the last carbon atom.
+
+    Parameters
+    ----------
+    n : int, optional, default=1
+        Number of methylene groups.
+
+    Examples
+    --------
+    >>> from mbuild_polybuild.aa_fragments.spacer import Spacer
+    >>> spacer = Spacer(n=3)
+    """
+
+    def __init__(self, n=1):
+        """
+        Initialize the methylene spacer.
+
+        This method slices ``n`` methylene units from the template, with the first carbon at the origin, and sets up
+        its ports along the direction of the neighboring carbon bonds.
+
+        Ports
+        -----
+        - `up`: Connection to the first carbon atom.
+        - `down`: Connection to the last carbon atom.
+
+        Parameters
+        ----------
+        n : int, optional, default=1
+            Number of methylene groups.
+        """
+        super(Spacer, self).__init__()
+
+        if not isinstance(n, (int, np.integer)) or n < 1:
+            raise ValueError("n must be an integer of 1 or more")
+
+        carbons, hydrogens = _spacer_table(n)
+
+        previous = None
+        for i in range(n):
+            carbon = mb.Particle(name="C", element="C", pos=carbons[i + 1])
+            self.add(carbon)
+            for pos in hydrogens[i]:
+                hydrogen = mb.Particle(name="H", element="H", pos=pos)
+                self.add(hydrogen)
+                self.add_bond((carbon, hydrogen))
+            if previous is None:
+                first = carbon
+            else:
+                self.add_bond((previous, carbon))
+            previous = carbon
+
+        self.add(mb.Port(anchor=first, orientation=carbons[0] - carbons[1], separation=_BOND_CC / 2), "up")
+        self.add(mb.Port(anchor=previous, orientation=carbons[n + 1] - carbons[n], separation=_BOND_CC / 2), "down")
+
+
+if __name__ == "__main__":
+    m = Spacer()
+    m.save("spacer.mol2", overwrite=True)
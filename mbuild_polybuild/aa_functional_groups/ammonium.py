@@ -10,10 +10,35 @@ Examples
 >>> ammonium.save("ammonium.mol2", overwrite=True)
 """
 
+from functools import lru_cache
+
 import mbuild as mb
 from mbuild.port import Port
 
 import mbuild_polybuild.toolbox as tb
+from mbuild_polybuild.transforms import batch_force_overlap
+
+
+@lru_cache(maxsize=None)
+def _alkyl_template(n):
+    """
+    Alkyl substituent template with an 'up' port, built once per chain length and process.
+
+    The template must not be modified, clone it instead.
+
+    Parameters
+    ----------
+    n : int
+        Number of carbon atoms.
+
+    Returns
+    -------
+    tuple[mb.Compound, numpy.ndarray]
+        The template and its ``xyz_with_ports``.
+    """
+
+    template = mb.recipes.Alkane(n=n, cap_front=False)
+    return template, template.xyz_with_ports
 
 
 class Ammonium(mb.Compound):
@@ -92,7 +117,6 @@ class Ammonium(mb.Compound):
             raise ValueError("The number of substituents is set to zero.")
 
         if custom is not None:
-            flag_alkane = False
             try:
                 l_compounds = len(custom)
             except Exception:
@@ -107,7 +131,6 @@ class Ammonium(mb.Compound):
             if l_compounds > 1 and l_compounds != substituents:
                 raise ValueError("The number of given Compounds must equal the number of requested substituents.")
         elif alkane is not None:
-            flag_alkane = True
             try:
                 l_compounds = len(alkane)
             except Exception:
@@ -122,10 +145,18 @@ class Ammonium(mb.Compound):
                     "If list of alkane lengths is provided, it must be the of the length `substituents` defines."
                 )
 
-            custom = []
-            for l_chain in alkane:
-                Alkane = mb.recipes.Alkane(n=l_chain, cap_front=False)
-                custom.append(Alkane)
+            # Clone cached templates and attach all alkyl chains with one batched transform
+            templates = {l_chain: _alkyl_template(l_chain) for l_chain in set(alkane)}
+            custom = [mb.clone(templates[l_chain][0]) for l_chain in alkane]
+            for i, compound in enumerate(custom):
+                self.add(compound, "substituent{}".format(i + 1))
+            batch_force_overlap(
+                move_these=custom,
+                from_ports=[compound["up"] for compound in custom],
+                to_ports=[self["port[{}]".format(i)] for i in range(substituents)],
+                positions=[templates[l_chain][1] for l_chain in alkane],
+            )
+            return
 
         for i in range(substituents):
             if l_compounds == 1:
@@ -136,47 +167,44 @@ class Ammonium(mb.Compound):
             self.add(compound, "substituent{}".format(i + 1))
 
             # Get port name
-            if flag_alkane:
-                port_name = "up"
-            else:
-                port_labels = [key for key, val in compound.labels.items() if isinstance(val, Port)]
-                if len(port_labels) > 1:
-                    if ports is None:
-                        raise ValueError(
-                            "Substituent custom[{}], has ports, {}. Define the port you want to use with the `ports` list input.".format(
-                                i, port_labels
-                            )
-                        )
-                    elif len(ports) != l_compounds:
-                        raise ValueError(
-                            "The `ports` list must be the same length as the custom list to avoid ambiguity. Buffer with None for substituents with only one port option."
+            port_labels = [key for key, val in compound.labels.items() if isinstance(val, Port)]
+            if len(port_labels) > 1:
+                if ports is None:
+                    raise ValueError(
+                        "Substituent custom[{}], has ports, {}. Define the port you want to use with the `ports` list input.".format(
+                            i, port_labels
                         )
-                    elif not isinstance(ports[i], str):
-                        raise ValueError(
-                            "The port name for custom[{}] is required, but the provided value, {}, is insufficient.".format(
-                                i, ports[i]
-                            )
+                    )
+                elif len(ports) != l_compounds:
+                    raise ValueError(
+                        "The `ports` list must be the same length as the custom list to avoid ambiguity. Buffer with None for substituents with only one port option."
+                    )
+                elif not isinstance(ports[i], str):
+                    raise ValueError(
+                        "The port name for custom[{}] is required, but the provided value, {}, is insufficient.".format(
+                            i, ports[i]
                         )
-                    elif ports[i] not in port_labels:
-                        raise ValueError(
-                            "The provided port, {}, is not found in the ports for custom[{}], {}".format(
-                                ports[i], i, port_labels
-                            )
+                    )
+                elif ports[i] not in port_labels:
+                    raise ValueError(
+                        "The provided port, {}, is not found in the ports for custom[{}], {}".format(
+                            ports[i], i, port_labels
                         )
-                    else:
-                        port_name = ports[i]
-                        # Hoist other port label to top level.
-                        for name in port_labels:
-                            if name != port_name:
-                                self.add(self["substituent{}".format(i + 1)][name], name, containment=False)
+                    )
                 else:
-                    if ports[i] not in port_labels:
-                        raise ValueError(
-                            "The provided port, {}, is not found in the ports for custom[{}], {}".format(
-                                ports[i], i, port_labels
-                            )
+                    port_name = ports[i]
+                    # Hoist other port label to top level.
+                    for name in port_labels:
+                        if name != port_name:
+                            self.add(self["substituent{}".format(i + 1)][name], name, containment=False)
+            else:
+                if ports[i] not in port_labels:
+                    raise ValueError(
+                        "The provided port, {}, is not found in the ports for custom[{}], {}".format(
+                            ports[i], i, port_labels
                         )
-                    port_name = port_labels[0]
+                    )
+                port_name = port_labels[0]
 
             # Make bond
             mb.force_overlap(
@@ -5,6 +5,7 @@ import mbuild as mb
 from mbuild_polybuild.aa_monomers.methacrylate import Methacrylate
 from mbuild_polybuild.aa_functional_groups.ammonium import Ammonium
 from mbuild_polybuild.aa_functional_groups.sulfonate import Sulfonate
+from mbuild_polybuild.aa_fragments.spacer import Spacer
 
 
 class Sbma(mb.Compound):
@@ -40,9 +41,9 @@ class Sbma(mb.Compound):
 
         # Create Moieties
         methacrylate = Methacrylate(cap_branch=False, chiral_switch=switch_backbone_chiral)
-        spacer_b = mb.recipes.Alkane(n=spacer_backbone, cap_front=False, cap_end=False)
+        spacer_b = Spacer(n=spacer_backbone)
         ammonium = Ammonium(substituents=2, alkane=[1])
-        spacer_i = mb.recipes.Alkane(n=spacer_ion, cap_front=False, cap_end=False)
+        spacer_i = Spacer(n=spacer_ion)
         sulfonate = Sulfonate()
 
         # Assemble Pieces
@@ -0,0 +1,27 @@
+"""This module contains analysis tools for built and simulated polymer systems.
+
+Functions
+---------
+- find_stereocenters: Locate the backbone stereocenters of a compound.
+- chirality: Signed chirality of each stereocenter in each frame.
+- tacticity: Meso/racemo dyad and triad statistics for each frame.
+- dyad_sequence: String of "m" and "r" dyads for one frame.
+- chain_units: Position of each monomer or free particle along each chain.
+- chain_dimensions: Radius of gyration and end-to-end distance of each chain.
+- internal_distances: Mean squared internal distance as a function of the separation along the chain.
+- persistence_length: Bond orientation correlation along the chain and the persistence length.
+
+Classes
+-------
+- Stereocenters: Particle indices and connectivity of backbone stereocenters.
+"""
+
+from mbuild_polybuild.analysis.tacticity import Stereocenters as Stereocenters
+from mbuild_polybuild.analysis.tacticity import chirality as chirality
+from mbuild_polybuild.analysis.tacticity import dyad_sequence as dyad_sequence
+from mbuild_polybuild.analysis.tacticity import find_stereocenters as find_stereocenters
+from mbuild_polybuild.analysis.tacticity import tacticity as tacticity
+from mbuild_polybuild.analysis.conformation import chain_dimensions as chain_dimensions
+from mbuild_polybuild.analysis.conformation import chain_units as chain_units
+from mbuild_polybuild.analysis.conformation import internal_distances as internal_distances
+from mbuild_polybuild.analysis.conformation import persistence_length as persistence_length
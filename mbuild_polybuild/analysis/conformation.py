@@ -0,0 +1,288 @@
+"""Conformation Module
+
+This module computes chain conformation statistics, the radius of gyration, end-to-end distance, mean squared internal
+distances, and persistence length, for every chain of a system and every frame at once. Chains are taken from the
+``chain_index`` of :class:`mbuild_polybuild.arrays.SystemArrays`, so the outputs of the chain, brush, network, and
+polydisperse builders can be checked before they are simulated.
+
+Per-chain sums are segment reductions written as sparse matrix products over the particles, so thousands of chains
+and many frames are reduced together. Chains are unwrapped across periodic boundaries by accumulating minimum image
+displacements between consecutive particles of each chain.
+
+Statistics along the chain use one point per monomer, the center of mass of its particles, or one point per particle
+for particles outside monomers, e.g., ``Bead`` chains.
+
+Functions
+---------
+- chain_units: Position of each monomer or free particle along each chain.
+- chain_dimensions: Radius of gyration and end-to-end distance of each chain.
+- internal_distances: Mean squared internal distance as a function of the separation along the chain.
+- persistence_length: Bond orientation correlation along the chain and the persistence length.
+"""
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from mbuild_polybuild.arrays import to_arrays
+
+
+def _frames(system, positions, box):
+    """System arrays, positions of shape (F, N, 3), box, and whether a single frame was given."""
+
+    if not hasattr(system, "chain_index"):
+        system = to_arrays(system)
+    if positions is None:
+        positions = system.positions
+        if box is None:
+            box = system.box
+    elif hasattr(positions, "unitcell_lengths"):
+        if box is None:
+            box = positions.unitcell_lengths
+        positions = positions.xyz
+    positions = np.asarray(positions, dtype=float)
+    single = positions.ndim == 2
+    if single:
+        positions = positions[None]
+    if box is not None:
+        box = np.asarray(box, dtype=float)
+        box = box.reshape(-1, 1, 3) if box.ndim == 2 else box
+
+    return system, positions, box, single
+
+
+def _unwrap(positions, chain_index, box):
+    """Unwrap each chain by accumulating minimum image displacements between its consecutive particles."""
+
+    if box is None:
+        return positions
+    order = np.argsort(chain_index, kind="stable")
+    ordered = positions[:, order]
+    steps = np.diff(ordered, axis=1)
+    steps -= box * np.round(steps / box)
+    # Restart the accumulation at the first particle of each chain
+    starts = np.concatenate([[True], np.diff(chain_index[order]) != 0])
+    steps[:, starts[1:]] = 0.0
+    first = np.maximum.accumulate(np.where(starts, np.arange(len(order)), 0))
+    travelled = np.concatenate([np.zeros_like(ordered[:, :1]), np.cumsum(steps, axis=1)], axis=1)
+    unwrapped = np.empty_like(positions)
+    unwrapped[:, order] = ordered[:, first] + travelled - travelled[:, first]
+
+    return unwrapped
+
+
+def _reduce(groups, weights, values, n_groups):
+    """Weighted means of ``values`` of shape (F, N, ...) over groups, returning shape (F, n_groups, ...)."""
+
+    totals = np.bincount(groups, weights=weights, minlength=n_groups)
+    matrix = csr_matrix((weights / totals[groups], (groups, np.arange(len(groups)))), shape=(n_groups, len(groups)))
+    n_frames = values.shape[0]
+    columns = np.moveaxis(values, 1, 0).reshape(len(groups), -1)
+    reduced = (matrix @ columns).reshape((n_groups, n_frames) + values.shape[2:])
+
+    return np.moveaxis(reduced, 0, 1)
+
+
+def _weights(system, mass_weighted):
+    """Particle weights, masses if all particles have one and ``mass_weighted``, otherwise ones."""
+
+    if mass_weighted and np.all(system.masses > 0):
+        return np.asarray(system.masses, dtype=float)
+    return np.ones(system.n_particles)
+
+
+def _units(system, positions, mass_weighted):
+    """Unit positions of shape (F, U, 3) ordered by chain, and the chain of each unit, from unwrapped positions."""
+
+    n = system.n_particles
+    keys = np.where(system.monomer_index >= 0, system.monomer_index, system.n_monomers + np.arange(n))
+    _, first, units = np.unique(keys, return_index=True, return_inverse=True)
+    chain = system.chain_index[first]
+    order = np.lexsort((first, chain))
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order))
+
+    return _reduce(rank[units], _weights(system, mass_weighted), positions, len(order)), chain[order]
+
+
+def chain_units(system, positions=None, box=None, mass_weighted=True):
+    """
+    Position of each monomer or free particle along each chain.
+
+    Parameters
+    ----------
+    system : SystemArrays or mb.Compound
+        System, whose ``chain_index`` and ``monomer_index`` define chains and monomers.
+    positions : numpy.ndarray or mdtraj.Trajectory, optional, default=None
+        Array of shape (N, 3) or (F, N, 3), or a trajectory. If None, the positions of ``system`` are used.
+    box : numpy.ndarray, optional, default=None
+        Orthorhombic box lengths of shape (3,) or (F, 3). If None, the box of ``system`` or the trajectory is used.
+    mass_weighted : bool, optional, default=True
+        If True, monomers are placed at their center of mass, otherwise at their centroid.
+
+    Returns
+    -------
+    positions : numpy.ndarray
+        Array of shape (F, U, 3) of unit positions, ordered by chain and by first particle within each chain.
+    chain : numpy.ndarray
+        Array of shape (U,) with the chain of each unit.
+    """
+
+    system, positions, box, single = _frames(system, positions, box)
+    units, chain = _units(system, _unwrap(positions, system.chain_index, box), mass_weighted)
+
+    return (units[0] if single else units), chain
+
+
+def chain_dimensions(system, positions=None, box=None, mass_weighted=True):
+    """
+    Radius of gyration and end-to-end distance of each chain.
+
+    Parameters
+    ----------
+    system : SystemArrays or mb.Compound
+        System, see :func:`chain_units`.
+    positions : numpy.ndarray or mdtraj.Trajectory, optional, default=None
+        Positions, see :func:`chain_units`.
+    box : numpy.ndarray, optional, default=None
+        Orthorhombic box lengths, see :func:`chain_units`.
+    mass_weighted : bool, optional, default=True
+        If True, the radius of gyration and units are mass weighted.
+
+    Returns
+    -------
+    dict
+        Dictionary with the following keys, with a leading frame dimension if ``positions`` has one:
+
+        - "rg": Radius of gyration of each chain in nm, of shape (C,).
+        - "ree": Distance between the first and last unit of each chain in nm, of shape (C,).
+        - "n_units": Number of monomers or free particles in each chain, of shape (C,).
+
+    Examples
+    --------
+    >>> from mbuild_polybuild.polydisperse import build_ensemble, sample_lengths
+    >>> ensemble = build_ensemble(Sbma(), lengths=sample_lengths(1000, 40, dispersity=1.2, seed=1))
+    >>> stats = chain_dimensions(ensemble)
+    >>> stats["rg"].mean(), np.mean(stats["ree"] ** 2)
+    """
+
+    system, positions, box, single = _frames(system, positions, box)
+    positions = _unwrap(positions, system.chain_index, box)
+    n_chains = system.n_chains
+    weights = _weights(system, mass_weighted)
+
+    centers = _reduce(system.chain_index, weights, positions, n_chains)
+    deviation = positions - centers[:, system.chain_index]
+    rg = np.sqrt(_reduce(system.chain_index, weights, np.einsum("fni,fni->fn", deviation, deviation), n_chains))
+
+    units, chain = _units(system, positions, mass_weighted)
+    starts = np.searchsorted(chain, np.arange(n_chains + 1))
+    ree = np.linalg.norm(units[:, starts[1:] - 1] - units[:, starts[:-1]], axis=2)
+
+    result = {"rg": rg, "ree": ree, "n_units": np.diff(starts)}
+    if single:
+        result["rg"], result["ree"] = rg[0], ree[0]
+
+    return result
+
+
+def internal_distances(system, positions=None, box=None, mass_weighted=True):
+    """
+    Mean squared internal distance as a function of the separation along the chain.
+
+    The mean squared distance between units ``n`` apart, divided by ``n``, approaches a plateau for ideal chains
+    and grows for swollen chains, and is a sensitive check of generated conformations.
+
+    Parameters
+    ----------
+    system : SystemArrays or mb.Compound
+        System, see :func:`chain_units`.
+    positions : numpy.ndarray or mdtraj.Trajectory, optional, default=None
+        Positions, see :func:`chain_units`.
+    box : numpy.ndarray, optional, default=None
+        Orthorhombic box lengths, see :func:`chain_units`.
+    mass_weighted : bool, optional, default=True
+        If True, monomers are placed at their center of mass.
+
+    Returns
+    -------
+    separation : numpy.ndarray
+        Array of shape (L - 1,) of separations ``n`` from 1 to the longest chain length less one.
+    distances : numpy.ndarray
+        Array of shape (L - 1,), or (F, L - 1), of ``<R^2(n)> / n`` in nm^2 averaged over all chains.
+
+    Examples
+    --------
+    >>> separation, distances = internal_distances(chain)
+    >>> plt.plot(separation, distances)
+    """
+
+    system, positions, box, single = _frames(system, positions, box)
+    units, chain = _units(system, _unwrap(positions, system.chain_index, box), mass_weighted)
+    longest = np.bincount(chain).max() if len(chain) > 0 else 0
+
+    separation = np.arange(1, max(longest, 1))
+    distances = np.full((len(units), len(separation)), np.nan)
+    for k, n in enumerate(separation):
+        same = chain[n:] == chain[:-n]
+        delta = units[:, n:][:, same] - units[:, :-n][:, same]
+        distances[:, k] = np.einsum("fpi,fpi->f", delta, delta) / (n * np.count_nonzero(same))
+
+    return separation, distances[0] if single else distances
+
+
+def persistence_length(system, positions=None, box=None, mass_weighted=True):
+    """
+    Bond orientation correlation along the chain and the persistence length.
+
+    Bonds are the vectors between consecutive units of each chain. The persistence length is the mean bond length
+    divided by the decay rate of a single exponential fit through the origin of ``ln <cos(theta(s))>``, using the
+    separations ``s`` before the correlation first falls below 1/e.
+
+    Parameters
+    ----------
+    system : SystemArrays or mb.Compound
+        System, see :func:`chain_units`.
+    positions : numpy.ndarray or mdtraj.Trajectory, optional, default=None
+        Positions, see :func:`chain_units`.
+    box : numpy.ndarray, optional, default=None
+        Orthorhombic box lengths, see :func:`chain_units`.
+    mass_weighted : bool, optional, default=True
+        If True, monomers are placed at their center of mass.
+
+    Returns
+    -------
+    persistence : float or numpy.ndarray
+        Persistence length in nm, per frame if ``positions`` has a frame dimension.
+    correlation : numpy.ndarray
+        Array of shape (L - 1,), or (F, L - 1), of ``<cos(theta(s))>`` for ``s`` from 0 to L - 2.
+    """
+
+    system, positions, box, single = _frames(system, positions, box)
+    units, chain = _units(system, _unwrap(positions, system.chain_index, box), mass_weighted)
+    same = chain[1:] == chain[:-1]
+    bonds = (units[:, 1:] - units[:, :-1])[:, same]
+    bond_chain = chain[1:][same]
+    lengths = np.linalg.norm(bonds, axis=2)
+    directions = bonds / np.maximum(lengths, 1e-12)[:, :, None]
+    longest = np.bincount(bond_chain).max() if len(bond_chain) > 0 else 0
+
+    correlation = np.full((len(units), max(longest, 1)), np.nan)
+    correlation[:, 0] = 1.0
+    for s in range(1, longest):
+        pairs = bond_chain[s:] == bond_chain[:-s]
+        correlation[:, s] = np.einsum("fpi,fpi->f", directions[:, s:][:, pairs], directions[:, :-s][:, pairs]) / (
+            np.count_nonzero(pairs)
+        )
+
+    persistence = np.full(len(units), np.nan)
+    for f in range(len(units)):
+        below = np.flatnonzero(~(correlation[f] > np.exp(-1)))
+        stop = max(below[0] if len(below) > 0 else correlation.shape[1], 2)
+        s = np.arange(stop)
+        values = np.log(np.clip(correlation[f, :stop], 1e-12, None))
+        slope = np.sum(s * values) / np.sum(s * s)
+        persistence[f] = -lengths[f].mean() / slope if slope < 0 else np.inf
+
+    if single:
+        return persistence[0], correlation[0]
+    return persistence, correlation
@@ -0,0 +1,284 @@
+"""Tacticity Module
+
+This module verifies the stereochemistry of assembled chains from coordinates. The backbone carbons placed by the
+quaternary carbon fragment, ``aa_fragments.C``, in ``Methacrylate``, ``Acrylamide``, ``Ethylene``, and the betaine
+monomers built on them are located once from the compound hierarchy, after which the signed chirality of every center,
+and the resulting meso/racemo dyads and triads, are computed for all frames of a trajectory in one vectorized pass.
+
+The chirality of a center is the sign of the triple product of its bond vectors to the backbone carbon of its own
+monomer, its pendant group, and its other side group, so two consecutive centers with the same sign form a meso dyad.
+Monomers built with the same ``chiral_switch`` or ``switch_backbone_chiral`` value therefore form meso dyads.
+
+Functions
+---------
+- find_stereocenters: Locate the backbone stereocenters of a compound.
+- chirality: Signed chirality of each stereocenter in each frame.
+- tacticity: Meso/racemo dyad and triad statistics for each frame.
+- dyad_sequence: String of "m" and "r" dyads for one frame.
+
+Classes
+-------
+- Stereocenters: Particle indices and connectivity of backbone stereocenters.
+"""
+
+import numpy as np
+
+import mbuild as mb
+
+from mbuild_polybuild.aa_fragments.c_quaternary import C as C_qu
+from mbuild_polybuild.arrays import to_arrays
+from mbuild_polybuild.topology import adjacency
+
+
+class Stereocenters:
+    """
+    Particle indices and connectivity of backbone stereocenters.
+
+    Parameters
+    ----------
+    indices : numpy.ndarray
+        Array of shape (M, 4) of the particle indices of each center, its backbone carbon ``down`` neighbor in the
+        same monomer, its pendant group atom, and its other side group atom.
+    previous : numpy.ndarray
+        Array of shape (M,) with the index of the preceding stereocenter in the chain, or -1.
+    stereogenic : numpy.ndarray
+        Array of shape (M,) that is False where the two side groups have equal priority, e.g., a capped ``Ethylene``.
+    monomer_index : numpy.ndarray
+        Array of shape (M,) with the index of the monomer of each center, see
+        :class:`mbuild_polybuild.arrays.SystemArrays`.
+
+    Attributes
+    ----------
+    dyads : numpy.ndarray
+        Array of shape (D, 2) of consecutive stereocenter indices.
+    triads : numpy.ndarray
+        Array of shape (T, 3) of three consecutive stereocenter indices.
+    """
+
+    def __init__(self, indices, previous, stereogenic, monomer_index):
+        self.indices = np.asarray(indices, dtype=np.int64).reshape(-1, 4)
+        self.previous = np.asarray(previous, dtype=np.int64)
+        self.stereogenic = np.asarray(stereogenic, dtype=bool)
+        self.monomer_index = np.asarray(monomer_index, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.indices)
+
+    @property
+    def dyads(self):
+        current = np.flatnonzero(self.previous >= 0)
+        return np.column_stack([self.previous[current], current])
+
+    @property
+    def triads(self):
+        dyads = self.dyads
+        following = np.full(len(self), -1, dtype=np.int64)
+        following[dyads[:, 0]] = dyads[:, 1]
+        middle = dyads[following[dyads[:, 1]] >= 0, 1]
+        return np.column_stack([self.previous[middle], middle, following[middle]])
+
+
+def find_stereocenters(compound, system=None):
+    """
+    Locate the backbone stereocenters of a compound.
+
+    Each quaternary carbon fragment whose parent also holds a ``CH2`` moiety is a backbone center. Of its neighbors
+    within the same monomer, other than the ``CH2`` carbon, the two with the highest priority are the side groups.
+    Priority is ranked by atomic number, then by the sum of the atomic numbers of an atom's neighbors.
+
+    Parameters
+    ----------
+    compound : mb.Compound
+        A monomer, chain, or box of chains.
+    system : SystemArrays, optional, default=None
+        Arrays exported from ``compound``. If None, they are exported here.
+
+    Returns
+    -------
+    Stereocenters
+        Stereocenters in order of appearance.
+    """
+
+    if system is None:
+        system = to_arrays(compound)
+
+    index = {id(particle): i for i, particle in enumerate(compound.particles())}
+    backbones = []
+    stack = [compound]
+    while stack:
+        child = stack.pop()
+        centers = [x for x in child.children if isinstance(x, C_qu)]
+        ch2 = [x for x in child.children if isinstance(x, mb.lib.moieties.CH2)]
+        if centers and ch2:
+            center = index[id(next(centers[0].particles()))]
+            down = [index[id(x)] for x in ch2[0].particles() if x.name == "C"][0]
+            members = {index[id(x)] for x in child.particles()}
+            backbones.append((center, down, members))
+        elif child.children:
+            stack.extend(reversed([x for x in child.children if not isinstance(x, mb.Port)]))
+
+    graph = adjacency(system.bonds, system.n_particles)
+    atomic_numbers = system.atomic_numbers
+    priority = atomic_numbers * 10000 + graph @ atomic_numbers
+    down_to_center = {down: m for m, (_, down, _) in enumerate(backbones)}
+
+    indices = np.zeros((len(backbones), 4), dtype=np.int64)
+    previous = np.full(len(backbones), -1, dtype=np.int64)
+    stereogenic = np.ones(len(backbones), dtype=bool)
+    for m, (center, down, members) in enumerate(backbones):
+        neighbors = graph.indices[graph.indptr[center] : graph.indptr[center + 1]]
+        sides = []
+        for neighbor in neighbors:
+            if neighbor == down:
+                continue
+            if neighbor in down_to_center and down_to_center[neighbor] != m:
+                previous[m] = down_to_center[neighbor]
+            elif neighbor in members:
+                sides.append(neighbor)
+        if len(sides) < 2:
+            raise ValueError("Backbone center {} has fewer than two side groups.".format(center))
+        # Exclude the neighbor's contribution of the center itself from its priority
+        ranks = [priority[x] - atomic_numbers[center] for x in sides]
+        order = np.argsort(ranks)[::-1]
+        if ranks[order[0]] == ranks[order[1]] or (len(sides) > 2 and ranks[order[1]] == ranks[order[2]]):
+            stereogenic[m] = False
+        indices[m] = [center, down, sides[order[0]], sides[order[1]]]
+
+    return Stereocenters(indices, previous, stereogenic, system.monomer_index[indices[:, 0]])
+
+
+def _minimum_image(vectors, box):
+    """Apply the minimum image convention to vectors of shape (F, M, 3) for an orthorhombic box."""
+
+    if box is None:
+        return vectors
+    box = np.asarray(box, dtype=float)
+    box = box.reshape(-1, 1, 3) if box.ndim == 2 else box
+    return vectors - box * np.round(vectors / box)
+
+
+def chirality(positions, stereocenters, box=None):
+    """
+    Signed chirality of each stereocenter in each frame.
+
+    Parameters
+    ----------
+    positions : numpy.ndarray or mdtraj.Trajectory
+        Array of shape (N, 3) or (F, N, 3), a compound, or a trajectory.
+    stereocenters : Stereocenters
+        Stereocenters from :func:`find_stereocenters`.
+    box : numpy.ndarray, optional, default=None
+        Orthorhombic box lengths of shape (3,) or (F, 3), used to unwrap bond vectors. If None and ``positions`` is
+        a trajectory with unit cells, its ``unitcell_lengths`` are used.
+
+    Returns
+    -------
+    numpy.ndarray
+        Array of shape (M,) or (F, M) of +1 or -1, or 0 for centers that are not stereogenic.
+    """
+
+    if hasattr(positions, "unitcell_lengths"):
+        if box is None:
+            box = positions.unitcell_lengths
+        positions = positions.xyz
+    elif hasattr(positions, "xyz"):
+        positions = positions.xyz
+    positions = np.asarray(positions, dtype=float)
+    single = positions.ndim == 2
+    if single:
+        positions = positions[None]
+
+    points = positions[:, stereocenters.indices]
+    vectors = _minimum_image(points[:, :, 1:] - points[:, :, :1], box)
+    triple = np.einsum("fmi,fmi->fm", vectors[:, :, 0], np.cross(vectors[:, :, 1], vectors[:, :, 2]))
+    signs = np.sign(triple).astype(np.int64) * stereocenters.stereogenic
+
+    return signs[0] if single else signs
+
+
+def tacticity(positions, stereocenters, box=None):
+    """
+    Meso/racemo dyad and triad statistics for each frame.
+
+    Parameters
+    ----------
+    positions : numpy.ndarray or mdtraj.Trajectory
+        Array of shape (N, 3) or (F, N, 3), or a trajectory. Long trajectories may be analyzed in chunks, e.g., from
+        ``mdtraj.iterload``.
+    stereocenters : Stereocenters
+        Stereocenters from :func:`find_stereocenters`.
+    box : numpy.ndarray, optional, default=None
+        Orthorhombic box lengths, see :func:`chirality`.
+
+    Returns
+    -------
+    dict
+        Dictionary with the following keys, each an array with a leading frame dimension:
+
+        - "chirality": Signed chirality of shape (F, M).
+        - "meso": Boolean array of shape (F, D), True for meso dyads.
+        - "m", "r": Fractions of meso and racemo dyads of shape (F,).
+        - "mm", "mr", "rr": Fractions of isotactic, heterotactic, and syndiotactic triads of shape (F,).
+
+        Dyads and triads that include a center that is not stereogenic are excluded from the fractions.
+
+    Examples
+    --------
+    >>> centers = find_stereocenters(chain)
+    >>> stats = tacticity(chain.xyz, centers)
+    >>> stats["m"], stats["rr"]
+    """
+
+    signs = chirality(positions, stereocenters, box=box)
+    if signs.ndim == 1:
+        signs = signs[None]
+
+    dyads = stereocenters.dyads
+    meso = signs[:, dyads[:, 0]] == signs[:, dyads[:, 1]]
+    valid = stereocenters.stereogenic[dyads].all(axis=1)
+
+    triads = stereocenters.triads
+    first = signs[:, triads[:, 0]] == signs[:, triads[:, 1]]
+    second = signs[:, triads[:, 1]] == signs[:, triads[:, 2]]
+    valid_triads = stereocenters.stereogenic[triads].all(axis=1)
+
+    def fraction(values, mask):
+        count = np.count_nonzero(mask)
+        if count == 0:
+            return np.full(len(signs), np.nan)
+        return np.count_nonzero(values[:, mask], axis=1) / count
+
+    return {
+        "chirality": signs,
+        "meso": meso,
+        "m": fraction(meso, valid),
+        "r": fraction(~meso, valid),
+        "mm": fraction(first & second, valid_triads),
+        "mr": fraction(first ^ second, valid_triads),
+        "rr": fraction(~first & ~second, valid_triads),
+    }
+
+
+def dyad_sequence(signs, stereocenters):
+    """
+    String of "m" and "r" dyads for one frame.
+
+    Parameters
+    ----------
+    signs : numpy.ndarray
+        Array of shape (M,) from :func:`chirality`.
+    stereocenters : Stereocenters
+        Stereocenters from :func:`find_stereocenters`.
+
+    Returns
+    -------
+    str
+        One character per dyad in the order of ``stereocenters.dyads``, with "?" for dyads including a center that is
+        not stereogenic.
+    """
+
+    dyads = stereocenters.dyads
+    meso = signs[dyads[:, 0]] == signs[dyads[:, 1]]
+    valid = stereocenters.stereogenic[dyads].all(axis=1)
+
+    return "".join("?" if not ok else ("m" if x else "r") for x, ok in zip(meso, valid))
@@ -0,0 +1,303 @@
+"""Architectures Module
+
+This module assembles linear, star, comb, and bottlebrush polymers from monomer templates. Templates are built once
+and cloned, and the clones are placed with batched rigid transforms, see :mod:`mbuild_polybuild.transforms`, rather
+than one ``mb.force_overlap`` call per monomer or arm.
+
+Classes
+-------
+- Chain: A linear chain of monomer templates joined head to tail.
+- Star: Arms attached to every port of a core.
+- Comb: Side chains grafted onto the monomers of a backbone at a regular interval.
+- Bottlebrush: Side chains grafted onto every monomer of a backbone.
+"""
+
+import numpy as np
+
+import mbuild as mb
+
+from mbuild_polybuild.conformers import ConformerLibrary
+from mbuild_polybuild.transforms import (
+    _port_points,
+    apply_transform,
+    batch_force_overlap,
+    connect_ports,
+    port_transform,
+)
+
+
+def _relative_transform(head_port, tail_port):
+    """Transform that places ``head_port`` onto ``tail_port``, where both ports are at their template positions."""
+
+    head = _port_points(head_port)
+    tail = _port_points(tail_port)
+    rotation, translation = port_transform(
+        head[0][None], head[1][None], np.asarray(head[2])[None], tail[0][None], np.asarray(tail[2])[None]
+    )
+
+    return rotation[0], translation[0]
+
+
+class Chain(mb.Compound):
+    """
+    A linear chain of monomer templates joined head to tail.
+
+    The transform joining each pair of template types is computed once, and the pose of every monomer follows by
+    composing these transforms along the sequence, so all clones of a template are placed with one array operation.
+    The result matches joining the monomers one by one with ``mb.force_overlap``.
+
+    Ports
+    -----
+    - up: Head port of the first monomer.
+    - down: Tail port of the last monomer.
+
+    Parameters
+    ----------
+    monomers : mb.Compound or list[mb.Compound]
+        Monomer templates, which are cloned and not modified.
+    n : int, optional, default=1
+        Number of times to repeat ``sequence``.
+    sequence : str, optional, default="A"
+        Sequence of templates, where "A" is the first template in ``monomers``, "B" the second, and so on.
+    head_port : str, optional, default="up"
+        Label of the port on each template bonded to the previous monomer, e.g., "port[3]" for ``Acrylamide``.
+    tail_port : str, optional, default="down"
+        Label of the port on each template bonded to the next monomer.
+    conformers : int, optional, default=None
+        If given, a library of this many side chain conformers is sampled for each template with both backbone ports
+        fixed, see :class:`mbuild_polybuild.conformers.ConformerLibrary`, and each monomer takes a random one.
+        Otherwise every monomer keeps the conformation of its template.
+    seed : int, optional, default=None
+        Seed for reproducible conformer sampling.
+
+    Attributes
+    ----------
+    sequence : str
+        Full sequence of the chain.
+    monomers : list[mb.Compound]
+        Monomers in order along the chain.
+
+    Examples
+    --------
+    >>> from mbuild_polybuild.aa_monomers import Sbma
+    >>> chain = Chain([Sbma(), Sbma(switch_backbone_chiral=True)], n=10, sequence="AB")
+    """
+
+    def __init__(self, monomers, n=1, sequence="A", head_port="up", tail_port="down", conformers=None, seed=None):
+        super(Chain, self).__init__()
+
+        if isinstance(monomers, mb.Compound):
+            monomers = [monomers]
+        if not isinstance(n, (int, np.integer)) or n < 1:
+            raise ValueError("n must be an integer of 1 or more")
+        sequence = sequence * n
+        types = np.array([ord(x) - ord("A") for x in sequence], dtype=int)
+        if len(types) == 0 or types.min() < 0 or types.max() >= len(monomers):
+            raise ValueError(
+                "Sequence, {}, must consist of the first {} capital letters.".format(sequence, len(monomers))
+            )
+
+        # Compose the pose of each monomer from the transform of each consecutive pair of templates
+        relative = {}
+        rotations = np.empty((len(types), 3, 3))
+        translations = np.empty((len(types), 3))
+        rotations[0] = np.eye(3)
+        translations[0] = 0.0
+        for k in range(1, len(types)):
+            pair = (types[k - 1], types[k])
+            if pair not in relative:
+                relative[pair] = _relative_transform(monomers[pair[1]][head_port], monomers[pair[0]][tail_port])
+            rotation, translation = relative[pair]
+            rotations[k] = rotations[k - 1] @ rotation
+            translations[k] = rotations[k - 1] @ translation + translations[k - 1]
+
+        # Conformers keep the backbone ports of their template in place, so the transforms above still apply
+        rng = np.random.default_rng(seed)
+        units = [monomers[i].clone() for i in types]
+        for i, template in enumerate(monomers):
+            indices = np.flatnonzero(types == i)
+            if len(indices) > 0:
+                points = template.xyz_with_ports
+                if conformers:
+                    library = ConformerLibrary(
+                        template, n_conformers=conformers, fixed_ports=[head_port, tail_port], seed=rng
+                    )
+                    points = library.positions[rng.integers(library.n_conformers, size=len(indices))]
+                xyz = apply_transform(rotations[indices], translations[indices], points)
+                for k, pos in zip(indices, xyz):
+                    units[k].xyz_with_ports = pos
+
+        self.add(units, "monomer[$]")
+        connect_ports([unit[head_port] for unit in units[1:]], [unit[tail_port] for unit in units[:-1]])
+        self.add(units[0][head_port], "up", containment=False)
+        self.add(units[-1][tail_port], "down", containment=False)
+
+        self.sequence = sequence
+        self.monomers = units
+
+
+class Star(mb.Compound):
+    """
+    Arms attached to every port of a core.
+
+    Ports
+    -----
+    - arm_end[$]: Ports of the arms that are not used to attach them to the core, e.g., the "down" port of each
+      `Chain` arm.
+
+    Parameters
+    ----------
+    core : mb.Compound
+        Core compound, e.g., ``Bead(name="_C", Nports=4)`` or ``MHTA()``, which is added to this compound.
+    arm : mb.Compound
+        Arm template, e.g., a `Chain`, which is cloned for each port.
+    core_ports : list[str], optional, default=None
+        Labels of the core ports to attach arms to. If None, all available ports are used.
+    arm_port : str, optional, default="up"
+        Label of the port on the arm template bonded to the core.
+
+    Attributes
+    ----------
+    arms : list[mb.Compound]
+        Attached arms.
+
+    Examples
+    --------
+    >>> from mbuild_polybuild.cg_monomers import Bead
+    >>> star = Star(Bead(name="_C", Nports=4), Chain(Bead(name="_B"), n=20))
+    """
+
+    def __init__(self, core, arm, core_ports=None, arm_port="up"):
+        super(Star, self).__init__()
+
+        self.add(core, "core")
+        if core_ports is None:
+            ports = core.available_ports()
+        else:
+            ports = [core[label] for label in core_ports]
+
+        self.arms = [arm.clone() for _ in ports]
+        self.add(self.arms, "arm[$]")
+        batch_force_overlap(
+            self.arms,
+            [x[arm_port] for x in self.arms],
+            ports,
+            positions=[arm.xyz_with_ports] * len(ports),
+        )
+        for x in self.arms:
+            for port in x.available_ports():
+                self.add(port, "arm_end[$]", containment=False)
+
+
+class Comb(mb.Compound):
+    """
+    Side chains grafted onto the monomers of a backbone at a regular interval.
+
+    Ports
+    -----
+    - up: Head port of the backbone.
+    - down: Tail port of the backbone.
+    - graft_site[$]: Ports of the backbone monomers with a ``graft_port`` label that no side chain is grafted to.
+    - side_chain_end[$]: Ports of the side chains that are not used to graft them, e.g., the "down" port of each
+      `Chain` side chain.
+
+    Parameters
+    ----------
+    backbone : Chain
+        Backbone chain, which is added to this compound.
+    side_chain : mb.Compound
+        Side chain template, which is cloned for each grafting site.
+    graft_port : str or list[str], optional, default="port[1]"
+        Label of the port on each backbone monomer that side chains are grafted to, e.g., "port[1]" for
+        ``Methacrylate(cap_branch=False)`` or ["branch_up", "branch_down"] for ``Bead(name="_B", Nports=4)``.
+    graft_every : int, optional, default=1
+        Graft a side chain onto every ``graft_every`` backbone monomer.
+    offset : int, optional, default=0
+        Index of the first grafted backbone monomer.
+    side_chain_port : str, optional, default="up"
+        Label of the port on the side chain template bonded to the backbone.
+
+    Attributes
+    ----------
+    side_chains : list[mb.Compound]
+        Grafted side chains.
+    grafted : numpy.ndarray
+        Index of the backbone monomer of each side chain.
+
+    Examples
+    --------
+    >>> from mbuild_polybuild.cg_monomers import Bead
+    >>> backbone = Chain(Bead(name="_B", Nports=3), n=100)
+    >>> comb = Comb(backbone, Chain(Bead(name="_S"), n=5), graft_port="branch_up", graft_every=4)
+    """
+
+    def __init__(self, backbone, side_chain, graft_port="port[1]", graft_every=1, offset=0, side_chain_port="up"):
+        super(Comb, self).__init__()
+
+        if not isinstance(graft_every, (int, np.integer)) or graft_every < 1:
+            raise ValueError("graft_every must be an integer of 1 or more")
+        if isinstance(graft_port, str):
+            graft_port = [graft_port]
+
+        self.add(backbone, "backbone")
+        for label in ["up", "down"]:
+            if label in backbone.labels:
+                self.add(backbone[label], label, containment=False)
+
+        monomers = backbone.monomers if hasattr(backbone, "monomers") else list(backbone.children)
+        ports, grafted = [], []
+        for i in range(offset, len(monomers), graft_every):
+            for label in graft_port:
+                if label not in monomers[i].labels:
+                    raise ValueError("Backbone monomer {} has no port, {}.".format(i, label))
+                ports.append(monomers[i][label])
+                grafted.append(i)
+
+        self.side_chains = [side_chain.clone() for _ in ports]
+        self.grafted = np.array(grafted, dtype=int)
+        self.add(self.side_chains, "side_chain[$]")
+        batch_force_overlap(
+            self.side_chains,
+            [x[side_chain_port] for x in self.side_chains],
+            ports,
+            positions=[side_chain.xyz_with_ports] * len(ports),
+        )
+        for monomer in monomers:
+            for label in graft_port:
+                if label in monomer.labels:
+                    self.add(monomer[label], "graft_site[$]", containment=False)
+        for x in self.side_chains:
+            for port in x.available_ports():
+                self.add(port, "side_chain_end[$]", containment=False)
+
+
+class Bottlebrush(Comb):
+    """
+    Side chains grafted onto every monomer of a backbone.
+
+    Ports
+    -----
+    - up, down, graft_site[$], side_chain_end[$]: See `Comb`.
+
+    Parameters
+    ----------
+    backbone : Chain
+        Backbone chain, which is added to this compound.
+    side_chain : mb.Compound
+        Side chain template, which is cloned for each grafting site.
+    graft_port : str or list[str], optional, default="port[1]"
+        Label of the port on each backbone monomer that side chains are grafted to.
+    side_chain_port : str, optional, default="up"
+        Label of the port on the side chain template bonded to the backbone.
+
+    Examples
+    --------
+    >>> from mbuild_polybuild.aa_monomers import Methacrylate
+    >>> backbone = Chain(Methacrylate(cap_branch=False), n=200)
+    >>> brush = Bottlebrush(backbone, Chain(Methacrylate(), n=10))
+    """
+
+    def __init__(self, backbone, side_chain, graft_port="port[1]", side_chain_port="up"):
+        super(Bottlebrush, self).__init__(
+            backbone, side_chain, graft_port=graft_port, graft_every=1, offset=0, side_chain_port=side_chain_port
+        )
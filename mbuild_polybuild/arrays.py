@@ -0,0 +1,500 @@
+"""Arrays Module
+
+This module exports built monomers, chains, and boxes to NumPy arrays in a single pass over the compound, and builds
+ParmEd structures from those arrays in bulk.
+
+The numeric arrays of a `SystemArrays` instance are views over one contiguous buffer, so they can be handed to
+analysis code, written to disk, or shared between processes without further copies.
+
+Functions
+---------
+- monomer_classes: Classes treated as monomers when assigning atoms to monomers.
+- to_arrays: Export a compound to a `SystemArrays` instance.
+- replicate: Stack copies of a system with new positions.
+- tile: Tile a periodic system into a larger box.
+- concatenate: Join several systems into one.
+
+Classes
+-------
+- SystemArrays: Positions, elements, masses, charges, monomer and chain indices, and bonds of a system.
+"""
+
+import numpy as np
+import parmed as pmd
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+import mbuild_polybuild.aa_monomers as aa_monomers
+import mbuild_polybuild.cg_monomers as cg_monomers
+
+_FIELDS = [
+    # name, dtype, number of columns
+    ("positions", np.float64, 3),
+    ("atomic_numbers", np.int64, 1),
+    ("masses", np.float64, 1),
+    ("charges", np.float64, 1),
+    ("monomer_index", np.int64, 1),
+    ("chain_index", np.int64, 1),
+]
+
+
+def monomer_classes():
+    """
+    Classes treated as monomers when assigning atoms to monomers.
+
+    Returns
+    -------
+    tuple
+        The all-atom monomer classes and the coarse-grained ``Betaine`` class.
+    """
+
+    return (
+        aa_monomers.Acrylamide,
+        aa_monomers.Cbma,
+        aa_monomers.Ethylene,
+        aa_monomers.Methacrylate,
+        aa_monomers.Sbaa,
+        aa_monomers.Sbma,
+        cg_monomers.Betaine,
+    )
+
+
+class SystemArrays:
+    """
+    Positions, elements, masses, charges, monomer and chain indices, and bonds of a system.
+
+    All numeric arrays are views over the single contiguous ``buffer``.
+
+    Parameters
+    ----------
+    n_particles : int
+        Number of particles.
+    n_bonds : int
+        Number of bonds.
+    names : list[str], optional, default=None
+        Name of each particle.
+    monomer_names : list[str], optional, default=None
+        Class name of each monomer.
+    box : numpy.ndarray, optional, default=None
+        Box lengths in nm.
+
+    Attributes
+    ----------
+    buffer : numpy.ndarray
+        The backing buffer, a one dimensional ``uint8`` array.
+    positions : numpy.ndarray
+        Array of shape (n_particles, 3) of positions in nm.
+    atomic_numbers : numpy.ndarray
+        Array of shape (n_particles,), zero for particles without an element, e.g., coarse-grained beads.
+    masses : numpy.ndarray
+        Array of shape (n_particles,) of masses in amu.
+    charges : numpy.ndarray
+        Array of shape (n_particles,) of charges in units of elementary charge.
+    monomer_index : numpy.ndarray
+        Array of shape (n_particles,) with the index of the monomer containing each particle, or -1, the initial value,
+        for particles outside monomers.
+    chain_index : numpy.ndarray
+        Array of shape (n_particles,) with the index of the bonded molecule containing each particle.
+    bonds : numpy.ndarray
+        Array of shape (n_bonds, 2) of particle indices.
+    """
+
+    def __init__(self, n_particles, n_bonds, names=None, monomer_names=None, box=None):
+        sizes = [n_particles * ncol * np.dtype(dtype).itemsize for _, dtype, ncol in _FIELDS]
+        sizes.append(n_bonds * 2 * np.dtype(np.int64).itemsize)
+        self.buffer = np.zeros(sum(sizes), dtype=np.uint8)
+
+        offset = 0
+        for (name, dtype, ncol), size in zip(_FIELDS, sizes):
+            view = self.buffer[offset : offset + size].view(dtype)
+            setattr(self, name, view.reshape(n_particles, ncol) if ncol > 1 else view)
+            offset += size
+        self.bonds = self.buffer[offset:].view(np.int64).reshape(n_bonds, 2)
+        self.monomer_index[:] = -1
+
+        self.names = np.asarray(names if names is not None else [""] * n_particles, dtype=str)
+        self.monomer_names = list(monomer_names) if monomer_names is not None else []
+        self.box = None if box is None else np.asarray(box, dtype=float)
+
+    @property
+    def n_particles(self):
+        return len(self.positions)
+
+    @property
+    def n_bonds(self):
+        return len(self.bonds)
+
+    @property
+    def n_monomers(self):
+        return len(self.monomer_names)
+
+    @property
+    def n_chains(self):
+        return int(self.chain_index.max()) + 1 if self.n_particles > 0 else 0
+
+    def update_chain_index(self):
+        """Recompute ``chain_index`` as the connected components of the bond graph."""
+
+        n = self.n_particles
+        if n == 0:
+            return
+        graph = coo_matrix((np.ones(self.n_bonds, dtype=np.int8), (self.bonds[:, 0], self.bonds[:, 1])), shape=(n, n))
+        _, labels = connected_components(graph, directed=False)
+        self.chain_index[:] = labels
+
+    def save(self, filename, compressed=False):
+        """
+        Save the system to a NumPy ``.npz`` file.
+
+        The numeric arrays are stored as the single ``buffer``, so saving and loading copy one block of memory.
+
+        Parameters
+        ----------
+        filename : str
+            Output file. NumPy appends ".npz" if it is missing.
+        compressed : bool, optional, default=False
+            If True, the file is compressed, which is smaller but slower to write.
+        """
+
+        save = np.savez_compressed if compressed else np.savez
+        save(
+            filename,
+            buffer=self.buffer,
+            shape=np.array([self.n_particles, self.n_bonds], dtype=np.int64),
+            names=self.names,
+            monomer_names=np.array(self.monomer_names, dtype=str),
+            box=np.zeros(0) if self.box is None else self.box,
+        )
+
+    @classmethod
+    def load(cls, filename):
+        """
+        Load a system saved with :meth:`save`.
+
+        Parameters
+        ----------
+        filename : str
+            Input ``.npz`` file.
+
+        Returns
+        -------
+        SystemArrays
+            The loaded system.
+        """
+
+        with np.load(filename) as data:
+            n_particles, n_bonds = (int(x) for x in data["shape"])
+            box = data["box"]
+            system = cls(
+                n_particles,
+                n_bonds,
+                names=data["names"],
+                monomer_names=[str(x) for x in data["monomer_names"]],
+                box=box if len(box) > 0 else None,
+            )
+            system.buffer[:] = data["buffer"]
+
+        return system
+
+    def add_bonds(self, bonds):
+        """
+        Copy of the system with additional bonds.
+
+        Parameters
+        ----------
+        bonds : numpy.ndarray
+            Array of shape (K, 2) of particle indices.
+
+        Returns
+        -------
+        SystemArrays
+            New system with the bonds appended and ``chain_index`` recomputed.
+        """
+
+        bonds = np.asarray(bonds, dtype=np.int64).reshape(-1, 2)
+        result = SystemArrays(
+            self.n_particles,
+            self.n_bonds + len(bonds),
+            names=self.names,
+            monomer_names=self.monomer_names,
+            box=self.box,
+        )
+        for name, _, _ in _FIELDS:
+            getattr(result, name)[:] = getattr(self, name)
+        result.bonds[: self.n_bonds] = self.bonds
+        result.bonds[self.n_bonds :] = bonds
+        result.update_chain_index()
+
+        return result
+
+    @classmethod
+    def from_compound(cls, compound, box=None):
+        """
+        Export a compound in one traversal of its particles and bonds.
+
+        Parameters
+        ----------
+        compound : mb.Compound
+            A monomer, chain, or box of chains.
+        box : numpy.ndarray, optional, default=None
+            Box lengths in nm. If None and the compound has a box, its lengths are used.
+
+        Returns
+        -------
+        SystemArrays
+            The exported arrays.
+        """
+
+        particles = list(compound.particles())
+        index = {id(particle): i for i, particle in enumerate(particles)}
+        bonds = [(index[id(a)], index[id(b)]) for a, b in compound.bonds()]
+
+        if box is None and getattr(compound, "box", None) is not None:
+            box = compound.box.lengths
+
+        monomers = []
+        monomer_index = np.full(len(particles), -1, dtype=np.int64)
+        stack = [compound]
+        classes = monomer_classes()
+        while stack:
+            child = stack.pop()
+            if isinstance(child, classes):
+                monomer_index[[index[id(particle)] for particle in child.particles()]] = len(monomers)
+                monomers.append(type(child).__name__)
+            elif child.children:
+                stack.extend(reversed(list(child.children)))
+
+        system = cls(
+            len(particles),
+            len(bonds),
+            names=[particle.name for particle in particles],
+            monomer_names=monomers,
+            box=box,
+        )
+        system.positions[:] = np.array([particle.pos for particle in particles]).reshape(-1, 3)
+        for i, particle in enumerate(particles):
+            element = particle.element
+            if element is not None:
+                system.atomic_numbers[i] = element.atomic_number
+            mass = getattr(particle, "mass", None)
+            if mass is None and element is not None:
+                mass = element.mass
+            system.masses[i] = 0.0 if mass is None else float(np.asarray(mass))
+            charge = particle.charge
+            system.charges[i] = 0.0 if charge is None else float(np.asarray(charge))
+        system.monomer_index[:] = monomer_index
+        if len(bonds) > 0:
+            system.bonds[:] = bonds
+        system.update_chain_index()
+
+        return system
+
+    def residue_names(self):
+        """
+        Residue name of each particle.
+
+        Monomers are named by the first three letters of their class name, single particles outside monomers (e.g.,
+        ions) by their particle name, and other particles outside monomers "RES".
+
+        Returns
+        -------
+        numpy.ndarray
+            Array of shape (n_particles,) of residue names.
+        """
+
+        monomer_residues = np.array([name[:3].upper() for name in self.monomer_names] + ["RES"], dtype="U4")
+        residues = monomer_residues[self.monomer_index]
+        chain_size = np.bincount(self.chain_index, minlength=self.n_chains)
+        single = (self.monomer_index < 0) & (chain_size[self.chain_index] == 1)
+        residues[single] = self.names[single]
+
+        return residues
+
+    def to_parmed(self):
+        """
+        Build a ParmEd structure from the arrays.
+
+        Each monomer becomes a residue. Particles outside monomers are grouped into one residue per chain. The result
+        may be typed directly, e.g., ``load_forcefield("oplsaa.xml").apply(system.to_parmed())``.
+
+        Returns
+        -------
+        parmed.Structure
+            Structure with atoms, residues, bonds, coordinates, and box.
+        """
+
+        structure = pmd.Structure()
+        residue_names = self.residue_names()
+        # Residue numbers continue the monomer numbering for particles outside monomers
+        residue_ids = np.where(self.monomer_index >= 0, self.monomer_index, self.n_monomers + self.chain_index)
+
+        for name, atomic_number, mass, charge, resname, resid in zip(
+            self.names, self.atomic_numbers, self.masses, self.charges, residue_names, residue_ids
+        ):
+            atom = pmd.Atom(name=str(name), atomic_number=int(atomic_number), mass=float(mass), charge=float(charge))
+            structure.add_atom(atom, str(resname), int(resid))
+
+        atoms = structure.atoms
+        structure.bonds.extend(pmd.Bond(atoms[int(i)], atoms[int(j)]) for i, j in self.bonds)
+        structure.coordinates = self.positions * 10  # nm to angstroms
+        if self.box is not None:
+            structure.box = np.concatenate([np.asarray(self.box) * 10, [90.0, 90.0, 90.0]])
+
+        return structure
+
+
+def to_arrays(compound, box=None):
+    """
+    Export a compound to a `SystemArrays` instance.
+
+    Parameters
+    ----------
+    compound : mb.Compound
+        A monomer, chain, or box of chains.
+    box : numpy.ndarray, optional, default=None
+        Box lengths in nm. If None and the compound has a box, its lengths are used.
+
+    Returns
+    -------
+    SystemArrays
+        The exported arrays.
+
+    Examples
+    --------
+    >>> from mbuild_polybuild.aa_monomers import Sbma
+    >>> system = to_arrays(Sbma())
+    >>> system.positions.shape, system.bonds.shape
+    """
+
+    return SystemArrays.from_compound(compound, box=box)
+
+
+def replicate(system, positions):
+    """
+    Stack copies of a system with new positions.
+
+    Parameters
+    ----------
+    system : SystemArrays
+        System to copy.
+    positions : numpy.ndarray
+        Array of shape (K, n_particles, 3) of the positions of each copy.
+
+    Returns
+    -------
+    SystemArrays
+        System of ``K`` copies in order, with shifted bond, monomer, and chain indices.
+    """
+
+    positions = np.asarray(positions, dtype=float).reshape(-1, system.n_particles, 3)
+    copies = len(positions)
+    shift = np.arange(copies)[:, None]
+
+    result = SystemArrays(
+        copies * system.n_particles,
+        copies * system.n_bonds,
+        names=np.tile(system.names, copies),
+        monomer_names=system.monomer_names * copies,
+        box=system.box,
+    )
+    result.positions[:] = positions.reshape(-1, 3)
+    for name in ["atomic_numbers", "masses", "charges"]:
+        getattr(result, name)[:] = np.tile(getattr(system, name), copies)
+    result.bonds[:] = (system.bonds[None] + shift[:, :, None] * system.n_particles).reshape(-1, 2)
+    monomer_index = system.monomer_index[None] + shift * system.n_monomers
+    result.monomer_index[:] = np.where(system.monomer_index[None] >= 0, monomer_index, -1).ravel()
+    result.chain_index[:] = (system.chain_index[None] + shift * system.n_chains).ravel()
+
+    return result
+
+
+def _tile_images(reps, box):
+    """Box lengths of a tiling and the offset of each image, with the last axis varying fastest."""
+
+    reps = np.broadcast_to(np.asarray(reps, dtype=np.int64), (3,))
+    if np.any(reps < 1):
+        raise ValueError("reps must be 1 or more along each axis, not {}".format(reps.tolist()))
+    if box is None:
+        raise ValueError("A box is required to tile a system")
+    box = np.asarray(box, dtype=float)
+    images = np.stack(np.meshgrid(*[np.arange(n) for n in reps], indexing="ij"), axis=-1).reshape(-1, 3)
+
+    return box * reps, images * box
+
+
+def tile(system, reps, box=None):
+    """
+    Tile a periodic system into a larger box.
+
+    Each image is a copy of the system shifted by a whole number of box lengths, so a system equilibrated in its box
+    stays continuous across the images. Use :func:`mbuild_polybuild.gromacs.write_tiled_gromacs` to write a tiling
+    without holding it in memory.
+
+    Parameters
+    ----------
+    system : SystemArrays
+        System to tile.
+    reps : int or list[int]
+        Number of images along each axis, or along all three.
+    box : numpy.ndarray, optional, default=None
+        Box lengths of ``system`` in nm. If None, ``system.box`` is used.
+
+    Returns
+    -------
+    SystemArrays
+        System of all images in order, with the last axis varying fastest, and a box of ``reps`` times the box.
+
+    Examples
+    --------
+    >>> unit = SystemArrays.load("equilibrated.npz")
+    >>> large = tile(unit, [10, 10, 1])
+    """
+
+    total, offsets = _tile_images(reps, system.box if box is None else box)
+    result = replicate(system, system.positions[None] + offsets[:, None])
+    result.box = total
+
+    return result
+
+
+def concatenate(systems, box=None):
+    """
+    Join several systems into one.
+
+    Parameters
+    ----------
+    systems : list[SystemArrays]
+        Systems to join in order.
+    box : numpy.ndarray, optional, default=None
+        Box lengths in nm. If None, the box of the first system is used.
+
+    Returns
+    -------
+    SystemArrays
+        Joined system with shifted bond, monomer, and chain indices.
+    """
+
+    if box is None and len(systems) > 0:
+        box = systems[0].box
+
+    result = SystemArrays(
+        sum(x.n_particles for x in systems),
+        sum(x.n_bonds for x in systems),
+        names=np.concatenate([x.names for x in systems]) if systems else None,
+        monomer_names=[name for x in systems for name in x.monomer_names],
+        box=box,
+    )
+    particles, bonds, monomers, chains = 0, 0, 0, 0
+    for x in systems:
+        end = particles + x.n_particles
+        result.positions[particles:end] = x.positions
+        for name in ["atomic_numbers", "masses", "charges"]:
+            getattr(result, name)[particles:end] = getattr(x, name)
+        result.monomer_index[particles:end] = np.where(x.monomer_index >= 0, x.monomer_index + monomers, -1)
+        result.chain_index[particles:end] = x.chain_index + chains
+        result.bonds[bonds : bonds + x.n_bonds] = x.bonds + particles
+        particles, bonds = end, bonds + x.n_bonds
+        monomers += x.n_monomers
+        chains += x.n_chains
+
+    return result
@@ -0,0 +1,335 @@
+"""Brush Module
+
+This module builds polymer brushes, such as antifouling ``Sbma`` or ``Cbma`` brushes, with chains tethered to a planar
+substrate at z = 0, on the array representation of :mod:`mbuild_polybuild.arrays`.
+
+Grafting points are placed on a square or hexagonal lattice, or at random with a minimum separation, at a target
+grafting density. All chains are grown at once from the monomer templates with
+:func:`mbuild_polybuild.polydisperse.build_ensemble`, so they may be polydisperse, and are stood up along +z from their
+grafting points. Chains in contact with a neighbor are spun about their grafting axis until no contacts remain, with
+contacts found in a periodic KD-tree.
+
+Functions
+---------
+- grafting_points: Grafting point positions in a periodic surface at a target density.
+- build_brush: Graft chains onto a surface.
+
+Classes
+-------
+- Brush: A grafted brush with its grafting points and chain anchors.
+"""
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from mbuild_polybuild.arrays import concatenate, replicate
+from mbuild_polybuild.network import reactive_sites
+from mbuild_polybuild.polydisperse import build_ensemble
+
+PATTERNS = ["square", "hexagonal", "random"]
+
+
+def grafting_points(box, density, pattern="hexagonal", min_distance=0.0, seed=None, max_attempts=100):
+    """
+    Grafting point positions in a periodic surface at a target density.
+
+    Lattices are fit to the surface with a whole number of cells, so the realized density is close to, but may differ
+    from, the target. Random points are placed by random sequential addition in batches, rejecting points closer than
+    ``min_distance`` to another.
+
+    Parameters
+    ----------
+    box : numpy.ndarray
+        Surface lengths in x and y in nm.
+    density : float
+        Target grafting density in chains per nm^2.
+    pattern : str, optional, default="hexagonal"
+        One of "square", "hexagonal", or "random".
+    min_distance : float, optional, default=0.0
+        Minimum distance between random grafting points in nm.
+    seed : int, optional, default=None
+        Seed for reproducible random grafting points.
+    max_attempts : int, optional, default=100
+        Maximum number of batches of random candidates.
+
+    Returns
+    -------
+    numpy.ndarray
+        Array of shape (n_chains, 2) of grafting point positions in nm.
+    """
+
+    if pattern not in PATTERNS:
+        raise ValueError("Pattern, {}, is not one of {}".format(pattern, PATTERNS))
+    if density <= 0:
+        raise ValueError("density must be positive")
+    box = np.asarray(box, dtype=float)[:2]
+
+    if pattern == "square":
+        spacing = 1 / np.sqrt(density)
+        nx, ny = np.maximum(np.rint(box / spacing), 1).astype(int)
+        x, y = np.meshgrid((np.arange(nx) + 0.5) * box[0] / nx, (np.arange(ny) + 0.5) * box[1] / ny)
+        return np.column_stack([x.ravel(), y.ravel()])
+
+    if pattern == "hexagonal":
+        spacing = np.sqrt(2 / (np.sqrt(3) * density))
+        nx = max(int(np.rint(box[0] / spacing)), 1)
+        # An even number of rows keeps the lattice periodic
+        ny = max(2 * int(np.rint(box[1] / (spacing * np.sqrt(3)))), 2)
+        rows = np.arange(ny)[:, None]
+        x = np.mod((np.arange(nx)[None] + 0.5 + 0.5 * (rows % 2)) * box[0] / nx, box[0])
+        y = np.broadcast_to((rows + 0.5) * box[1] / ny, x.shape)
+        return np.column_stack([x.ravel(), y.ravel()])
+
+    rng = np.random.default_rng(seed)
+    n_points = int(np.rint(density * box.prod()))
+    points = np.zeros((0, 2))
+    for _ in range(max_attempts):
+        needed = n_points - len(points)
+        if needed == 0:
+            break
+        candidates = rng.uniform(0.0, 1.0, size=(2 * needed, 2)) * box
+        if min_distance > 0:
+            if len(points) > 0:
+                distance, _ = cKDTree(points, boxsize=box).query(candidates, distance_upper_bound=min_distance)
+                candidates = candidates[np.isinf(distance)]
+            pairs = cKDTree(candidates, boxsize=box).query_pairs(min_distance, output_type="ndarray")
+            keep = np.ones(len(candidates), dtype=bool)
+            keep[pairs.max(axis=1)] = False
+            candidates = candidates[keep]
+        points = np.concatenate([points, candidates[:needed]])
+
+    if len(points) < n_points:
+        raise ValueError(
+            "Only {} of {} grafting points could be placed, reduce min_distance.".format(len(points), n_points)
+        )
+
+    return points
+
+
+def _align_to_z(vectors):
+    """Rotation matrices of shape (K, 3, 3) that turn each vector to +z."""
+
+    norms = np.linalg.norm(vectors, axis=1)
+    unit = np.where(norms[:, None] > 1e-8, vectors / np.maximum(norms, 1e-8)[:, None], [0.0, 0.0, 1.0])
+    axis = np.cross(unit, [0.0, 0.0, 1.0])
+    sine2 = np.einsum("ij,ij->i", axis, axis)
+    cosine = unit[:, 2]
+
+    skew = np.zeros((len(unit), 3, 3))
+    skew[:, 0, 1], skew[:, 0, 2], skew[:, 1, 2] = -axis[:, 2], axis[:, 1], -axis[:, 0]
+    skew[:, 1, 0], skew[:, 2, 0], skew[:, 2, 1] = axis[:, 2], -axis[:, 1], axis[:, 0]
+    scale = np.where(sine2 > 1e-12, (1 - cosine) / np.maximum(sine2, 1e-12), 0.0)
+    rotations = np.eye(3) + skew + np.einsum("kij,kjl->kil", skew, skew) * scale[:, None, None]
+    rotations[(sine2 <= 1e-12) & (cosine < 0)] = np.diag([1.0, -1.0, -1.0])
+
+    return rotations
+
+
+def _spin_z(angles):
+    """Rotation matrices of shape (K, 3, 3) about +z."""
+
+    rotations = np.zeros((len(angles), 3, 3))
+    rotations[:, 0, 0] = rotations[:, 1, 1] = np.cos(angles)
+    rotations[:, 1, 0] = np.sin(angles)
+    rotations[:, 0, 1] = -rotations[:, 1, 0]
+    rotations[:, 2, 2] = 1.0
+
+    return rotations
+
+
+class Brush:
+    """
+    A grafted brush with its grafting points and chain anchors.
+
+    Parameters
+    ----------
+    system : SystemArrays
+        Tethers, if any, followed by the chains.
+    grafting_points : numpy.ndarray
+        Array of shape (n_chains, 2) of grafting point positions in nm.
+    anchors : numpy.ndarray
+        Array of shape (n_chains,) of the particle index of the head anchor of each chain.
+    n_contacts : int
+        Number of particle pairs of different chains closer than the contact distance after placement.
+
+    Attributes
+    ----------
+    n_chains : int
+        Number of grafted chains.
+    grafting_density : float
+        Realized grafting density in chains per nm^2.
+    """
+
+    def __init__(self, system, grafting_points, anchors, n_contacts):
+        self.system = system
+        self.grafting_points = grafting_points
+        self.anchors = anchors
+        self.n_contacts = n_contacts
+
+    @property
+    def n_chains(self):
+        return len(self.grafting_points)
+
+    @property
+    def grafting_density(self):
+        return self.n_chains / np.prod(self.system.box[:2])
+
+
+def build_brush(
+    monomers,
+    box,
+    density,
+    lengths=None,
+    sequences=None,
+    pattern="hexagonal",
+    min_distance=0.0,
+    tether=None,
+    tether_port=None,
+    head_port="up",
+    tail_port="down",
+    contact_distance=0.2,
+    max_attempts=20,
+    vacuum=2.0,
+    seed=None,
+):
+    """
+    Graft chains onto a surface.
+
+    Each chain is placed so that its head port, where a bonded partner would be, is at its grafting point in the
+    plane z = 0, and the vector from there to the chain centroid points along +z.
+
+    Parameters
+    ----------
+    monomers : mb.Compound or list[mb.Compound]
+        Monomer templates, see :func:`mbuild_polybuild.polydisperse.build_ensemble`.
+    box : numpy.ndarray
+        Surface lengths in x and y in nm.
+    density : float
+        Target grafting density in chains per nm^2.
+    lengths : int or numpy.ndarray, optional, default=None
+        Length of every chain, or of each chain, e.g., from :func:`mbuild_polybuild.polydisperse.sample_lengths`.
+    sequences : list[str], optional, default=None
+        Sequence of each chain. Either ``lengths`` or ``sequences`` is required.
+    pattern : str, optional, default="hexagonal"
+        Grafting pattern, see :func:`grafting_points`.
+    min_distance : float, optional, default=0.0
+        Minimum distance between random grafting points in nm.
+    tether : mb.Compound, optional, default=None
+        Template placed below each grafting point, with its port at the grafting point, and bonded to the head of its
+        chain, e.g., ``Bead(name="_S", Nports=1)`` or a surface atom. If None, chain heads are left open.
+    tether_port : str, optional, default=None
+        Label of the tether port bonded to the chain. If None, the tether must have one open port.
+    head_port : str, optional, default="up"
+        Label of the port on each template bonded to the previous monomer.
+    tail_port : str, optional, default="down"
+        Label of the port on each template bonded to the next monomer.
+    contact_distance : float, optional, default=0.2
+        Distance in nm below which particles of different chains are in contact.
+    max_attempts : int, optional, default=20
+        Maximum number of rounds of spinning chains in contact.
+    vacuum : float, optional, default=2.0
+        Space in nm above the tallest chain in the box.
+    seed : int, optional, default=None
+        Seed for the grafting points and chain orientations.
+
+    Returns
+    -------
+    Brush
+        The grafted brush.
+
+    Examples
+    --------
+    >>> from mbuild_polybuild.cg_monomers import Bead
+    >>> brush = build_brush(Bead(name="_B"), [50.0, 50.0], 0.5, lengths=50, tether=Bead(name="_S", Nports=1))
+    >>> brush.n_chains, brush.n_contacts
+    """
+
+    if not isinstance(monomers, (list, tuple)):
+        monomers = [monomers]
+    rng = np.random.default_rng(seed)
+    surface = np.asarray(box, dtype=float)[:2]
+    points = grafting_points(surface, density, pattern=pattern, min_distance=min_distance, seed=rng)
+    n_chains = len(points)
+
+    if sequences is None:
+        if lengths is None:
+            raise ValueError("Either lengths or sequences must be provided.")
+        lengths = np.asarray(lengths, dtype=np.int64)
+        if lengths.size == 1:
+            lengths = np.full(n_chains, lengths.item())
+        first = np.zeros(n_chains, dtype=np.int64)
+    else:
+        first = np.array([ord(x[0]) - ord("A") for x in sequences], dtype=np.int64)
+    if len(lengths if sequences is None else sequences) != n_chains:
+        raise ValueError(
+            "{} chain lengths or sequences were given for {} grafting points.".format(
+                len(lengths if sequences is None else sequences), n_chains
+            )
+        )
+
+    chains = build_ensemble(monomers, lengths=lengths, sequences=sequences, head_port=head_port, tail_port=tail_port)
+    heads = [reactive_sites(x, ports=[head_port])[1:] for x in monomers]
+    head_anchor = np.array([x[0][0] for x in heads])
+    head_site = np.array([x[1][0] for x in heads])
+
+    chain_index = chains.chain_index
+    starts = np.searchsorted(chain_index, np.arange(n_chains + 1))
+    anchors = starts[:-1] + head_anchor[first]
+    sites = head_site[first]
+    counts = np.diff(starts)
+    centroids = np.column_stack(
+        [np.bincount(chain_index, weights=chains.positions[:, k], minlength=n_chains) for k in range(3)]
+    )
+    centroids /= counts[:, None]
+    align = _align_to_z(centroids - sites)
+    local = chains.positions - sites[chain_index]
+    spins = rng.uniform(0.0, 2 * np.pi, size=n_chains)
+    offsets = np.column_stack([points, np.zeros(n_chains)])
+
+    def place(indices):
+        rotations = np.einsum("kij,kjl->kil", _spin_z(spins[indices]), align[indices])
+        for i, rotation in zip(indices, rotations):
+            chains.positions[starts[i] : starts[i + 1]] = local[starts[i] : starts[i + 1]] @ rotation.T + offsets[i]
+
+    place(np.arange(n_chains))
+
+    n_contacts = 0
+    for attempt in range(max_attempts + 1):
+        positions = chains.positions.copy()
+        low = positions[:, 2].min()
+        positions[:, 2] -= low
+        # Pad the box in z so that no contacts are found across it
+        tree_box = np.concatenate([surface, [positions[:, 2].max() + 2 * contact_distance + 1e-6]])
+        tree = cKDTree(np.mod(positions, tree_box), boxsize=tree_box)
+        pairs = tree.query_pairs(contact_distance, output_type="ndarray")
+        pair_chains = chain_index[pairs]
+        between = pair_chains[:, 0] != pair_chains[:, 1]
+        n_contacts = int(np.count_nonzero(between))
+        if n_contacts == 0 or attempt == max_attempts:
+            break
+        # Spin one chain of each contacting pair
+        moving = np.unique(pair_chains[between].max(axis=1))
+        spins[moving] = rng.uniform(0.0, 2 * np.pi, size=len(moving))
+        place(moving)
+
+    full_box = np.concatenate([surface, [chains.positions[:, 2].max() + vacuum]])
+    if tether is None:
+        chains.box = full_box
+        return Brush(chains, points, anchors, n_contacts)
+
+    tether_system, tether_anchors, tether_sites = reactive_sites(
+        tether, ports=None if tether_port is None else [tether_port]
+    )
+    if len(tether_anchors) != 1:
+        raise ValueError("tether_port must be given for a tether with {} open ports".format(len(tether_anchors)))
+    # Ports overlap when bonded, so the tether port is also at the grafting point, with the tether below it
+    rotation = _align_to_z((tether_sites[0] - tether_system.positions[tether_anchors[0]])[None])[0]
+    tether_positions = (tether_system.positions - tether_sites[0]) @ rotation.T
+    tethers = replicate(tether_system, tether_positions[None] + offsets[:, None])
+
+    system = concatenate([tethers, chains], box=full_box)
+    tether_index = tether_anchors[0] + np.arange(n_chains) * tether_system.n_particles
+    anchors = anchors + tethers.n_particles
+    system = system.add_bonds(np.column_stack([tether_index, anchors]))
+
+    return Brush(system, points, anchors, n_contacts)
@@ -0,0 +1,320 @@
+"""Build Cache Module
+
+This module provides a content-addressed, on-disk cache of built compounds so that identical monomers or chains
+requested across a parameter sweep are only constructed once.
+
+Entries are keyed by the builder's import path, its fully bound constructor arguments, and the installed
+mbuild_polybuild version, and are stored as zlib-compressed pickles. Entries are written to a temporary file in the
+cache directory and moved into place with an atomic rename, so many processes may populate the same cache
+concurrently without readers ever observing a partially written file.
+
+Functions
+---------
+- get_cache_dir: Resolve (and create) the cache directory.
+- structure_hash: Hash the particles, bonds, and open ports of a compound.
+- build_key: Compute the cache key for a builder and its arguments.
+- cached_build: Return a cached build, constructing and storing it on a miss.
+- clear_cache: Remove all cache entries.
+"""
+
+import os
+import sys
+import json
+import zlib
+import pickle
+import inspect
+import hashlib
+import tempfile
+import functools
+from contextlib import contextmanager
+
+import numpy as np
+
+import mbuild as mb
+
+import mbuild_polybuild
+
+_CACHE_ENV = "MBUILD_POLYBUILD_CACHE"
+_CACHE_SUFFIX = ".pkz"
+
+
+def get_cache_dir(cache_dir=None):
+    """
+    Resolve the cache directory, creating it if needed.
+
+    Parameters
+    ----------
+    cache_dir : str, optional, default=None
+        Directory to use. If None, the ``MBUILD_POLYBUILD_CACHE`` environment variable is used when set, otherwise
+        ``~/.cache/mbuild_polybuild``.
+
+    Returns
+    -------
+    str
+        Path to the cache directory.
+    """
+
+    if cache_dir is None:
+        cache_dir = os.environ.get(_CACHE_ENV, os.path.join(os.path.expanduser("~"), ".cache", "mbuild_polybuild"))
+    os.makedirs(cache_dir, exist_ok=True)
+
+    return cache_dir
+
+
+def structure_hash(compound, decimals=4):
+    """
+    Hash the particles, bonds, and open ports of a compound.
+
+    Two compounds share a hash when they have the same particle names in the same order, the same positions to
+    ``decimals`` places, the same bonds, and the same open ports.
+
+    Parameters
+    ----------
+    compound : mb.Compound
+        Compound to hash.
+    decimals : int, optional, default=4
+        Number of decimal places (in nm) kept when hashing coordinates.
+
+    Returns
+    -------
+    str
+        Hexadecimal SHA-256 digest.
+
+    Examples
+    --------
+    >>> from mbuild_polybuild.aa_monomers import Sbma
+    >>> structure_hash(Sbma()) == structure_hash(Sbma(switch_backbone_chiral=True))
+    False
+    """
+
+    particles = list(compound.particles())
+    index = {id(particle): i for i, particle in enumerate(particles)}
+
+    digest = hashlib.sha256()
+    digest.update("\n".join(particle.name for particle in particles).encode())
+    # Adding 0.0 folds -0.0 into 0.0 so that rounding noise does not change the hash
+    xyz = np.round(np.asarray(compound.xyz, dtype=float), decimals) + 0.0
+    digest.update(np.ascontiguousarray(xyz).tobytes())
+
+    bonds = sorted(tuple(sorted((index[id(a)], index[id(b)]))) for a, b in compound.bonds())
+    digest.update(np.asarray(bonds, dtype=np.int64).tobytes())
+
+    ports = []
+    for port in compound.available_ports():
+        anchor = -1 if port.anchor is None else index.get(id(port.anchor), -1)
+        ports.append([anchor] + list(np.round(port.center, decimals) + 0.0))
+    digest.update(np.asarray(sorted(ports), dtype=float).tobytes())
+
+    return digest.hexdigest()
+
+
+def _canonical(value):
+    """Convert a builder argument to a JSON serializable value with a stable representation."""
+
+    if value is None or isinstance(value, (bool, int, str)):
+        return value
+    elif isinstance(value, float):
+        return repr(value)
+    elif isinstance(value, np.generic):
+        return _canonical(value.item())
+    elif isinstance(value, np.ndarray):
+        return {"ndarray": hashlib.sha256(np.ascontiguousarray(value).tobytes()).hexdigest(), "shape": value.shape}
+    elif isinstance(value, (list, tuple)):
+        return [_canonical(x) for x in value]
+    elif isinstance(value, dict):
+        return {str(key): _canonical(val) for key, val in sorted(value.items(), key=lambda x: str(x[0]))}
+    elif isinstance(value, mb.Compound):
+        return {"compound": _qualified_name(type(value)), "hash": structure_hash(value)}
+    elif isinstance(value, functools.partial):
+        return {
+            "partial": _qualified_name(value.func),
+            "args": _canonical(list(value.args)),
+            "keywords": _canonical(value.keywords),
+        }
+    elif callable(value):
+        return {"callable": _qualified_name(value)}
+    else:
+        raise TypeError("Argument of type {} cannot be used in a cache key.".format(type(value)))
+
+
+def _qualified_name(obj):
+    """Return the importable name of a class or function, raising a TypeError if it has none."""
+
+    name = getattr(obj, "__qualname__", None) or getattr(obj, "__name__", None)
+    # Lambdas and nested functions share names, so their names do not identify them
+    if name is None or "<lambda>" in name or "<locals>" in name:
+        raise TypeError("{!r} has no importable name and cannot be used in a cache key.".format(obj))
+
+    return "{}.{}".format(obj.__module__, name)
+
+
+def build_key(builder, args=(), kwargs=None):
+    """
+    Compute the cache key for a builder and its arguments.
+
+    Arguments are bound to the builder's signature and defaults are filled in, so ``Sbma()`` and
+    ``Sbma(spacer_backbone=2)`` share a key.
+
+    Parameters
+    ----------
+    builder : callable
+        Class or function that returns an ``mb.Compound``.
+    args : tuple, optional, default=()
+        Positional arguments for ``builder``.
+    kwargs : dict, optional, default=None
+        Keyword arguments for ``builder``.
+
+    Returns
+    -------
+    str
+        Hexadecimal SHA-256 digest.
+
+    Raises
+    ------
+    TypeError
+        If the builder or an argument cannot be keyed, e.g., a lambda or a nested function, whose names are not
+        unique.
+
+    Examples
+    --------
+    >>> from mbuild_polybuild.aa_monomers import Sbma
+    >>> build_key(Sbma) == build_key(Sbma, kwargs={"spacer_backbone": 2})
+    True
+    """
+
+    if kwargs is None:
+        kwargs = {}
+
+    try:
+        bound = inspect.signature(builder).bind(*args, **kwargs)
+        bound.apply_defaults()
+        arguments = dict(bound.arguments)
+    except (TypeError, ValueError):
+        arguments = {"args": list(args), "kwargs": kwargs}
+
+    payload = {
+        "builder": _qualified_name(builder),
+        "arguments": _canonical(arguments),
+        "version": mbuild_polybuild.__version__,
+    }
+
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+@contextmanager
+def _recursion_limit(limit):
+    """Temporarily raise the recursion limit, pickling deep compound hierarchies recurses through bonded neighbors."""
+
+    old_limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(old_limit, limit))
+    try:
+        yield
+    finally:
+        sys.setrecursionlimit(old_limit)
+
+
+def _entry_path(key, cache_dir):
+    """Path of the cache entry for ``key``, sharded by the first two characters."""
+
+    return os.path.join(cache_dir, key[:2], key + _CACHE_SUFFIX)
+
+
+def _load_entry(path):
+    """Load a cache entry, returning None if it is missing or unreadable."""
+
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        with _recursion_limit(100000):
+            return pickle.loads(zlib.decompress(data))
+    except FileNotFoundError:
+        return None
+    except (zlib.error, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        return None
+
+
+def _store_entry(path, compound, compression=6):
+    """Write a cache entry atomically so concurrent writers and readers never see a partial file."""
+
+    with _recursion_limit(100000):
+        data = zlib.compress(pickle.dumps(compound, protocol=pickle.HIGHEST_PROTOCOL), compression)
+
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=_CACHE_SUFFIX)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def cached_build(builder, *args, cache_dir=None, **kwargs):
+    """
+    Return a cached build, constructing and storing it on a miss.
+
+    Each call returns an independent copy, so the result may be modified without affecting the cache.
+
+    Parameters
+    ----------
+    builder : callable
+        Class or function that returns an ``mb.Compound``, e.g., ``Sbma``.
+    *args
+        Positional arguments for ``builder``.
+    cache_dir : str, optional, default=None
+        Cache directory, see :func:`get_cache_dir`.
+    **kwargs
+        Keyword arguments for ``builder``.
+
+    Returns
+    -------
+    mb.Compound
+        The built compound.
+
+    Examples
+    --------
+    >>> from mbuild_polybuild.aa_monomers import Sbma
+    >>> sbma = cached_build(Sbma, spacer_backbone=3, spacer_ion=2)
+    """
+
+    cache_dir = get_cache_dir(cache_dir)
+    path = _entry_path(build_key(builder, args, kwargs), cache_dir)
+
+    compound = _load_entry(path)
+    if compound is None:
+        compound = builder(*args, **kwargs)
+        _store_entry(path, compound)
+
+    return compound
+
+
+def clear_cache(cache_dir=None):
+    """
+    Remove all cache entries. Entries that other processes are still writing are kept.
+
+    Parameters
+    ----------
+    cache_dir : str, optional, default=None
+        Cache directory, see :func:`get_cache_dir`.
+
+    Returns
+    -------
+    int
+        Number of entries removed.
+    """
+
+    cache_dir = get_cache_dir(cache_dir)
+    count = 0
+    for root, _, files in os.walk(cache_dir):
+        for filename in files:
+            # Temporary files are entries still being written by other processes
+            if filename.endswith(_CACHE_SUFFIX) and not filename.startswith(".tmp-"):
+                os.remove(os.path.join(root, filename))
+                count += 1
+
+    return count
@@ -0,0 +1,399 @@
+"""Charges Module
+
+This module assigns forcefield partial charges to array-backed systems and reports their net charge without typing
+every atom of the system.
+
+Each monomer, and the particles of each chain outside monomers (e.g., an ion), is a unit. Units are grouped into
+variants by their particles, internal bonds, and the elements they are bonded to in neighboring units, so that end
+monomers, e.g., from ``cap_ternary`` or ``cap_primary``, are variants of their own. Charges are resolved once per
+variant by typing one chain that contains it, cached for the process, and scattered to every unit of the variant with
+one gather. Net charges of units, chains, and the system are segment sums over the unit and chain indices.
+
+Functions
+---------
+- unit_variants: Group the units of a system into variants with the same particles and bonds.
+- resolve_charges: Assign forcefield charges to a system, typing one chain per uncached variant.
+- charge_report: Net charge of every unit, chain, and the system.
+- counterions: Number of counter-ions that neutralize a net charge.
+- clear_charge_cache: Remove all cached variant charges.
+
+Classes
+-------
+- ChargeReport: Net charges of the units and chains of a system.
+"""
+
+import hashlib
+
+import numpy as np
+
+from mbuild_polybuild.arrays import SystemArrays, to_arrays
+from mbuild_polybuild.gromacs import _residue_ids, _subsystem
+from mbuild_polybuild.toolbox import load_forcefield
+
+# Formal charge of the elements of ``aa_molecules.MonatomicIon``
+ION_CHARGES = {
+    "H": 1,
+    "Li": 1,
+    "Na": 1,
+    "K": 1,
+    "Rb": 1,
+    "Cs": 1,
+    "Mg": 2,
+    "Ca": 2,
+    "Sr": 2,
+    "Ba": 2,
+    "F": -1,
+    "Cl": -1,
+    "Br": -1,
+    "I": -1,
+}
+
+# Charges of each variant in the local particle order of its units, keyed by forcefield and variant
+_CHARGE_CACHE = {}
+# Forcefield objects keyed by id, kept alive while their charges are cached so that their ids are not reused
+_FORCEFIELDS = {}
+
+
+def _as_arrays(system):
+    """Arrays of a compound or system."""
+
+    return system if isinstance(system, SystemArrays) else to_arrays(system)
+
+
+def _units(system):
+    """Unit of each particle, and each particle's position within its unit in the original particle order."""
+
+    units = _residue_ids(system)
+    order = np.argsort(units, kind="stable")
+    starts = np.searchsorted(units[order], np.arange(system.n_monomers + system.n_chains + 1))
+    local = np.empty(system.n_particles, dtype=np.int64)
+    local[order] = np.arange(system.n_particles) - np.repeat(starts[:-1], np.diff(starts))
+
+    return units, order, starts, local
+
+
+def unit_variants(system, decimals=6):
+    """
+    Group the units of a system into variants with the same particles and bonds.
+
+    A unit is a monomer, or the particles of one chain that are outside monomers. Two units are the same variant when
+    their particles have the same names, elements, and masses in the same order, the same bonds between them, and
+    the same bonds to elements of neighboring units.
+
+    Parameters
+    ----------
+    system : SystemArrays or mb.Compound
+        System to group.
+    decimals : int, optional, default=6
+        Number of decimal places kept when comparing masses.
+
+    Returns
+    -------
+    variants : numpy.ndarray
+        Array of shape (n_monomers + n_chains,) with the variant of each unit, numbered in order of first appearance,
+        or -1 for chains without particles outside monomers.
+    keys : list[bytes]
+        Digest of each variant.
+    """
+
+    system = _as_arrays(system)
+    units, order, starts, local = _units(system)
+
+    # Bonds inside units in local indices, and bonds between units as (local index, partner element) from both sides
+    bond_units = units[system.bonds]
+    inside = bond_units[:, 0] == bond_units[:, 1]
+    pairs = np.sort(local[system.bonds[inside]], axis=1)
+    pair_unit = bond_units[inside, 0]
+    links = np.concatenate([system.bonds[~inside], system.bonds[~inside][:, ::-1]])
+    link_unit = units[links[:, 0]]
+    link_values = np.stack([local[links[:, 0]], system.atomic_numbers[links[:, 1]]], axis=1)
+
+    pair_order = np.lexsort((pairs[:, 1], pairs[:, 0], pair_unit))
+    pairs, pair_unit = pairs[pair_order], pair_unit[pair_order]
+    pair_starts = np.searchsorted(pair_unit, np.arange(len(starts)))
+    link_order = np.lexsort((link_values[:, 1], link_values[:, 0], link_unit))
+    link_values, link_unit = link_values[link_order], link_unit[link_order]
+    link_starts = np.searchsorted(link_unit, np.arange(len(starts)))
+
+    names = system.names[order]
+    numbers = system.atomic_numbers[order]
+    masses = np.round(system.masses[order], decimals) + 0.0
+
+    codes = {}
+    variants = np.full(len(starts) - 1, -1, dtype=np.int64)
+    for unit in np.flatnonzero(np.diff(starts)):
+        atoms = slice(starts[unit], starts[unit + 1])
+        digest = hashlib.sha256()
+        digest.update("\n".join(names[atoms]).encode())
+        for values in (
+            numbers[atoms],
+            masses[atoms],
+            pairs[pair_starts[unit] : pair_starts[unit + 1]],
+            link_values[link_starts[unit] : link_starts[unit + 1]],
+        ):
+            digest.update(np.ascontiguousarray(values, dtype=np.float64).tobytes())
+        variants[unit] = codes.setdefault(digest.digest(), len(codes))
+
+    return variants, list(codes)
+
+
+def _forcefield_key(forcefield):
+    """Cache key of a forcefield, its name or the identity of a loaded forcefield, which is kept alive."""
+
+    if isinstance(forcefield, str):
+        return forcefield
+    _FORCEFIELDS[id(forcefield)] = forcefield
+
+    return id(forcefield)
+
+
+def resolve_charges(system, forcefield="oplsaa.xml"):
+    """
+    Assign forcefield charges to a system, typing one chain per uncached variant.
+
+    Charges of each variant are resolved by typing the first chain that contains an uncached variant, so that every
+    unit is typed in its bonded environment, and are kept for the life of the process.
+
+    Parameters
+    ----------
+    system : SystemArrays or mb.Compound
+        System to charge. The charges of a SystemArrays are replaced in place.
+    forcefield : str or foyer.Forcefield, optional, default="oplsaa.xml"
+        Forcefield, or the name of one loaded with :func:`mbuild_polybuild.toolbox.load_forcefield`.
+
+    Returns
+    -------
+    SystemArrays
+        The system with the charges of its forcefield types.
+
+    Examples
+    --------
+    >>> from mbuild_polybuild.aa_monomers import Sbma
+    >>> from mbuild_polybuild.architectures import Chain
+    >>> system = resolve_charges(to_arrays(Chain(Sbma(), n=20)))
+    >>> print(charge_report(system))
+    """
+
+    system = _as_arrays(system)
+    if system.n_particles == 0:
+        return system
+    variants, keys = unit_variants(system)
+    units, order, starts, local = _units(system)
+    cache_key = _forcefield_key(forcefield)
+    cached = {key: _CHARGE_CACHE.get((cache_key, key)) for key in keys}
+
+    unit_chain = np.full(len(variants), -1, dtype=np.int64)
+    unit_chain[units] = system.chain_index
+    typed = variants >= 0
+    first_unit = np.empty(len(keys), dtype=np.int64)
+    first_unit[variants[typed][::-1]] = np.flatnonzero(typed)[::-1]
+    for variant, unit in enumerate(first_unit):
+        # The chain typed for an earlier variant may have resolved this one
+        if cached[keys[variant]] is not None:
+            continue
+        chain = unit_chain[unit]
+        chain_units = np.flatnonzero((unit_chain == chain) & typed)
+        if isinstance(forcefield, str):
+            forcefield = load_forcefield(forcefield)
+        particles = np.flatnonzero(system.chain_index == chain)
+        structure = forcefield.apply(_subsystem(system, np.array([chain])).to_parmed())
+        charges = np.array([atom.charge for atom in structure.atoms], dtype=float)
+        for other in chain_units:
+            key = keys[variants[other]]
+            if cached[key] is None:
+                cached[key] = charges[np.searchsorted(particles, order[starts[other] : starts[other + 1]])]
+                _CHARGE_CACHE[(cache_key, key)] = cached[key]
+
+    # Gather the charge of every particle from a table of the variants' charges
+    table = np.concatenate([cached[key] for key in keys])
+    offsets = np.concatenate([[0], np.cumsum([len(cached[key]) for key in keys])])
+    system.charges[:] = table[offsets[variants[units]] + local]
+
+    return system
+
+
+class ChargeReport:
+    """
+    Net charges of the units and chains of a system.
+
+    Parameters
+    ----------
+    unit_charges : numpy.ndarray
+        Array of shape (n_monomers + n_chains,) with the net charge of each monomer followed by the net charge of the
+        particles of each chain outside monomers.
+    unit_names : numpy.ndarray
+        Monomer class name of each monomer, or residue name of the particles of each chain outside monomers.
+    chain_charges : numpy.ndarray
+        Array of shape (n_chains,) with the net charge of each chain.
+    tolerance : float, optional, default=1e-4
+        Largest absolute charge treated as neutral.
+
+    Attributes
+    ----------
+    net_charge : float
+        Net charge of the system.
+    n_monomers : int
+        Number of monomers.
+    neutral : bool
+        True if every monomer and the system are neutral.
+    """
+
+    def __init__(self, unit_charges, unit_names, chain_charges, tolerance=1e-4):
+        self.unit_charges = np.asarray(unit_charges, dtype=float)
+        self.unit_names = np.asarray(unit_names, dtype=str)
+        self.chain_charges = np.asarray(chain_charges, dtype=float)
+        self.tolerance = tolerance
+        self.n_monomers = len(self.unit_charges) - len(self.chain_charges)
+
+    @property
+    def net_charge(self):
+        return float(self.chain_charges.sum())
+
+    @property
+    def neutral(self):
+        return len(self.charged_monomers()) == 0 and abs(self.net_charge) <= self.tolerance
+
+    @property
+    def monomer_charges(self):
+        """Array of shape (n_monomers,) with the net charge of each monomer."""
+
+        return self.unit_charges[: self.n_monomers]
+
+    def charged_monomers(self):
+        """
+        Monomers whose net charge is not zero.
+
+        Returns
+        -------
+        numpy.ndarray
+            Sorted monomer indices.
+        """
+
+        return np.flatnonzero(np.abs(self.monomer_charges) > self.tolerance)
+
+    def by_name(self):
+        """
+        Number and net charge of the monomers of each class.
+
+        Returns
+        -------
+        dict
+            Dictionary of monomer class name to a tuple of the number of monomers, the number of charged monomers,
+            and their total charge.
+        """
+
+        names = self.unit_names[: self.n_monomers]
+        charged = np.abs(self.monomer_charges) > self.tolerance
+        return {
+            name: (
+                int(np.count_nonzero(names == name)),
+                int(np.count_nonzero(charged & (names == name))),
+                float(self.monomer_charges[names == name].sum()),
+            )
+            for name in np.unique(names).tolist()
+        }
+
+    def counterions(self, cation="Na", anion="Cl"):
+        """
+        Number of counter-ions that neutralize the system, see :func:`counterions`.
+
+        Parameters
+        ----------
+        cation : str, optional, default="Na"
+            Element of the cations added to a negative system.
+        anion : str, optional, default="Cl"
+            Element of the anions added to a positive system.
+
+        Returns
+        -------
+        dict
+            Dictionary of element to number of ions.
+        """
+
+        return counterions(self.net_charge, cation=cation, anion=anion, tolerance=self.tolerance)
+
+    def __str__(self):
+        lines = ["Net charge: {:.4f} in {} chains".format(self.net_charge, len(self.chain_charges))]
+        for name, (count, charged, total) in self.by_name().items():
+            lines.append("  {}: {} monomers, {} charged, total {:.4f}".format(name, count, charged, total))
+        return "\n".join(lines)
+
+
+def charge_report(system, tolerance=1e-4):
+    """
+    Net charge of every unit, chain, and the system.
+
+    Parameters
+    ----------
+    system : SystemArrays or mb.Compound
+        Charged system, e.g., from :func:`resolve_charges`.
+    tolerance : float, optional, default=1e-4
+        Largest absolute charge treated as neutral.
+
+    Returns
+    -------
+    ChargeReport
+        The net charges.
+    """
+
+    system = _as_arrays(system)
+    n_units = system.n_monomers + system.n_chains
+    units = _residue_ids(system)
+    unit_charges = np.bincount(units, weights=system.charges, minlength=n_units)
+    chain_charges = np.bincount(system.chain_index, weights=system.charges, minlength=system.n_chains)
+
+    residue_names = system.residue_names()
+    unit_names = np.array(list(system.monomer_names) + ["RES"] * system.n_chains, dtype=object)
+    free = units >= system.n_monomers
+    unit_names[units[free]] = residue_names[free]
+
+    return ChargeReport(unit_charges, unit_names, chain_charges, tolerance=tolerance)
+
+
+def counterions(net_charge, cation="Na", anion="Cl", tolerance=1e-4):
+    """
+    Number of counter-ions that neutralize a net charge.
+
+    Parameters
+    ----------
+    net_charge : float
+        Net charge in units of elementary charge.
+    cation : str, optional, default="Na"
+        Element of the cations added to a negative system, see ``ION_CHARGES``.
+    anion : str, optional, default="Cl"
+        Element of the anions added to a positive system.
+    tolerance : float, optional, default=1e-4
+        Largest distance of the net charge from a multiple of the ion charge.
+
+    Returns
+    -------
+    dict
+        Dictionary of element to number of ions, empty for a neutral system.
+    """
+
+    if ION_CHARGES.get(cation, 0) <= 0 or ION_CHARGES.get(anion, 0) >= 0:
+        raise ValueError("Cation, {}, and anion, {}, must be ions of opposite charge.".format(cation, anion))
+
+    element = anion if net_charge > 0 else cation
+    count = -net_charge / ION_CHARGES[element]
+    if abs(count - round(count)) * abs(ION_CHARGES[element]) > tolerance:
+        raise ValueError("Net charge, {}, cannot be neutralized with {} ions.".format(net_charge, element))
+
+    return {element: int(round(count))} if round(count) > 0 else {}
+
+
+def clear_charge_cache():
+    """
+    Remove all cached variant charges.
+
+    Returns
+    -------
+    int
+        Number of entries removed.
+    """
+
+    count = len(_CHARGE_CACHE)
+    _CHARGE_CACHE.clear()
+    _FORCEFIELDS.clear()
+
+    return count
@@ -0,0 +1,206 @@
+"""Checkpoint Module
+
+This module runs a build as a sequence of named stages, e.g., chain construction, packing, relaxation, typing, nbfix,
+and writing, and saves the result of each stage to disk, so that a build killed by a walltime limit or running out of
+memory resumes from its last completed stage.
+
+Array-backed systems are saved with :meth:`mbuild_polybuild.arrays.SystemArrays.save` as one buffer per ``.npz``
+file, typed ParmEd structures are pickled, and other results are stored as JSON. A ``checkpoint.json`` file in the
+checkpoint directory records the completed stages, their files, and the time each one took.
+
+Functions
+---------
+- run_stages: Run named stages in order, resuming after the last completed one.
+
+Classes
+-------
+- Checkpoint: Stage results and timings saved in a directory.
+"""
+
+import os
+import json
+import time
+import pickle
+
+from mbuild_polybuild.arrays import SystemArrays
+
+MANIFEST = "checkpoint.json"
+
+
+class Checkpoint:
+    """
+    Stage results and timings saved in a directory.
+
+    Parameters
+    ----------
+    directory : str
+        Checkpoint directory, created if it does not exist.
+    key : str, optional, default=None
+        Identifier of the build, e.g., a hash of its inputs. Checkpoints saved with a different key are discarded, so
+        a changed build is never resumed from stale stages.
+
+    Attributes
+    ----------
+    stages : list[dict]
+        Completed stages in order, each with keys "name", "file", "kind", and "seconds".
+    timings : dict
+        Seconds each completed stage took when it ran.
+    """
+
+    def __init__(self, directory, key=None):
+        self.directory = directory
+        self.key = key
+        self.stages = []
+        os.makedirs(directory, exist_ok=True)
+
+        path = os.path.join(directory, MANIFEST)
+        if os.path.isfile(path):
+            with open(path, "r") as f:
+                manifest = json.load(f)
+            if manifest.get("key") == key:
+                self.stages = [x for x in manifest["stages"] if os.path.isfile(os.path.join(directory, x["file"]))]
+        if not self.stages:
+            self._write()
+
+    @property
+    def timings(self):
+        return {x["name"]: x["seconds"] for x in self.stages}
+
+    def _write(self):
+        """Replace the manifest atomically, so that an interrupted write leaves the previous one intact."""
+
+        path = os.path.join(self.directory, MANIFEST)
+        with open(path + ".tmp", "w") as f:
+            json.dump({"key": self.key, "stages": self.stages}, f, indent=1)
+        os.replace(path + ".tmp", path)
+
+    def completed(self, name):
+        """
+        Whether a stage has completed.
+
+        Parameters
+        ----------
+        name : str
+            Stage name.
+
+        Returns
+        -------
+        bool
+            True if the result of the stage is saved.
+        """
+
+        return any(x["name"] == name for x in self.stages)
+
+    def save(self, name, result, seconds):
+        """
+        Save the result of a stage.
+
+        Parameters
+        ----------
+        name : str
+            Stage name.
+        result : SystemArrays, parmed.Structure, or JSON serializable object
+            Result of the stage.
+        seconds : float
+            Time the stage took.
+        """
+
+        index = len(self.stages)
+        if isinstance(result, SystemArrays):
+            kind, filename = "arrays", "{:02d}_{}.npz".format(index, name)
+            result.save(os.path.join(self.directory, filename))
+        elif hasattr(result, "atoms") and hasattr(result, "residues"):
+            kind, filename = "structure", "{:02d}_{}.pkl".format(index, name)
+            with open(os.path.join(self.directory, filename), "wb") as f:
+                pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        else:
+            kind, filename = "json", "{:02d}_{}.json".format(index, name)
+            with open(os.path.join(self.directory, filename), "w") as f:
+                json.dump(result, f)
+
+        self.stages = [x for x in self.stages if x["name"] != name]
+        self.stages.append({"name": name, "file": filename, "kind": kind, "seconds": seconds})
+        self._write()
+
+    def load(self, name):
+        """
+        Load the result of a completed stage.
+
+        Parameters
+        ----------
+        name : str
+            Stage name.
+
+        Returns
+        -------
+        SystemArrays, parmed.Structure, or object
+            The saved result.
+        """
+
+        stage = [x for x in self.stages if x["name"] == name][0]
+        path = os.path.join(self.directory, stage["file"])
+        if stage["kind"] == "arrays":
+            return SystemArrays.load(path)
+        if stage["kind"] == "structure":
+            with open(path, "rb") as f:
+                return pickle.load(f)
+        with open(path, "r") as f:
+            return json.load(f)
+
+
+def run_stages(stages, directory, key=None, result=None):
+    """
+    Run named stages in order, resuming after the last completed one.
+
+    Each stage is called with the result of the previous stage. If the last of a run of completed stages is found in
+    the checkpoint, its result is loaded and the stages before it are skipped.
+
+    Parameters
+    ----------
+    stages : list[tuple[str, callable]]
+        Name and function of each stage.
+    directory : str
+        Checkpoint directory, see :class:`Checkpoint`.
+    key : str, optional, default=None
+        Identifier of the build, see :class:`Checkpoint`.
+    result : object, optional, default=None
+        Input of the first stage.
+
+    Returns
+    -------
+    result : object
+        Result of the last stage.
+    timings : dict
+        Seconds each stage took in this call, with zero for stages resumed from the checkpoint.
+    resumed : list[str]
+        Names of the stages loaded from the checkpoint.
+
+    Examples
+    --------
+    >>> stages = [("pack", lambda _: build_system(spec)), ("relax", relax_copy), ("write", write)]
+    >>> result, timings, resumed = run_stages(stages, "build/psbma.checkpoint", key=spec_hash)
+    """
+
+    checkpoint = Checkpoint(directory, key=key)
+    names = [name for name, _ in stages]
+    if len(set(names)) != len(names):
+        raise ValueError("Stage names must be unique: {}".format(names))
+
+    # Resume after the last stage of the leading run of completed stages
+    start = 0
+    while start < len(stages) and checkpoint.completed(names[start]):
+        start += 1
+    resumed = names[:start]
+    if start > 0:
+        result = checkpoint.load(names[start - 1])
+    # Later stages are rerun from the resumed result, so their saved results are stale
+    checkpoint.stages = [x for x in checkpoint.stages if x["name"] in resumed]
+
+    timings = {name: 0.0 for name in resumed}
+    for name, function in stages[start:]:
+        tic = time.perf_counter()
+        result = function(result)
+        timings[name] = time.perf_counter() - tic
+        checkpoint.save(name, result, timings[name])
+
+    return result, timings, resumed
@@ -0,0 +1,112 @@
+"""Command Line Module
+
+This module provides the ``polybuild`` command, which builds and writes every system of a JSON or YAML
+specification, see :mod:`mbuild_polybuild.spec`.
+
+.. code-block:: bash
+
+    polybuild systems.yaml --processes 8 --output build
+
+With ``--serve`` the command instead runs a build server with warm workers, see :mod:`mbuild_polybuild.server`, and
+with ``--server`` a spec is built on a running server.
+
+.. code-block:: bash
+
+    polybuild --serve --processes 8 --preload Sbma Cbma &
+    polybuild systems.yaml --server http://127.0.0.1:8765
+
+Functions
+---------
+- main: Run the ``polybuild`` command.
+"""
+
+import sys
+import argparse
+
+from mbuild_polybuild.server import DEFAULT_HOST, DEFAULT_PORT, serve, submit
+from mbuild_polybuild.spec import load_spec, run_spec
+
+
+def main(argv=None):
+    """
+    Run the ``polybuild`` command.
+
+    Parameters
+    ----------
+    argv : list[str], optional, default=None
+        Command line arguments. If None, ``sys.argv[1:]`` is used.
+
+    Returns
+    -------
+    int
+        Exit status, 1 if any system failed and 0 otherwise.
+    """
+
+    parser = argparse.ArgumentParser(
+        prog="polybuild", description="Build and write the polymer systems of a JSON or YAML specification."
+    )
+    parser.add_argument("spec", nargs="?", help="Path to a .json, .yaml, or .yml system specification.")
+    parser.add_argument("-o", "--output", default=None, help="Output directory, overriding the spec.")
+    parser.add_argument("-j", "--processes", type=int, default=None, help="Number of worker processes.")
+    parser.add_argument("--cache-dir", default=None, help="Build cache directory, overriding the spec.")
+    parser.add_argument("--no-cache", action="store_true", help="Build monomers without the build cache.")
+    parser.add_argument(
+        "--checkpoint", action="store_true", help="Save each build stage and resume interrupted builds."
+    )
+    parser.add_argument("--check", action="store_true", help="Validate the spec and exit without building.")
+    parser.add_argument("--serve", action="store_true", help="Run a build server with warm workers.")
+    parser.add_argument("--server", default=None, help="Build on the server at this URL, e.g., http://127.0.0.1:8765.")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="Address the server listens on.")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Port the server listens on.")
+    parser.add_argument(
+        "--forcefield", nargs="*", default=["oplsaa.xml"], help="Forcefields the server workers load at startup."
+    )
+    parser.add_argument("--preload", nargs="*", default=[], help="Monomers the server workers build at startup.")
+    args = parser.parse_args(argv)
+
+    if args.serve:
+        serve(
+            host=args.host,
+            port=args.port,
+            processes=args.processes,
+            forcefields=args.forcefield,
+            monomers=args.preload,
+            cache_dir=False if args.no_cache else args.cache_dir,
+        )
+        return 0
+    if args.spec is None:
+        parser.error("A spec is required unless --serve is given.")
+
+    try:
+        spec = load_spec(args.spec)
+    except (OSError, ValueError, ImportError) as e:
+        parser.error(str(e))
+    if args.check:
+        print("{}: {} systems".format(args.spec, len(spec["systems"])))
+        return 0
+
+    def callback(result):
+        print("{}: {}".format(result["name"], result["error"] or result["path"]), file=sys.stderr)
+
+    cache_dir = False if args.no_cache else args.cache_dir
+    if args.checkpoint:
+        spec["checkpoint"] = True
+    if args.server is not None:
+        if args.output is not None:
+            spec["output"]["directory"] = args.output
+        if cache_dir is not None:
+            spec["cache_dir"] = cache_dir
+        report = submit(spec, url=args.server)
+        for result in report.results:
+            callback(result)
+    else:
+        report = run_spec(
+            spec, processes=args.processes, output_dir=args.output, cache_dir=cache_dir, callback=callback
+        )
+    print(report.summary())
+
+    return 1 if report.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
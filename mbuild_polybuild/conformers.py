@@ -0,0 +1,289 @@
+"""Conformers Module
+
+This module samples conformers of pendant groups and monomer side chains, so that grafted thiol-ene groups and the
+spacers of betaine monomers start from varied, low-clash conformations instead of the single conformation of their
+PDB file or the all-trans spacer.
+
+The rotatable bonds of a fragment and the atoms each one moves form a torsion tree, found once per fragment from its
+bond graph. Conformers are generated by rotating the moving atoms of every bond of the tree for a whole batch of
+conformers at once, and conformers whose nonbonded atoms come too close are discarded. Atoms bonded to ports, e.g.,
+the anchor of the port grafted onto a backbone, never move, so conformers can replace the template positions when
+copies are placed, see :func:`mbuild_polybuild.functionalize.functionalize` and
+:class:`mbuild_polybuild.architectures.Chain`.
+
+Functions
+---------
+- torsion_tree: Rotatable bonds of a fragment and the atoms each one moves.
+- rotate_torsions: Rotate the torsions of a fragment for a batch of angle sets.
+
+Classes
+-------
+- ConformerLibrary: Low-clash conformers of a template, including its ports.
+"""
+
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components, shortest_path
+
+import mbuild as mb
+
+from mbuild_polybuild.arrays import to_arrays
+
+
+def _graph(bonds, n_particles):
+    """Symmetric sparse adjacency matrix of a bond array."""
+
+    bonds = np.asarray(bonds, dtype=np.int64).reshape(-1, 2)
+    rows = np.concatenate([bonds[:, 0], bonds[:, 1]])
+    columns = np.concatenate([bonds[:, 1], bonds[:, 0]])
+
+    return coo_matrix((np.ones(len(rows)), (rows, columns)), shape=(n_particles, n_particles)).tocsr()
+
+
+def torsion_tree(bonds, n_particles, fixed=(0,), atomic_numbers=None):
+    """
+    Rotatable bonds of a fragment and the atoms each one moves.
+
+    A bond is rotatable when it is not in a ring, every ``fixed`` atom is on one side of it, and the other side has a
+    heavy atom besides the one on the bond, so that rotating methyl or hydroxyl hydrogens is skipped.
+
+    Parameters
+    ----------
+    bonds : numpy.ndarray
+        Array of shape (M, 2) of particle indices.
+    n_particles : int
+        Number of particles.
+    fixed : list[int], optional, default=(0,)
+        Particles that must not move, e.g., the anchors of the ports of a group.
+    atomic_numbers : numpy.ndarray, optional, default=None
+        Array of shape (n_particles,) used to recognize hydrogens. If None, all particles are heavy.
+
+    Returns
+    -------
+    axes : numpy.ndarray
+        Array of shape (B, 2) of the fixed and moving particle of each rotatable bond, ordered outward from
+        ``fixed[0]``.
+    moving : numpy.ndarray
+        Boolean array of shape (B, n_particles) of the particles each bond rotates.
+    """
+
+    bonds = np.asarray(bonds, dtype=np.int64).reshape(-1, 2)
+    fixed = np.asarray(fixed, dtype=np.int64)
+    heavy = np.ones(n_particles, dtype=bool) if atomic_numbers is None else np.asarray(atomic_numbers) != 1
+    depth = shortest_path(_graph(bonds, n_particles), unweighted=True, indices=fixed[0])
+
+    axes, moving = [], []
+    keep = np.ones(len(bonds), dtype=bool)
+    for k, (a, b) in enumerate(bonds):
+        keep[k] = False
+        _, labels = connected_components(_graph(bonds[keep], n_particles), directed=False)
+        keep[k] = True
+        if labels[a] == labels[b]:
+            continue
+        # Orient the bond so that the first particle is on the side of the fixed particles
+        i, j = (a, b) if labels[a] == labels[fixed[0]] else (b, a)
+        side = labels == labels[j]
+        if np.any(side[fixed]) or np.count_nonzero(side & heavy) < 2:
+            continue
+        axes.append((i, j))
+        moving.append(side)
+
+    axes = np.array(axes, dtype=np.int64).reshape(-1, 2)
+    moving = np.array(moving, dtype=bool).reshape(-1, n_particles)
+    order = np.argsort(depth[axes[:, 0]], kind="stable")
+
+    return axes[order], moving[order]
+
+
+def rotate_torsions(positions, axes, moving, angles):
+    """
+    Rotate the torsions of a fragment for a batch of angle sets.
+
+    Each bond rotates its moving particles about the bond axis, using the axis as already moved by the bonds before
+    it, so every conformer of the batch is built with one array operation per bond.
+
+    Parameters
+    ----------
+    positions : numpy.ndarray
+        Array of shape (N, 3) or (K, N, 3) of the starting positions.
+    axes : numpy.ndarray
+        Array of shape (B, 2) from :func:`torsion_tree`.
+    moving : numpy.ndarray
+        Boolean array of shape (B, N) from :func:`torsion_tree`.
+    angles : numpy.ndarray
+        Array of shape (K, B) of rotations in radians.
+
+    Returns
+    -------
+    numpy.ndarray
+        Array of shape (K, N, 3) of the rotated positions.
+    """
+
+    angles = np.asarray(angles, dtype=float).reshape(-1, len(axes))
+    result = np.array(np.broadcast_to(positions, (len(angles),) + np.shape(positions)[-2:]), dtype=float)
+
+    for (i, j), mask, angle in zip(axes, moving, angles.T):
+        origin = result[:, i]
+        axis = result[:, j] - origin
+        axis /= np.linalg.norm(axis, axis=1, keepdims=True)
+        vectors = result[:, mask] - origin[:, None]
+        cos, sin = np.cos(angle)[:, None, None], np.sin(angle)[:, None, None]
+        axis = axis[:, None]
+        # Rodrigues' rotation formula
+        result[:, mask] = (
+            origin[:, None]
+            + vectors * cos
+            + np.cross(axis, vectors) * sin
+            + axis * np.sum(axis * vectors, axis=2, keepdims=True) * (1.0 - cos)
+        )
+
+    return result
+
+
+def _port_owners(template):
+    """Particle each particle of ``xyz_with_ports`` moves with, its own index or its port's anchor, or -1."""
+
+    particles = list(template.particles())
+    index = {id(particle): i for i, particle in enumerate(particles)}
+    owners, is_port = [], []
+    for particle in template.particles(include_ports=True):
+        port = next((x for x in [particle] + list(particle.ancestors()) if isinstance(x, mb.Port)), None)
+        is_port.append(port is not None)
+        owners.append(index[id(particle)] if port is None else index.get(id(port.anchor), -1))
+
+    return np.array(owners, dtype=np.int64), np.array(is_port, dtype=bool)
+
+
+class ConformerLibrary:
+    """
+    Low-clash conformers of a template, including its ports.
+
+    Candidates rotate each rotatable bond by -120, 0, or 120 degrees plus a normal jitter, which keeps staggered
+    torsions of the template staggered. The first conformer is always the template itself.
+
+    Parameters
+    ----------
+    template : mb.Compound
+        Fragment to sample, e.g., a thiol-ene group or a monomer. It is not modified.
+    n_conformers : int, optional, default=32
+        Number of conformers.
+    fixed_ports : list[str], optional, default=None
+        Labels of the ports whose anchors must not move. If None, the anchors of all open ports are fixed.
+    clash_distance : float, optional, default=0.2
+        Smallest distance in nm between particles more than three bonds apart in an accepted conformer.
+    jitter : float, optional, default=15.0
+        Standard deviation in degrees added to each rotation.
+    oversample : int, optional, default=8
+        Number of candidates generated per conformer.
+    seed : int, optional, default=None
+        Seed for reproducible sampling.
+
+    Attributes
+    ----------
+    positions : numpy.ndarray
+        Array of shape (n_conformers, P, 3) of the ``xyz_with_ports`` of each conformer.
+    min_distances : numpy.ndarray
+        Array of shape (n_conformers,) of the closest approach of particles more than three bonds apart.
+    axes, moving : numpy.ndarray
+        Torsion tree of the template, see :func:`torsion_tree`.
+
+    Examples
+    --------
+    >>> from mbuild_polybuild.aa_functional_groups import TFTP
+    >>> library = ConformerLibrary(TFTP(), n_conformers=64, seed=1)
+    >>> positions = library.sample(100, rng=np.random.default_rng(1))
+    """
+
+    def __init__(
+        self, template, n_conformers=32, fixed_ports=None, clash_distance=0.2, jitter=15.0, oversample=8, seed=None
+    ):
+        system = to_arrays(template)
+        if fixed_ports is None:
+            ports = template.available_ports()
+        else:
+            ports = [template[label] for label in fixed_ports]
+        index = {id(particle): i for i, particle in enumerate(template.particles())}
+        fixed = [index[id(port.anchor)] for port in ports if port.anchor is not None] or [0]
+
+        self.axes, self.moving = torsion_tree(
+            system.bonds, system.n_particles, fixed=fixed, atomic_numbers=system.atomic_numbers
+        )
+        self.clash_distance = clash_distance
+
+        # Particles more than three bonds apart, or in different molecules, are checked for clashes
+        separation = shortest_path(_graph(system.bonds, system.n_particles), unweighted=True)
+        self._pairs = np.argwhere(np.triu(separation > 3, k=1))
+
+        # Lift the torsion tree to the particles of xyz_with_ports, with port particles following their anchors
+        owners, is_port = _port_owners(template)
+        self._where = np.empty(system.n_particles, dtype=np.int64)
+        self._where[owners[~is_port]] = np.flatnonzero(~is_port)
+        moving = np.zeros((len(self.axes), len(owners)), dtype=bool)
+        moving[:, owners >= 0] = self.moving[:, owners[owners >= 0]]
+
+        rng = np.random.default_rng(seed)
+        angles = rng.choice(
+            [-2.0 * np.pi / 3.0, 0.0, 2.0 * np.pi / 3.0], size=(n_conformers * oversample, len(self.axes))
+        )
+        angles += np.deg2rad(jitter) * rng.standard_normal(angles.shape)
+        angles[0] = 0.0
+        candidates = rotate_torsions(template.xyz_with_ports, self._where[self.axes], moving, angles)
+
+        distances = self.clash_distances(candidates[:, self._where])
+        # The template first, then accepted candidates in the order drawn, then the least clashing of the rest
+        accepted = np.flatnonzero(distances[1:] >= clash_distance) + 1
+        rejected = np.flatnonzero(distances[1:] < clash_distance) + 1
+        rejected = rejected[np.argsort(-distances[rejected], kind="stable")]
+        chosen = np.concatenate([[0], accepted, rejected])[:n_conformers]
+
+        self.positions = candidates[chosen]
+        self.min_distances = distances[chosen]
+        # One array per conformer, so that copies sharing a conformer are moved together by batch_force_overlap
+        self._views = list(self.positions)
+
+    @property
+    def n_conformers(self):
+        return len(self.positions)
+
+    def clash_distances(self, positions):
+        """
+        Closest approach of particles more than three bonds apart.
+
+        Parameters
+        ----------
+        positions : numpy.ndarray
+            Array of shape (K, N, 3) of the particles of the template, without ports.
+
+        Returns
+        -------
+        numpy.ndarray
+            Array of shape (K,) of distances in nm, infinite for templates without such pairs.
+        """
+
+        positions = np.asarray(positions, dtype=float)
+        if len(self._pairs) == 0:
+            return np.full(len(positions), np.inf)
+        vectors = positions[:, self._pairs[:, 0]] - positions[:, self._pairs[:, 1]]
+
+        return np.sqrt(np.min(np.sum(vectors**2, axis=2), axis=1))
+
+    def sample(self, n, rng=None):
+        """
+        Choose a conformer for each of ``n`` copies.
+
+        Parameters
+        ----------
+        n : int
+            Number of copies.
+        rng : numpy.random.Generator or int, optional, default=None
+            Random generator or seed.
+
+        Returns
+        -------
+        list[numpy.ndarray]
+            The ``xyz_with_ports`` of each copy. Copies given the same conformer share one array.
+        """
+
+        choices = np.random.default_rng(rng).integers(self.n_conformers, size=n)
+
+        return [self._views[i] for i in choices]
@@ -0,0 +1,225 @@
+"""Functionalize Module
+
+This module grafts functional groups onto the open side group ports of built chains or boxes, as in the
+post-polymerization thiol-ene modification of a backbone with the thioether groups of
+:mod:`mbuild_polybuild.aa_functional_groups`, e.g., ``MHTA``, ``MPTB``, ``PTP``, ``TFTB``, ``TFTP``, ``TMSTB``, and
+``MEA``.
+
+Each group is built once per process and cloned, and all clones are placed, bonded, and their ports consumed with one
+call to :func:`mbuild_polybuild.transforms.batch_force_overlap`. Copies may take conformers sampled once per group, see
+:mod:`mbuild_polybuild.conformers`.
+
+Functions
+---------
+- select_sites: Choose the reactive sites to graft by fraction, pattern, or at random.
+- site_ports: Open ports of a compound with a given label.
+- functionalize: Graft copies of a functional group onto the open ports of a compound.
+"""
+
+from functools import lru_cache
+
+import numpy as np
+
+import mbuild_polybuild.aa_functional_groups as aa_functional_groups
+from mbuild_polybuild.conformers import ConformerLibrary
+from mbuild_polybuild.transforms import batch_force_overlap, open_ports
+
+THIOL_GROUPS = ["MEA", "MHTA", "MPTB", "PTP", "TFTB", "TFTP", "TMSTB"]
+
+
+@lru_cache(maxsize=None)
+def _group_template(name):
+    """
+    Functional group template, built once per name and process.
+
+    The template must not be modified, clone it instead.
+
+    Parameters
+    ----------
+    name : str
+        Class name of a group in :mod:`mbuild_polybuild.aa_functional_groups`.
+
+    Returns
+    -------
+    mb.Compound
+        The functional group.
+    """
+
+    return getattr(aa_functional_groups, name)()
+
+
+@lru_cache(maxsize=None)
+def _group_library(name, n_conformers):
+    """
+    Conformer library of a functional group template, sampled once per name, size, and process.
+
+    Parameters
+    ----------
+    name : str
+        Class name of a group in :mod:`mbuild_polybuild.aa_functional_groups`.
+    n_conformers : int
+        Number of conformers.
+
+    Returns
+    -------
+    ConformerLibrary
+        Conformers of the group with its open ports fixed.
+    """
+
+    return ConformerLibrary(_group_template(name), n_conformers=n_conformers, seed=0)
+
+
+def select_sites(n_sites, fraction=1.0, pattern=None, random=False, seed=None):
+    """
+    Choose the reactive sites to graft by fraction, pattern, or at random.
+
+    Parameters
+    ----------
+    n_sites : int
+        Number of candidate sites.
+    fraction : float, optional, default=1.0
+        Fraction of sites to graft, rounded to the nearest number of sites. Ignored if ``pattern`` is given.
+    pattern : str, optional, default=None
+        Repeating pattern of "1" for grafted and "0" for skipped sites, e.g., "100" grafts every third site.
+    random : bool, optional, default=False
+        If True, sites are chosen at random, otherwise they are spaced as evenly as possible.
+    seed : int, optional, default=None
+        Seed for reproducible random selection.
+
+    Returns
+    -------
+    numpy.ndarray
+        Sorted indices of the selected sites.
+    """
+
+    if pattern is not None:
+        if len(pattern) == 0 or set(pattern) - {"0", "1"}:
+            raise ValueError("Pattern, {}, must consist of '0' and '1'".format(pattern))
+        mask = np.array([x == "1" for x in pattern], dtype=bool)
+        return np.flatnonzero(np.resize(mask, n_sites))
+
+    if not 0.0 <= fraction <= 1.0:
+        raise ValueError("fraction must be between 0 and 1")
+    n_selected = int(round(fraction * n_sites))
+    if random:
+        rng = np.random.default_rng(seed)
+        return np.sort(rng.choice(n_sites, size=n_selected, replace=False))
+
+    if n_selected == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    return np.floor(np.arange(n_selected) * n_sites / n_selected).astype(np.int64)
+
+
+def site_ports(compound, label="port[1]"):
+    """
+    Open ports of a compound with a given label.
+
+    Ports are found anywhere in the compound, including those of its monomers, see
+    :func:`mbuild_polybuild.transforms.open_ports`.
+
+    Parameters
+    ----------
+    compound : mb.Compound
+        A chain or box of chains.
+    label : str, optional, default="port[1]"
+        Label of the ports in any compound between them and ``compound``, e.g., "port[1]" for
+        ``Methacrylate(cap_branch=False)`` or "branch_up" for ``Bead(name="_B", Nports=3)``. If None, all open ports
+        are returned.
+
+    Returns
+    -------
+    list[mb.Port]
+        Open ports in order of appearance in the compound.
+    """
+
+    return [port for port, labels in open_ports(compound) if label is None or label in labels]
+
+
+def functionalize(
+    compound,
+    group,
+    label="port[1]",
+    fraction=1.0,
+    pattern=None,
+    random=False,
+    seed=None,
+    group_port=None,
+    conformers=None,
+):
+    """
+    Graft copies of a functional group onto the open ports of a compound.
+
+    Each copy is added to the compound that holds its target port, so the grafted atoms belong to the monomer they
+    are attached to.
+
+    Parameters
+    ----------
+    compound : mb.Compound
+        A chain or box of chains, modified in place.
+    group : str or mb.Compound
+        Functional group template, either the name of a thiol-ene group, one of ``THIOL_GROUPS``, or a compound that
+        is cloned and not modified.
+    label : str, optional, default="port[1]"
+        Label of the reactive ports, see :func:`site_ports`.
+    fraction : float, optional, default=1.0
+        Fraction of reactive ports to graft, see :func:`select_sites`.
+    pattern : str, optional, default=None
+        Repeating pattern of grafted sites, see :func:`select_sites`.
+    random : bool, optional, default=False
+        If True, sites are chosen at random.
+    seed : int, optional, default=None
+        Seed for reproducible random selection.
+    group_port : str, optional, default=None
+        Label of the port on the group bonded to the compound. If None, the group must have one open port.
+    conformers : int or ConformerLibrary, optional, default=None
+        Conformers of the group, or the number to sample, see :class:`mbuild_polybuild.conformers.ConformerLibrary`.
+        Each grafted copy takes a random conformer, chosen with ``seed``. If None, every copy keeps the conformation
+        of the template.
+
+    Returns
+    -------
+    numpy.ndarray
+        Indices of the grafted ports in the order of :func:`site_ports`.
+
+    Examples
+    --------
+    >>> from mbuild_polybuild.aa_monomers import Methacrylate
+    >>> from mbuild_polybuild.architectures import Chain
+    >>> chain = Chain(Methacrylate(cap_branch=False), n=50)
+    >>> grafted = functionalize(chain, "MHTA", fraction=0.3, random=True, seed=1)
+    """
+
+    if isinstance(group, str):
+        if group not in THIOL_GROUPS:
+            raise ValueError("Group, {}, is not one of {}".format(group, THIOL_GROUPS))
+        template = _group_template(group)
+    else:
+        template = group
+
+    if group_port is None:
+        template_ports = template.available_ports()
+        if len(template_ports) != 1:
+            raise ValueError("group_port must be given for a group with {} open ports".format(len(template_ports)))
+        group_port = [key for key, value in template.labels.items() if value is template_ports[0]][0]
+
+    ports = site_ports(compound, label=label)
+    sites = select_sites(len(ports), fraction=fraction, pattern=pattern, random=random, seed=seed)
+    targets = [ports[i] for i in sites]
+
+    if conformers is None:
+        positions = [template.xyz_with_ports] * len(targets)
+    else:
+        if not isinstance(conformers, ConformerLibrary):
+            if isinstance(group, str):
+                conformers = _group_library(group, int(conformers))
+            else:
+                conformers = ConformerLibrary(template, n_conformers=int(conformers), fixed_ports=[group_port], seed=0)
+        positions = conformers.sample(len(targets), rng=None if seed is None else [seed, 1])
+
+    groups = [template.clone() for _ in targets]
+    for copy, port in zip(groups, targets):
+        port.parent.add(copy, "functional_group[$]")
+    batch_force_overlap(groups, [x[group_port] for x in groups], targets, positions=positions)
+
+    return sites
@@ -0,0 +1,435 @@
+"""GROMACS Module
+
+This module writes array-backed systems to GROMACS ``.top`` and ``.gro`` files without building a ParmEd structure of
+the whole system.
+
+Chains with the same particles, charges, masses, and bonds share one ``[ moleculetype ]``, which is typed and written
+once from a representative chain, and ``[ molecules ]`` lists the number of consecutive copies of each type.
+Chains built from the same sequence share a type regardless of tacticity, since stereochemistry changes positions but
+not the topology. Coordinates are written to the ``.gro`` file in chunks of formatted lines.
+
+Functions
+---------
+- chain_types: Group identical chains into molecule types.
+- write_top: Write a GROMACS topology with one molecule type per unique chain.
+- write_gro: Stream coordinates to a GROMACS ``.gro`` file in chunks.
+- write_gromacs: Write the topology and coordinates of a system.
+- write_tiled_gromacs: Write the topology and coordinates of a periodic system tiled into a larger box.
+"""
+
+import hashlib
+import io
+
+import numpy as np
+from parmed.gromacs import GromacsTopologyFile
+
+from mbuild_polybuild.arrays import SystemArrays, _tile_images, to_arrays
+from mbuild_polybuild.toolbox import apply_nbfix, load_forcefield
+
+
+def _as_arrays(system):
+    """Arrays of a compound or system."""
+
+    return system if isinstance(system, SystemArrays) else to_arrays(system)
+
+
+def _atom_order(system):
+    """Particle indices ordered by chain, keeping the order of particles within each chain."""
+
+    return np.argsort(system.chain_index, kind="stable")
+
+
+def _residue_ids(system):
+    """Residue of each particle, one per monomer and one per chain for particles outside monomers."""
+
+    return np.where(system.monomer_index >= 0, system.monomer_index, system.n_monomers + system.chain_index)
+
+
+def _chain_keys(system, decimals=6):
+    """Digest of the particles, masses, charges, and bonds of each chain of a system, in chain order."""
+
+    order = _atom_order(system)
+    starts = np.searchsorted(system.chain_index[order], np.arange(system.n_chains + 1))
+    local = np.empty(system.n_particles, dtype=np.int64)
+    local[order] = np.arange(system.n_particles) - np.repeat(starts[:-1], np.diff(starts))
+
+    # Bonds in local indices, sorted so that each chain's bonds are a contiguous block in a canonical order
+    bond_chain = system.chain_index[system.bonds[:, 0]]
+    pairs = np.sort(local[system.bonds], axis=1)
+    bond_order = np.lexsort((pairs[:, 1], pairs[:, 0], bond_chain))
+    pairs, bond_chain = pairs[bond_order], bond_chain[bond_order]
+    bond_starts = np.searchsorted(bond_chain, np.arange(system.n_chains + 1))
+
+    names = system.names[order]
+    residues = system.residue_names()[order]
+    numbers = system.atomic_numbers[order]
+    masses = np.round(system.masses[order], decimals) + 0.0
+    charges = np.round(system.charges[order], decimals) + 0.0
+
+    keys = []
+    for chain in range(system.n_chains):
+        atoms = slice(starts[chain], starts[chain + 1])
+        digest = hashlib.sha256()
+        digest.update("\n".join(names[atoms]).encode())
+        digest.update("\n".join(residues[atoms]).encode())
+        for values in (
+            numbers[atoms],
+            masses[atoms],
+            charges[atoms],
+            pairs[bond_starts[chain] : bond_starts[chain + 1]],
+        ):
+            digest.update(np.ascontiguousarray(values).tobytes())
+        keys.append(digest.digest())
+
+    return keys
+
+
+def chain_types(system, decimals=6):
+    """
+    Group identical chains into molecule types.
+
+    Two chains are identical when their particles have the same names, residue names, elements, masses, and charges
+    in the same order, and the same bonds between them.
+
+    Parameters
+    ----------
+    system : SystemArrays or mb.Compound
+        System to group.
+    decimals : int, optional, default=6
+        Number of decimal places kept when comparing masses and charges.
+
+    Returns
+    -------
+    types : numpy.ndarray
+        Array of shape (C,) with the molecule type of each chain, numbered in order of first appearance.
+    representatives : numpy.ndarray
+        Array of shape (T,) with the first chain of each type.
+    """
+
+    system = _as_arrays(system)
+    keys = {}
+    types = np.empty(system.n_chains, dtype=np.int64)
+    representatives = []
+    for chain, key in enumerate(_chain_keys(system, decimals=decimals)):
+        if key not in keys:
+            keys[key] = len(representatives)
+            representatives.append(chain)
+        types[chain] = keys[key]
+
+    return types, np.array(representatives, dtype=np.int64)
+
+
+def _subsystem(system, chains):
+    """System of the given chains, in order."""
+
+    particles = np.flatnonzero(np.isin(system.chain_index, chains))
+    particles = particles[np.argsort(np.searchsorted(chains, system.chain_index[particles]), kind="stable")]
+    index = np.full(system.n_particles, -1, dtype=np.int64)
+    index[particles] = np.arange(len(particles))
+    bonds = index[system.bonds]
+    bonds = bonds[np.all(bonds >= 0, axis=1)]
+
+    monomers, monomer_index = np.unique(system.monomer_index[particles], return_inverse=True)
+    has_monomers = monomers >= 0
+    result = SystemArrays(
+        len(particles),
+        len(bonds),
+        names=system.names[particles],
+        monomer_names=[system.monomer_names[x] for x in monomers[has_monomers]],
+        box=system.box,
+    )
+    for name in ["positions", "atomic_numbers", "masses", "charges"]:
+        getattr(result, name)[:] = getattr(system, name)[particles]
+    result.monomer_index[:] = monomer_index - np.count_nonzero(~has_monomers)
+    result.bonds[:] = bonds
+    result.update_chain_index()
+
+    return result
+
+
+def write_top(
+    system, filename, forcefield=None, title="mbuild_polybuild system", types=None, nbfix=None, nbfix_units="real"
+):
+    """
+    Write a GROMACS topology with one molecule type per unique chain.
+
+    Parameters
+    ----------
+    system : SystemArrays or mb.Compound
+        System to write.
+    filename : str or file-like
+        Output ``.top`` file.
+    forcefield : str or foyer.Forcefield, optional, default=None
+        Forcefield applied to the representative chains, or the name of one loaded with
+        :func:`mbuild_polybuild.toolbox.load_forcefield`, e.g., "oplsaa.xml". If None, the atoms are written untyped.
+    title : str, optional, default="mbuild_polybuild system"
+        Title of the ``[ system ]`` section.
+    types : tuple, optional, default=None
+        Output of :func:`chain_types`, if already computed.
+    nbfix : str, optional, default=None
+        File of pair-specific nonbonded parameters applied after typing, see
+        :func:`mbuild_polybuild.toolbox.apply_nbfix`.
+    nbfix_units : str, optional, default="real"
+        Unit system of the ``nbfix`` parameters.
+
+    Returns
+    -------
+    list[tuple[str, int]]
+        Entries of the ``[ molecules ]`` section, the name and number of consecutive copies of each type.
+    """
+
+    system = _as_arrays(system)
+    chain_type, representatives = chain_types(system) if types is None else types
+
+    structure = _subsystem(system, representatives).to_parmed()
+    if forcefield is not None:
+        if isinstance(forcefield, str):
+            forcefield = load_forcefield(forcefield)
+        structure = forcefield.apply(structure)
+        if nbfix is not None:
+            structure = apply_nbfix(structure, nbfix, units=nbfix_units)
+    topology = GromacsTopologyFile.from_structure(structure)
+    topology.title = title
+    buffer = io.StringIO()
+    topology.write(buffer)
+    text = buffer.getvalue()
+
+    # The molecule names ParmEd chose for the representatives, in order, expanding types it merged
+    head, _, tail = text.rpartition("[ molecules ]")
+    names = []
+    for line in tail.splitlines():
+        fields = line.split(";")[0].split()
+        if len(fields) == 2:
+            names.extend([fields[0]] * int(fields[1]))
+    if len(names) != len(representatives):
+        raise ValueError("Expected {} molecule types, found {}".format(len(representatives), len(names)))
+
+    # Run length encoding of the type of each chain in order
+    changes = np.flatnonzero(np.diff(chain_type) != 0) + 1
+    starts = np.concatenate([[0], changes])
+    counts = np.diff(np.concatenate([starts, [len(chain_type)]]))
+    molecules = [(names[chain_type[start]], int(count)) for start, count in zip(starts, counts)]
+
+    lines = ["[ molecules ]", "; Compound       #mols"]
+    lines.extend("{:<20s}{:>8d}".format(name, count) for name, count in molecules)
+    text = head + "\n".join(lines) + "\n"
+
+    if hasattr(filename, "write"):
+        filename.write(text)
+    else:
+        with open(filename, "w") as f:
+            f.write(text)
+
+    return molecules
+
+
+def write_gro(system, filename, title="mbuild_polybuild system", chunk=100000):
+    """
+    Stream coordinates to a GROMACS ``.gro`` file in chunks.
+
+    Particles are written in chain order, matching :func:`write_top`. Residue and atom numbers wrap at 100000, as
+    GROMACS expects.
+
+    Parameters
+    ----------
+    system : SystemArrays or mb.Compound
+        System to write, with positions in nm.
+    filename : str or file-like
+        Output ``.gro`` file.
+    title : str, optional, default="mbuild_polybuild system"
+        Title line.
+    chunk : int, optional, default=100000
+        Number of particles formatted and written at a time.
+    """
+
+    system = _as_arrays(system)
+    box = system.box
+    if box is None:
+        box = np.ptp(system.positions, axis=0) if system.n_particles > 0 else np.zeros(3)
+
+    f = filename if hasattr(filename, "write") else open(filename, "w")
+    try:
+        f.write("{}\n{:5d}\n".format(title, system.n_particles))
+        _write_gro_atoms(f, system, chunk=chunk)
+        f.write("{:10.5f}{:10.5f}{:10.5f}\n".format(*box))
+    finally:
+        if f is not filename:
+            f.close()
+
+
+def _write_gro_atoms(f, system, chunk=100000, first_atom=0, first_residue=0, offsets=None):
+    """
+    Write the atom lines of a system in chain order, numbered after the given atom and residue counts.
+
+    If ``offsets`` is given, one copy of the system is written per row, shifted by that row.
+    """
+
+    if system.n_particles == 0:
+        return 0
+    offsets = np.zeros((1, 3)) if offsets is None else np.asarray(offsets, dtype=float).reshape(-1, 3)
+    order = _atom_order(system)
+    residue_ids = _residue_ids(system)[order]
+    residue_counts = np.cumsum(np.concatenate([[True], np.diff(residue_ids) != 0]))
+    n_residues = int(residue_counts[-1])
+    # The residue and atom names of each line are the same in every copy, so they are formatted once
+    labels = [
+        "{:<5.5s}{:>5.5s}".format(resname, name)
+        for resname, name in zip(system.residue_names()[order].tolist(), system.names[order].tolist())
+    ]
+    positions = system.positions[order]
+
+    for image, offset in enumerate(offsets):
+        residue_numbers = (first_residue + image * n_residues + residue_counts) % 100000
+        atom_numbers = (first_atom + image * system.n_particles + np.arange(1, system.n_particles + 1)) % 100000
+        for start in range(0, system.n_particles, chunk):
+            stop = start + chunk
+            rows = zip(
+                residue_numbers[start:stop].tolist(),
+                labels[start:stop],
+                atom_numbers[start:stop].tolist(),
+                (positions[start:stop] + offset).tolist(),
+            )
+            f.write(
+                "".join(
+                    "{:5d}{}{:5d}{:8.3f}{:8.3f}{:8.3f}\n".format(resid, label, atom, *xyz)
+                    for resid, label, atom, xyz in rows
+                )
+            )
+
+    # Returned so that systems written in consecutive blocks continue the residue numbering
+    return n_residues * len(offsets)
+
+
+def write_gromacs(
+    system,
+    top,
+    gro,
+    forcefield=None,
+    title="mbuild_polybuild system",
+    chunk=100000,
+    nbfix=None,
+    nbfix_units="real",
+):
+    """
+    Write the topology and coordinates of a system.
+
+    Parameters
+    ----------
+    system : SystemArrays or mb.Compound
+        System to write, e.g., from :func:`mbuild_polybuild.arrays.replicate` or
+        :func:`mbuild_polybuild.polydisperse.build_ensemble`.
+    top : str or file-like
+        Output ``.top`` file.
+    gro : str or file-like
+        Output ``.gro`` file.
+    forcefield : str or foyer.Forcefield, optional, default=None
+        Forcefield applied to the representative chains, see :func:`write_top`.
+    title : str, optional, default="mbuild_polybuild system"
+        Title of both files.
+    chunk : int, optional, default=100000
+        Number of particles written to the ``.gro`` file at a time.
+    nbfix : str, optional, default=None
+        File of pair-specific nonbonded parameters, see :func:`write_top`.
+    nbfix_units : str, optional, default="real"
+        Unit system of the ``nbfix`` parameters.
+
+    Returns
+    -------
+    list[tuple[str, int]]
+        Entries of the ``[ molecules ]`` section.
+
+    Examples
+    --------
+    >>> from mbuild_polybuild.aa_monomers import Sbma
+    >>> from mbuild_polybuild.architectures import Chain
+    >>> from mbuild_polybuild.arrays import replicate, to_arrays
+    >>> chain = to_arrays(Chain(Sbma(), n=20))
+    >>> offsets = np.arange(10)[:, None, None] * np.array([2.0, 0.0, 0.0])
+    >>> box = replicate(chain, chain.positions + offsets)
+    >>> write_gromacs(box, "system.top", "system.gro", forcefield="oplsaa.xml")
+    """
+
+    system = _as_arrays(system)
+    molecules = write_top(system, top, forcefield=forcefield, title=title, nbfix=nbfix, nbfix_units=nbfix_units)
+    write_gro(system, gro, title=title, chunk=chunk)
+
+    return molecules
+
+
+def write_tiled_gromacs(
+    system,
+    reps,
+    top,
+    gro,
+    forcefield=None,
+    title="mbuild_polybuild system",
+    chunk=100000,
+    nbfix=None,
+    nbfix_units="real",
+    box=None,
+):
+    """
+    Write the topology and coordinates of a periodic system tiled into a larger box.
+
+    The tiling is never built. Molecule types are found and typed once for the unit cell, the ``[ molecules ]`` of
+    the unit cell are repeated for each image, and the coordinates of each image are written by shifting the unit
+    cell, so the time is that of formatting the ``.gro`` file. The files match those of :func:`write_gromacs` on
+    :func:`mbuild_polybuild.arrays.tile` of the system.
+
+    Parameters
+    ----------
+    system : SystemArrays or mb.Compound
+        Unit cell to tile, e.g., an equilibrated box of chains and ions.
+    reps : int or list[int]
+        Number of images along each axis, or along all three.
+    top : str or file-like
+        Output ``.top`` file.
+    gro : str or file-like
+        Output ``.gro`` file.
+    forcefield : str or foyer.Forcefield, optional, default=None
+        Forcefield applied to the representative chains, see :func:`write_top`.
+    title : str, optional, default="mbuild_polybuild system"
+        Title of both files.
+    chunk : int, optional, default=100000
+        Number of particles written to the ``.gro`` file at a time.
+    nbfix : str, optional, default=None
+        File of pair-specific nonbonded parameters, see :func:`write_top`.
+    nbfix_units : str, optional, default="real"
+        Unit system of the ``nbfix`` parameters.
+    box : numpy.ndarray, optional, default=None
+        Box lengths of the unit cell in nm. If None, the box of ``system`` is used.
+
+    Returns
+    -------
+    list[tuple[str, int]]
+        Entries of the ``[ molecules ]`` section.
+
+    Examples
+    --------
+    >>> unit = SystemArrays.load("equilibrated.npz")
+    >>> write_tiled_gromacs(unit, [5, 5, 4], "large.top", "large.gro", forcefield="oplsaa.xml")
+    """
+
+    system = _as_arrays(system)
+    total, offsets = _tile_images(reps, system.box if box is None else box)
+    chain_type, representatives = chain_types(system)
+    molecules = write_top(
+        system,
+        top,
+        forcefield=forcefield,
+        title=title,
+        types=(np.tile(chain_type, len(offsets)), representatives),
+        nbfix=nbfix,
+        nbfix_units=nbfix_units,
+    )
+
+    f = gro if hasattr(gro, "write") else open(gro, "w")
+    try:
+        f.write("{}\n{:5d}\n".format(title, system.n_particles * len(offsets)))
+        _write_gro_atoms(f, system, chunk=chunk, offsets=offsets)
+        f.write("{:10.5f}{:10.5f}{:10.5f}\n".format(*total))
+    finally:
+        if f is not gro:
+            f.close()
+
+    return molecules
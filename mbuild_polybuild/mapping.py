@@ -0,0 +1,594 @@
+"""Mapping Module
+
+This module maps all-atom systems of ``Sbma``, ``Sbaa``, and ``Cbma`` monomers onto the beads of the coarse-grained
+``cg_monomers.Betaine`` model, so that all-atom coordinates and trajectories can be compared with, or used to
+parametrize, the coarse-grained model.
+
+The atoms of each bead are taken from the labeled sub-compounds of the all-atom monomer:
+
+- _B: The backbone, "methacrylate" or "acrylamide", without its ester or amide group unless ``polar_backbone=False``.
+- _P: The ester or amide group of the backbone, if ``polar_backbone=True``.
+- _BP: The methylene groups of "spacer_backbone" and "spacer_ion", split into contiguous groups.
+- _C: The "ammonium" cation.
+- _A: The "sulfonate" or carboxylate "ester" anion.
+
+The atom groups are derived once per monomer variant and assembled into one sparse matrix of atom weights for the whole
+system, which maps every frame of a trajectory with a single sparse matrix product. Particles outside betaine monomers,
+such as ions, are kept as their own beads.
+
+Coarse-grained systems are mapped back to all-atom systems by fitting an all-atom template of each monomer variant,
+built once per process, onto the beads of every monomer in one batched Kabsch fit. Templates of both backbone
+handedness are fit, and each monomer keeps the better fit, so the tacticity of the coarse-grained chain is kept.
+
+Functions
+---------
+- monomer_beads: Bead names and atom groups of an all-atom betaine monomer.
+- build_mapping: Build the mapping of a compound onto coarse-grained beads.
+- map_trajectory: Map a trajectory file onto beads, streaming chunks of frames from disk.
+- backmap: Build an all-atom system from coarse-grained betaine beads.
+
+Classes
+-------
+- Mapping: A sparse linear map from atom positions to bead positions.
+"""
+
+from functools import lru_cache
+
+import mdtraj
+import numpy as np
+from scipy.sparse import coo_matrix, csr_matrix, triu
+
+import mbuild_polybuild.aa_monomers as aa_monomers
+from mbuild_polybuild.aa_functional_groups.amide import Amide
+from mbuild_polybuild.aa_functional_groups.ester import Ester
+from mbuild_polybuild.arrays import SystemArrays, to_arrays
+from mbuild_polybuild.topology import adjacency
+from mbuild_polybuild.transforms import apply_transform, rigid_transform
+
+_BACKBONE_LABELS = ["methacrylate", "acrylamide"]
+_ANION_LABELS = ["sulfonate", "ester"]
+
+
+def _methylene_groups(spacer, local):
+    """Local particle indices of each methylene group of a spacer, in order."""
+
+    groups = []
+    for particle in spacer.particles():
+        if particle.name == "C":
+            groups.append([])
+        groups[-1].append(local[id(particle)])
+
+    return groups
+
+
+def monomer_beads(monomer, polar_backbone=False, spacer_backbone=None, spacer_ion=None):
+    """
+    Bead names and atom groups of an all-atom betaine monomer.
+
+    Parameters
+    ----------
+    monomer : mb.Compound
+        An ``Sbma``, ``Sbaa``, or ``Cbma`` monomer.
+    polar_backbone : bool, optional, default=False
+        If True, the ester or amide group of the backbone is mapped to a "_P" bead, otherwise it is part of the "_B"
+        bead.
+    spacer_backbone : int, optional, default=None
+        Number of coarse-grained backbone spacer beads, including the "_P" bead, as in ``Betaine``. If None, each
+        methylene group of the all-atom spacer is a bead.
+    spacer_ion : int, optional, default=None
+        Number of coarse-grained spacer beads between the ions. If None, each methylene group is a bead.
+
+    Returns
+    -------
+    names : list[str]
+        Bead names in the particle order of ``Betaine(backbone_length=1, ...)``.
+    groups : list[numpy.ndarray]
+        Indices of the atoms of each bead in the order of ``monomer.particles()``.
+    """
+
+    local = {id(particle): i for i, particle in enumerate(monomer.particles())}
+    labels = monomer.labels
+    try:
+        backbone = [labels[x] for x in _BACKBONE_LABELS if x in labels][0]
+        anion = [labels[x] for x in _ANION_LABELS if x in labels][0]
+        cation = labels["ammonium"]
+        backbone_spacer = _methylene_groups(labels["spacer_backbone"], local)
+        ion_spacer = _methylene_groups(labels["spacer_ion"], local)
+    except (IndexError, KeyError):
+        raise ValueError("{} is not an all-atom betaine monomer.".format(type(monomer).__name__))
+
+    polar = [
+        local[id(x)] for child in backbone.children if isinstance(child, (Ester, Amide)) for x in child.particles()
+    ]
+    polar_set = set(polar)
+    base = [local[id(x)] for x in backbone.particles() if local[id(x)] not in polar_set]
+
+    if spacer_backbone is None:
+        spacer_backbone = len(backbone_spacer) + polar_backbone
+    if spacer_ion is None:
+        spacer_ion = len(ion_spacer)
+    n_backbone_spacer = spacer_backbone - polar_backbone
+    if not (0 < n_backbone_spacer <= len(backbone_spacer) and 0 < spacer_ion <= len(ion_spacer)):
+        raise ValueError(
+            "Spacers of {} and {} methylene groups cannot be split into {} and {} beads.".format(
+                len(backbone_spacer), len(ion_spacer), n_backbone_spacer, spacer_ion
+            )
+        )
+
+    names, groups = ["_B"], [base if polar_backbone else base + polar]
+    if polar_backbone:
+        names.append("_P")
+        groups.append(polar)
+    for chunk in np.array_split(np.arange(len(backbone_spacer)), n_backbone_spacer):
+        names.append("_BP")
+        groups.append([i for k in chunk for i in backbone_spacer[k]])
+    names.append("_C")
+    groups.append([local[id(x)] for x in cation.particles()])
+    for chunk in np.array_split(np.arange(len(ion_spacer)), spacer_ion):
+        names.append("_BP")
+        groups.append([i for k in chunk for i in ion_spacer[k]])
+    names.append("_A")
+    groups.append([local[id(x)] for x in anion.particles()])
+
+    if sum(len(x) for x in groups) != len(local):
+        raise ValueError("The beads of {} do not cover all of its atoms.".format(type(monomer).__name__))
+
+    return names, [np.array(x, dtype=np.int64) for x in groups]
+
+
+def _minimum_image(vectors, box):
+    """Apply the minimum image convention to vectors of shape (F, N, 3) for an orthorhombic box."""
+
+    box = np.asarray(box, dtype=float)
+    box = box.reshape(-1, 1, 3) if box.ndim == 2 else box
+    return vectors - box * np.round(vectors / box)
+
+
+class Mapping:
+    """
+    A sparse linear map from atom positions to bead positions.
+
+    Parameters
+    ----------
+    matrix : scipy.sparse.csr_matrix
+        Matrix of shape (n_beads, n_atoms) of atom weights, each row summing to one.
+    names : numpy.ndarray
+        Array of shape (n_beads,) of bead names.
+    monomer_index : numpy.ndarray
+        Array of shape (n_beads,) with the index of the monomer of each bead, or -1.
+    bonds : numpy.ndarray
+        Array of shape (K, 2) of bonded bead indices, where any atom of one bead is bonded to an atom of the other.
+    masses : numpy.ndarray
+        Array of shape (n_beads,) of bead masses in amu.
+    charges : numpy.ndarray
+        Array of shape (n_beads,) of bead charges in units of elementary charge.
+
+    Attributes
+    ----------
+    n_beads : int
+        Number of beads.
+    n_atoms : int
+        Number of atoms.
+    owner : numpy.ndarray
+        Array of shape (n_atoms,) with the index of the bead of each atom.
+    """
+
+    def __init__(self, matrix, names, monomer_index, bonds, masses, charges):
+        self.matrix = csr_matrix(matrix)
+        self.names = np.asarray(names, dtype=str)
+        self.monomer_index = np.asarray(monomer_index, dtype=np.int64)
+        self.bonds = np.asarray(bonds, dtype=np.int64).reshape(-1, 2)
+        self.masses = np.asarray(masses, dtype=float)
+        self.charges = np.asarray(charges, dtype=float)
+
+        coo = self.matrix.tocoo()
+        self.owner = np.full(self.n_atoms, -1, dtype=np.int64)
+        self.owner[coo.col] = coo.row
+        # One atom of each bead is the reference for unwrapping the others across periodic boundaries
+        self._reference = self.matrix.indices[self.matrix.indptr[:-1]]
+
+    @property
+    def n_beads(self):
+        return self.matrix.shape[0]
+
+    @property
+    def n_atoms(self):
+        return self.matrix.shape[1]
+
+    def apply(self, positions, box=None):
+        """
+        Map atom positions onto beads.
+
+        Parameters
+        ----------
+        positions : numpy.ndarray or mdtraj.Trajectory
+            Array of shape (n_atoms, 3) or (F, n_atoms, 3), or a trajectory.
+        box : numpy.ndarray, optional, default=None
+            Orthorhombic box lengths of shape (3,) or (F, 3). If given, the atoms of each bead are unwrapped around
+            one of its atoms before they are averaged. If None and ``positions`` is a trajectory with unit cells, its
+            ``unitcell_lengths`` are used.
+
+        Returns
+        -------
+        numpy.ndarray
+            Array of shape (n_beads, 3) or (F, n_beads, 3) of bead positions.
+        """
+
+        if hasattr(positions, "unitcell_lengths"):
+            if box is None:
+                box = positions.unitcell_lengths
+            positions = positions.xyz
+        positions = np.asarray(positions, dtype=float)
+        single = positions.ndim == 2
+        if single:
+            positions = positions[None]
+        n_frames = len(positions)
+
+        if box is not None:
+            reference = positions[:, self._reference]
+            positions = _minimum_image(positions - reference[:, self.owner], box)
+
+        # Frames are stacked as columns so that all frames are mapped in one sparse product
+        columns = positions.transpose(1, 0, 2).reshape(self.n_atoms, 3 * n_frames)
+        beads = (self.matrix @ columns).reshape(self.n_beads, n_frames, 3).transpose(1, 0, 2)
+        if box is not None:
+            beads = beads + reference
+
+        return beads[0] if single else beads
+
+    def to_system(self, positions, box=None):
+        """
+        Coarse-grained system of mapped positions.
+
+        Parameters
+        ----------
+        positions : numpy.ndarray
+            Array of shape (n_atoms, 3) of atom positions.
+        box : numpy.ndarray, optional, default=None
+            Box lengths in nm, see :meth:`apply`.
+
+        Returns
+        -------
+        SystemArrays
+            Beads with their names, masses, charges, bonds, and monomer indices.
+        """
+
+        monomers = self.monomer_index[self.monomer_index >= 0]
+        n_monomers = int(monomers.max()) + 1 if len(monomers) > 0 else 0
+        system = SystemArrays(
+            self.n_beads, len(self.bonds), names=self.names, monomer_names=["Betaine"] * n_monomers, box=box
+        )
+        system.positions[:] = self.apply(positions, box=box)
+        system.masses[:] = self.masses
+        system.charges[:] = self.charges
+        system.monomer_index[:] = self.monomer_index
+        system.bonds[:] = self.bonds
+        system.update_chain_index()
+
+        return system
+
+
+def build_mapping(compound, polar_backbone=False, weighting="mass", system=None):
+    """
+    Build the mapping of a compound onto coarse-grained beads.
+
+    Parameters
+    ----------
+    compound : mb.Compound
+        A monomer, chain, or box of chains of ``Sbma``, ``Sbaa``, or ``Cbma`` monomers, possibly with ions.
+    polar_backbone : bool, optional, default=False
+        Whether to map the backbone ester or amide group to a "_P" bead, see :func:`monomer_beads`.
+    weighting : str, optional, default="mass"
+        Either "mass" to place beads at the center of mass of their atoms or "geometry" for the centroid.
+    system : SystemArrays, optional, default=None
+        Arrays exported from ``compound``. If None, they are exported here.
+
+    Returns
+    -------
+    Mapping
+        The mapping, with beads in order of their first atom.
+
+    Examples
+    --------
+    >>> from mbuild_polybuild.aa_monomers import Sbma
+    >>> from mbuild_polybuild.architectures import Chain
+    >>> chain = Chain(Sbma(), n=20)
+    >>> mapping = build_mapping(chain)
+    >>> beads = mapping.apply(chain.xyz)
+    """
+
+    if weighting not in ["mass", "geometry"]:
+        raise ValueError("weighting must be 'mass' or 'geometry', not {}".format(weighting))
+    if system is None:
+        system = to_arrays(compound)
+
+    index = {id(particle): i for i, particle in enumerate(compound.particles())}
+    classes = (aa_monomers.Cbma, aa_monomers.Sbaa, aa_monomers.Sbma)
+
+    # Atoms of every instance of each monomer variant, whose bead groups are derived once
+    variants = {}
+    stack = [compound]
+    while stack:
+        child = stack.pop()
+        if isinstance(child, classes):
+            key = (type(child).__name__,) + tuple(
+                (label, x.n_particles) for label, x in child.labels.items() if hasattr(x, "n_particles")
+            )
+            if key not in variants:
+                variants[key] = (monomer_beads(child, polar_backbone=polar_backbone), [])
+            variants[key][1].append([index[id(particle)] for particle in child.particles()])
+        elif child.children:
+            stack.extend(reversed(list(child.children)))
+
+    rows, columns, bead_names, bead_first, bead_monomer = [], [], [], [], []
+    n_beads = 0
+    mapped = np.zeros(system.n_particles, dtype=bool)
+    for (names, groups), instances in variants.values():
+        instances = np.array(instances, dtype=np.int64)
+        local_atoms = np.concatenate(groups)
+        local_beads = np.repeat(np.arange(len(groups)), [len(x) for x in groups])
+        atoms = instances[:, local_atoms]
+        beads = n_beads + np.arange(len(instances))[:, None] * len(groups) + local_beads[None]
+        rows.append(beads.ravel())
+        columns.append(atoms.ravel())
+        bead_names.extend(names * len(instances))
+        bead_first.append(instances[:, [x[0] for x in groups]].ravel())
+        bead_monomer.append(np.repeat(system.monomer_index[instances[:, 0]], len(groups)))
+        mapped[atoms.ravel()] = True
+        n_beads += len(instances) * len(groups)
+
+    # Particles outside betaine monomers are their own beads
+    others = np.flatnonzero(~mapped)
+    rows.append(n_beads + np.arange(len(others)))
+    columns.append(others)
+    bead_names.extend(system.names[others])
+    bead_first.append(others)
+    bead_monomer.append(np.full(len(others), -1, dtype=np.int64))
+    n_beads += len(others)
+
+    rows, columns = np.concatenate(rows), np.concatenate(columns)
+    # Renumber beads in order of their first atom
+    order = np.argsort(np.concatenate(bead_first), kind="stable")
+    rank = np.empty(n_beads, dtype=np.int64)
+    rank[order] = np.arange(n_beads)
+    rows = rank[rows]
+
+    weights = system.masses[columns] if weighting == "mass" else np.ones(len(columns))
+    totals = np.bincount(rows, weights=weights, minlength=n_beads)
+    # Beads of massless particles are placed at their centroid
+    massless = totals[rows] <= 0
+    weights = np.where(massless, 1.0, weights)
+    totals = np.bincount(rows, weights=weights, minlength=n_beads)
+    matrix = coo_matrix((weights / totals[rows], (rows, columns)), shape=(n_beads, system.n_particles)).tocsr()
+
+    membership = coo_matrix((np.ones(len(rows)), (rows, columns)), shape=(n_beads, system.n_particles)).tocsr()
+    bead_graph = triu(membership @ adjacency(system.bonds, system.n_particles) @ membership.T, k=1).tocoo()
+    bonds = np.column_stack([bead_graph.row, bead_graph.col])
+    bonds = bonds[np.lexsort((bonds[:, 1], bonds[:, 0]))]
+
+    # Monomers outside betaine monomers are not counted
+    bead_monomer = np.concatenate(bead_monomer)[order]
+    betaine = bead_monomer >= 0
+    bead_monomer[betaine] = np.unique(bead_monomer[betaine], return_inverse=True)[1]
+
+    return Mapping(
+        matrix,
+        np.array(bead_names)[order],
+        bead_monomer,
+        bonds,
+        np.bincount(rows, weights=system.masses[columns], minlength=n_beads),
+        np.bincount(rows, weights=system.charges[columns], minlength=n_beads),
+    )
+
+
+def map_trajectory(mapping, filename, top=None, chunk=1000, **kwargs):
+    """
+    Map a trajectory file onto beads, streaming chunks of frames from disk.
+
+    Parameters
+    ----------
+    mapping : Mapping
+        Mapping from :func:`build_mapping`.
+    filename : str
+        Trajectory file readable by ``mdtraj.iterload``, e.g., a DCD or XTC file.
+    top : str or mdtraj.Topology, optional, default=None
+        Topology of the all-atom system, required for formats without one.
+    chunk : int, optional, default=1000
+        Number of frames read at a time.
+    **kwargs
+        Other keyword arguments for ``mdtraj.iterload``, e.g., ``stride``.
+
+    Yields
+    ------
+    positions : numpy.ndarray
+        Array of shape (F, n_beads, 3) of bead positions in nm for each chunk.
+    box : numpy.ndarray or None
+        Array of shape (F, 3) of box lengths in nm, or None if the trajectory has no unit cell.
+
+    Examples
+    --------
+    >>> for positions, box in map_trajectory(mapping, "sbma.dcd", top="sbma.pdb", chunk=500):
+    ...     analyze(positions, box)
+    """
+
+    for frames in mdtraj.iterload(filename, top=top, chunk=chunk, **kwargs):
+        box = frames.unitcell_lengths
+        yield mapping.apply(frames.xyz, box=box), box
+
+
+@lru_cache(maxsize=None)
+def _backmap_template(monomer_type, polar_backbone, spacer_backbone, spacer_ion, switch_backbone_chiral=False):
+    """
+    All-atom template of a monomer variant with its bead assignment, built once per variant and process.
+
+    The returned arrays must not be modified.
+    """
+
+    monomer = monomer_type(
+        spacer_backbone=spacer_backbone, spacer_ion=spacer_ion, switch_backbone_chiral=switch_backbone_chiral
+    )
+    system = to_arrays(monomer)
+    names, groups = monomer_beads(monomer, polar_backbone=polar_backbone)
+
+    owner = np.empty(system.n_particles, dtype=np.int64)
+    for bead, group in enumerate(groups):
+        owner[group] = bead
+    masses = np.bincount(owner, weights=system.masses, minlength=len(groups))
+    centers = np.column_stack(
+        [np.bincount(owner, weights=system.masses * system.positions[:, k], minlength=len(groups)) for k in range(3)]
+    )
+    centers /= masses[:, None]
+
+    index = {id(particle): i for i, particle in enumerate(monomer.particles())}
+    head, tail = index[id(monomer["up"].anchor)], index[id(monomer["down"].anchor)]
+
+    return system, tuple(names), owner, centers, masses, head, tail
+
+
+def backmap(system, monomer_type=aa_monomers.Sbma, match_beads=True):
+    """
+    Build an all-atom system from coarse-grained betaine beads.
+
+    Each ``Betaine`` monomer becomes an all-atom monomer with one methylene group per "_BP" bead, and an ester or amide
+    group for a "_P" bead. The template is fit to the beads of the monomer by a rigid, mass-weighted Kabsch fit, so
+    the result should be relaxed before simulation, e.g., with :func:`mbuild_polybuild.relax.relax`. Consecutive
+    monomers are bonded through their "down" and "up" port anchors, and beads outside monomers, such as ions, are
+    copied as single particles.
+
+    Parameters
+    ----------
+    system : SystemArrays
+        Coarse-grained system, e.g., ``to_arrays(box_of_betaine_chains)`` or :meth:`Mapping.to_system`.
+    monomer_type : type or list[type], optional, default=Sbma
+        All-atom monomer class, ``Sbma``, ``Sbaa``, or ``Cbma``, for all monomers or for each monomer in order.
+    match_beads : bool, optional, default=True
+        If True, the atoms of each bead are shifted after the fit so that their center of mass is exactly at the
+        bead, and mapping the result with :func:`build_mapping` reproduces the bead positions.
+
+    Returns
+    -------
+    SystemArrays
+        All-atom system with monomers in the order of their first bead.
+
+    Examples
+    --------
+    >>> from mbuild_polybuild.arrays import to_arrays
+    >>> cg = to_arrays(box_of_betaine_chains)
+    >>> aa = backmap(cg, monomer_type=Cbma)
+    """
+
+    box = system.box
+    monomer_index = system.monomer_index
+    order = np.argsort(monomer_index, kind="stable")
+    order = order[monomer_index[order] >= 0]
+    ids, starts = np.unique(monomer_index[order], return_index=True)
+    bead_lists = np.split(order, starts[1:]) if len(ids) > 0 else []
+    if not isinstance(monomer_type, (list, tuple)):
+        monomer_type = [monomer_type] * len(ids)
+    if len(monomer_type) != len(ids):
+        raise ValueError(
+            "{} monomer types are needed for {} monomers, {} were given.".format(len(ids), len(ids), len(monomer_type))
+        )
+
+    # Group monomers by variant, and units, i.e., monomers and single beads, by their first bead
+    variants = {}
+    for m, beads in enumerate(bead_lists):
+        names = tuple(system.names[beads])
+        if "_C" not in names:
+            raise ValueError("Monomer {} is not a betaine monomer, its beads are {}.".format(ids[m], names))
+        cation = names.index("_C")
+        key = (monomer_type[m], "_P" in names, names[:cation].count("_BP"), names[cation:].count("_BP"), names)
+        variants.setdefault(key, []).append(m)
+    singles = np.flatnonzero(monomer_index < 0)
+    first = np.concatenate([[x[0] for x in bead_lists], singles]).astype(np.int64)
+    unit_order = np.argsort(first, kind="stable")
+
+    # A rotation cannot mirror a template, so both backbone handedness templates are fit to every monomer
+    templates = {key: [_backmap_template(*key[:4], switch) for switch in [False, True]] for key in variants}
+    for key, (template, _) in templates.items():
+        if template[1] != key[4]:
+            raise ValueError("Beads {} do not match the {} template, {}.".format(key[4], key[0].__name__, template[1]))
+
+    n_atoms = np.ones(len(first), dtype=np.int64)
+    heads = np.zeros(len(ids), dtype=np.int64)
+    tails = np.zeros(len(ids), dtype=np.int64)
+    for key, members in variants.items():
+        template = templates[key][0]
+        n_atoms[members] = template[0].n_particles
+        heads[members], tails[members] = template[5], template[6]
+    unit_sizes = n_atoms[unit_order]
+    offsets = np.empty(len(first), dtype=np.int64)
+    offsets[unit_order] = np.concatenate([[0], np.cumsum(unit_sizes)[:-1]])
+    # Monomers are renumbered in the order of their first bead
+    monomer_order = np.empty(len(ids), dtype=np.int64)
+    monomer_order[np.argsort(first[: len(ids)], kind="stable")] = np.arange(len(ids))
+
+    n_bonds = sum(templates[key][0][0].n_bonds * len(members) for key, members in variants.items())
+    between = system.monomer_index[system.bonds]
+    links = system.bonds[(between[:, 0] != between[:, 1]) | (between[:, 0] < 0)]
+    result = SystemArrays(int(n_atoms.sum()), n_bonds + len(links), box=box)
+    names = np.empty(result.n_particles, dtype=object)
+    monomer_names = np.empty(len(ids), dtype=object)
+
+    bond_offset = 0
+    for key, members in variants.items():
+        members = np.asarray(members)
+        beads = np.array([bead_lists[m] for m in members])
+        targets = system.positions[beads]
+        if box is not None:
+            # Unwrap the beads of each monomer around its first bead
+            targets = targets[:, :1] + _minimum_image(targets - targets[:, :1], box)
+
+        residuals, fits = [], []
+        for template_system, _, owner, centers, masses, _, _ in templates[key]:
+            rotation, translation = rigid_transform(np.broadcast_to(centers, targets.shape), targets, weights=masses)
+            fitted = apply_transform(rotation, translation, centers)
+            positions = apply_transform(rotation, translation, template_system.positions)
+            if match_beads:
+                positions += (targets - fitted)[:, owner]
+            residuals.append(np.sum(masses * np.sum((fitted - targets) ** 2, axis=2), axis=1))
+            fits.append(positions)
+        # Each monomer keeps the handedness whose template fits its beads with the lower mass-weighted residual
+        positions = np.where((residuals[1] < residuals[0])[:, None, None], fits[1], fits[0])
+        template_system = templates[key][0][0]
+
+        atoms = (offsets[members][:, None] + np.arange(template_system.n_particles)).ravel()
+        result.positions[atoms] = positions.reshape(-1, 3)
+        for name in ["atomic_numbers", "masses", "charges"]:
+            getattr(result, name)[atoms] = np.tile(getattr(template_system, name), len(members))
+        names[atoms] = np.tile(template_system.names, len(members))
+        rank = monomer_order[members]
+        result.monomer_index[atoms] = np.repeat(rank, template_system.n_particles)
+        monomer_names[rank] = key[0].__name__
+        count = len(members) * template_system.n_bonds
+        result.bonds[bond_offset : bond_offset + count] = (
+            template_system.bonds[None] + offsets[members][:, None, None]
+        ).reshape(-1, 2)
+        bond_offset += count
+
+    single_atoms = offsets[len(ids) :]
+    result.positions[single_atoms] = system.positions[singles]
+    for name in ["atomic_numbers", "masses", "charges"]:
+        getattr(result, name)[single_atoms] = getattr(system, name)[singles]
+    names[single_atoms] = system.names[singles]
+    result.monomer_index[single_atoms] = -1
+
+    # Bonds between monomers join the tail anchor of the earlier monomer to the head anchor of the later one, and
+    # bonds to single beads use the first atom of the bead's monomer
+    unit = np.full(system.n_particles, -1, dtype=np.int64)
+    for m, beads in enumerate(bead_lists):
+        unit[beads] = m
+    unit[singles] = len(ids) + np.arange(len(singles))
+    ends = np.sort(unit[links], axis=1)
+    is_monomer = ends < len(ids)
+    atoms = offsets[ends]
+    both = is_monomer.all(axis=1)
+    atoms[both, 0] += tails[ends[both, 0]]
+    atoms[both, 1] += heads[ends[both, 1]]
+    result.bonds[bond_offset:] = atoms
+
+    result.names = names.astype(str)
+    result.monomer_names = list(monomer_names)
+    result.update_chain_index()
+
+    return result
@@ -0,0 +1,310 @@
+"""Network Module
+
+This module generates crosslinked networks, such as zwitterionic hydrogels of ``Sbma`` or ``Cbma`` chains, on the
+array representation of :mod:`mbuild_polybuild.arrays`, so that systems of millions of atoms are assembled without
+building an ``mb.Compound`` for each copy.
+
+Chain and crosslinker templates are exported once, copies are placed with random orientations in a periodic box, the
+open ports of the chains are matched to those of the crosslinkers within a cutoff using KD-trees, and the crosslink
+bonds are added in bulk. Crosslinks may be longer than a chemical bond and copies may overlap, so the result should be
+relaxed before simulation.
+
+Functions
+---------
+- reactive_sites: Anchor particle indices and port positions of a compound's open ports.
+- match_sites: Greedy nearest-first matching of two sets of sites within a cutoff.
+- place_copies: Randomly rotated and translated copies of a template in a box.
+- build_network: Place chains and crosslinkers in a box and crosslink them.
+
+Classes
+-------
+- Network: A crosslinked system with its crosslinks and unreacted sites.
+"""
+
+import numpy as np
+from scipy.spatial import cKDTree
+from scipy.spatial.transform import Rotation
+
+from mbuild_polybuild.arrays import concatenate, replicate, to_arrays
+
+_NM3_PER_AMU_CM3 = 1.66053907e-3  # nm^3 per amu at a density of 1 g/cm^3
+
+
+def reactive_sites(compound, ports=None, system=None):
+    """
+    Anchor particle indices and port positions of a compound's open ports.
+
+    Parameters
+    ----------
+    compound : mb.Compound
+        Template compound.
+    ports : list[str], optional, default=None
+        Labels of the reactive ports. If None, all available ports are used.
+    system : SystemArrays, optional, default=None
+        Arrays exported from ``compound``. If None, they are exported here.
+
+    Returns
+    -------
+    system : SystemArrays
+        Arrays exported from ``compound``.
+    anchors : numpy.ndarray
+        Array of shape (S,) of the particle index of each port's anchor.
+    sites : numpy.ndarray
+        Array of shape (S, 3) of port positions, where a bonded partner atom would be placed.
+    """
+
+    if system is None:
+        system = to_arrays(compound)
+    if ports is None:
+        ports = compound.available_ports()
+    else:
+        ports = [compound[label] for label in ports]
+
+    index = {id(particle): i for i, particle in enumerate(compound.particles())}
+    anchors = np.array([index[id(port.anchor)] for port in ports], dtype=np.int64)
+    sites = np.array([port.center for port in ports], dtype=float).reshape(-1, 3)
+
+    return system, anchors, sites
+
+
+def match_sites(sites_a, sites_b, cutoff, box=None, max_pairs=None):
+    """
+    Greedy nearest-first matching of two sets of sites within a cutoff.
+
+    Candidate pairs are found with KD-trees and accepted in order of increasing distance, using each site at most once.
+    The matching is computed in rounds, each accepting every candidate pair that is the nearest remaining pair of both
+    of its sites, which gives the same result as accepting pairs one at a time.
+
+    Parameters
+    ----------
+    sites_a : numpy.ndarray
+        Array of shape (A, 3) of site positions in nm.
+    sites_b : numpy.ndarray
+        Array of shape (B, 3) of site positions in nm.
+    cutoff : float
+        Maximum distance between matched sites in nm.
+    box : numpy.ndarray, optional, default=None
+        Orthorhombic box lengths in nm for periodic distances.
+    max_pairs : int, optional, default=None
+        Maximum number of pairs, the shortest of which are kept.
+
+    Returns
+    -------
+    numpy.ndarray
+        Array of shape (K, 2) of matched ``(a, b)`` site indices, sorted by distance.
+    """
+
+    sites_a = np.asarray(sites_a, dtype=float).reshape(-1, 3)
+    sites_b = np.asarray(sites_b, dtype=float).reshape(-1, 3)
+    if box is not None:
+        box = np.asarray(box, dtype=float)
+        sites_a = np.mod(sites_a, box)
+        sites_b = np.mod(sites_b, box)
+
+    tree_a = cKDTree(sites_a, boxsize=box)
+    tree_b = cKDTree(sites_b, boxsize=box)
+    candidates = tree_a.sparse_distance_matrix(tree_b, cutoff, output_type="ndarray")
+    order = np.argsort(candidates["v"], kind="stable")
+    a, b = candidates["i"][order].astype(np.int64), candidates["j"][order].astype(np.int64)
+    distance = candidates["v"][order]
+
+    matched_a, matched_b, matched_distance = [], [], []
+    while len(a) > 0:
+        nearest = np.zeros(len(a), dtype=bool)
+        nearest[np.unique(a, return_index=True)[1]] = True
+        nearest_b = np.zeros(len(b), dtype=bool)
+        nearest_b[np.unique(b, return_index=True)[1]] = True
+        accept = nearest & nearest_b
+
+        matched_a.append(a[accept])
+        matched_b.append(b[accept])
+        matched_distance.append(distance[accept])
+        keep = ~np.isin(a, a[accept]) & ~np.isin(b, b[accept])
+        a, b, distance = a[keep], b[keep], distance[keep]
+
+    if not matched_a:
+        return np.zeros((0, 2), dtype=np.int64)
+    pairs = np.column_stack([np.concatenate(matched_a), np.concatenate(matched_b)])
+    pairs = pairs[np.argsort(np.concatenate(matched_distance), kind="stable")]
+    if max_pairs is not None:
+        pairs = pairs[: int(max_pairs)]
+
+    return pairs
+
+
+def place_copies(template, sites, copies, box, rng):
+    """
+    Randomly rotated and translated copies of a template in a box.
+
+    Parameters
+    ----------
+    template : SystemArrays
+        Template, rotated about the centroid of its positions.
+    sites : numpy.ndarray
+        Array of shape (S, 3) of points moved with each copy, e.g., port positions.
+    copies : int
+        Number of copies.
+    box : numpy.ndarray
+        Box lengths in nm. The centroid of each copy is drawn uniformly in the box.
+    rng : numpy.random.Generator
+        Random generator.
+
+    Returns
+    -------
+    positions : numpy.ndarray
+        Array of shape (copies, N, 3) of the positions of each copy, e.g., for
+        :func:`mbuild_polybuild.arrays.replicate`.
+    site_positions : numpy.ndarray
+        Array of shape (copies * S, 3) of the moved sites.
+    """
+
+    rotations = Rotation.random(copies, random_state=rng).as_matrix()
+    centers = rng.uniform(0.0, 1.0, size=(copies, 3)) * box
+    centroid = template.positions.mean(axis=0)
+    positions = np.einsum("kij,nj->kni", rotations, template.positions - centroid) + centers[:, None]
+    site_positions = np.einsum("kij,nj->kni", rotations, sites - centroid) + centers[:, None]
+
+    return positions, site_positions.reshape(-1, 3)
+
+
+class Network:
+    """
+    A crosslinked system with its crosslinks and unreacted sites.
+
+    Parameters
+    ----------
+    system : SystemArrays
+        Chains followed by crosslinkers, including the crosslink bonds.
+    crosslinks : numpy.ndarray
+        Array of shape (K, 2) of the chain and crosslinker particle indices of each crosslink bond.
+    unreacted : numpy.ndarray
+        Array of shape (U,) of the anchor particle index of each unreacted site.
+    n_chain_sites : int
+        Number of reactive sites on the chains.
+    n_crosslinker_sites : int
+        Number of reactive sites on the crosslinkers.
+
+    Attributes
+    ----------
+    conversion : float
+        Fraction of crosslinker sites that reacted.
+    crosslink_density : float
+        Number of crosslink bonds per monomer.
+    """
+
+    def __init__(self, system, crosslinks, unreacted, n_chain_sites, n_crosslinker_sites):
+        self.system = system
+        self.crosslinks = crosslinks
+        self.unreacted = unreacted
+        self.n_chain_sites = n_chain_sites
+        self.n_crosslinker_sites = n_crosslinker_sites
+
+    @property
+    def conversion(self):
+        return len(self.crosslinks) / self.n_crosslinker_sites if self.n_crosslinker_sites > 0 else 0.0
+
+    @property
+    def crosslink_density(self):
+        return len(self.crosslinks) / self.system.n_monomers if self.system.n_monomers > 0 else 0.0
+
+
+def build_network(
+    chain,
+    crosslinker,
+    n_chains,
+    n_crosslinkers,
+    box=None,
+    density=None,
+    cutoff=1.0,
+    conversion=1.0,
+    chain_ports=None,
+    crosslinker_ports=None,
+    seed=None,
+):
+    """
+    Place chains and crosslinkers in a box and crosslink them.
+
+    Parameters
+    ----------
+    chain : mb.Compound
+        Chain template, e.g., ``Chain(Sbma(), n=20)``.
+    crosslinker : mb.Compound
+        Crosslinker template with two or more open ports.
+    n_chains : int
+        Number of chains.
+    n_crosslinkers : int
+        Number of crosslinkers, which with ``conversion`` sets the crosslink density.
+    box : numpy.ndarray, optional, default=None
+        Orthorhombic box lengths in nm. Either ``box`` or ``density`` is required.
+    density : float, optional, default=None
+        Mass density in g/cm^3 used to size a cubic box if ``box`` is None.
+    cutoff : float, optional, default=1.0
+        Maximum distance in nm between a chain port and a crosslinker port that may react.
+    conversion : float, optional, default=1.0
+        Maximum fraction of crosslinker sites to react.
+    chain_ports : list[str], optional, default=None
+        Labels of the reactive chain ports. If None, all available ports are used, e.g., "up" and "down" of a `Chain`.
+    crosslinker_ports : list[str], optional, default=None
+        Labels of the reactive crosslinker ports. If None, all available ports are used.
+    seed : int, optional, default=None
+        Seed for the random placement.
+
+    Returns
+    -------
+    Network
+        The crosslinked system.
+
+    Examples
+    --------
+    >>> from mbuild_polybuild.aa_monomers import Sbma
+    >>> from mbuild_polybuild.architectures import Chain
+    >>> from mbuild_polybuild.cg_monomers import Bead
+    >>> crosslinker = Bead(name="_X", Nports=4)
+    >>> network = build_network(Chain(Sbma(), n=20), crosslinker, 1000, 500, density=1.1, seed=1)
+    >>> network.conversion, network.crosslink_density
+    """
+
+    if not 0.0 <= conversion <= 1.0:
+        raise ValueError("conversion must be between 0 and 1")
+
+    rng = np.random.default_rng(seed)
+    chain_system, chain_anchors, chain_sites = reactive_sites(chain, ports=chain_ports)
+    linker_system, linker_anchors, linker_sites = reactive_sites(crosslinker, ports=crosslinker_ports)
+
+    if box is None:
+        if density is None:
+            raise ValueError("Either box or density must be provided.")
+        mass = n_chains * chain_system.masses.sum() + n_crosslinkers * linker_system.masses.sum()
+        box = np.full(3, np.cbrt(mass * _NM3_PER_AMU_CM3 / density))
+    box = np.asarray(box, dtype=float)
+
+    chain_positions, chain_site_positions = place_copies(chain_system, chain_sites, n_chains, box, rng)
+    linker_positions, linker_site_positions = place_copies(linker_system, linker_sites, n_crosslinkers, box, rng)
+    chains = replicate(chain_system, chain_positions)
+    linkers = replicate(linker_system, linker_positions)
+    system = concatenate([chains, linkers], box=box)
+
+    # Particle index of the anchor of every site in the combined system
+    chain_anchor_index = (chain_anchors[None] + np.arange(n_chains)[:, None] * chain_system.n_particles).ravel()
+    linker_anchor_index = (
+        linker_anchors[None] + np.arange(n_crosslinkers)[:, None] * linker_system.n_particles
+    ).ravel() + chains.n_particles
+
+    n_linker_sites = len(linker_anchor_index)
+    pairs = match_sites(
+        chain_site_positions,
+        linker_site_positions,
+        cutoff,
+        box=box,
+        max_pairs=int(np.floor(conversion * n_linker_sites)),
+    )
+    crosslinks = np.column_stack([chain_anchor_index[pairs[:, 0]], linker_anchor_index[pairs[:, 1]]])
+    system = system.add_bonds(crosslinks)
+
+    reacted_chain = np.zeros(len(chain_anchor_index), dtype=bool)
+    reacted_chain[pairs[:, 0]] = True
+    reacted_linker = np.zeros(n_linker_sites, dtype=bool)
+    reacted_linker[pairs[:, 1]] = True
+    unreacted = np.concatenate([chain_anchor_index[~reacted_chain], linker_anchor_index[~reacted_linker]])
+
+    return Network(system, crosslinks, unreacted, len(chain_anchor_index), n_linker_sites)
@@ -0,0 +1,254 @@
+"""Polydisperse Module
+
+This module samples chain lengths from common molecular weight distributions and builds polydisperse ensembles of
+linear chains on the array representation of :mod:`mbuild_polybuild.arrays`.
+
+Chains are built from a prefix tree of their sequences, so a monomer pose shared by several chains, e.g., every
+position of a homopolymer up to the shortest chain length, is computed once. The poses of each tree level are composed
+in one batched operation, and the atoms of every copy of a template are placed with one array operation.
+
+Functions
+---------
+- sample_lengths: Sample chain lengths with a target number average and dispersity.
+- length_statistics: Number and weight averages and dispersity of a set of chains.
+- build_ensemble: Build an array-backed ensemble of linear chains.
+"""
+
+import numpy as np
+
+from mbuild_polybuild.architectures import _relative_transform
+from mbuild_polybuild.arrays import SystemArrays, to_arrays
+from mbuild_polybuild.transforms import apply_transform
+
+DISTRIBUTIONS = ["schulz-zimm", "log-normal", "poisson", "flory"]
+
+
+def sample_lengths(n_chains, mn, dispersity=None, distribution="schulz-zimm", seed=None, min_length=1):
+    """
+    Sample chain lengths with a target number average and dispersity.
+
+    Parameters
+    ----------
+    n_chains : int
+        Number of chains.
+    mn : float
+        Target number-average degree of polymerization.
+    dispersity : float, optional, default=None
+        Target dispersity, Mw/Mn, greater than one. Required for "schulz-zimm" and "log-normal". The "poisson" and
+        "flory" distributions are defined by ``mn`` alone, with dispersities of about ``1 + 1 / mn`` and 2.
+    distribution : str, optional, default="schulz-zimm"
+        One of "schulz-zimm", "log-normal", "poisson", or "flory".
+    seed : int, optional, default=None
+        Seed for reproducible sampling.
+    min_length : int, optional, default=1
+        Shortest allowed chain length. Shorter samples are raised to this value.
+
+    Returns
+    -------
+    numpy.ndarray
+        Array of shape (n_chains,) of integer chain lengths.
+
+    Examples
+    --------
+    >>> lengths = sample_lengths(1000, mn=50, dispersity=1.2, seed=1)
+    >>> length_statistics(lengths)
+    """
+
+    if distribution not in DISTRIBUTIONS:
+        raise ValueError("Distribution, {}, is not one of {}".format(distribution, DISTRIBUTIONS))
+    if mn < 1:
+        raise ValueError("mn must be 1 or more")
+    if distribution in ["schulz-zimm", "log-normal"] and (dispersity is None or dispersity <= 1):
+        raise ValueError("A dispersity greater than one is required for the {} distribution".format(distribution))
+
+    rng = np.random.default_rng(seed)
+    if distribution == "schulz-zimm":
+        shape = 1 / (dispersity - 1)
+        lengths = rng.gamma(shape, mn / shape, size=n_chains)
+    elif distribution == "log-normal":
+        sigma2 = np.log(dispersity)
+        lengths = rng.lognormal(np.log(mn) - sigma2 / 2, np.sqrt(sigma2), size=n_chains)
+    elif distribution == "poisson":
+        lengths = 1 + rng.poisson(mn - 1, size=n_chains)
+    else:
+        lengths = rng.geometric(1 / mn, size=n_chains)
+
+    return np.maximum(np.rint(lengths), min_length).astype(np.int64)
+
+
+def length_statistics(lengths, monomer_mass=1.0):
+    """
+    Number and weight averages and dispersity of a set of chains.
+
+    Parameters
+    ----------
+    lengths : numpy.ndarray
+        Array of chain lengths.
+    monomer_mass : float, optional, default=1.0
+        Mass of a monomer, so that averages are in units of mass rather than degree of polymerization.
+
+    Returns
+    -------
+    dict
+        Dictionary with keys "mn", "mw", and "dispersity".
+    """
+
+    masses = np.asarray(lengths, dtype=float) * monomer_mass
+    mn = masses.mean()
+    mw = np.sum(masses**2) / np.sum(masses)
+
+    return {"mn": mn, "mw": mw, "dispersity": mw / mn}
+
+
+def _prefix_tree(sequences):
+    """
+    Prefix tree of integer sequences.
+
+    Returns the parent, template type, and depth of each node, where node 0 is the empty root, and the node of each
+    monomer of each sequence.
+    """
+
+    children = {}
+    parent, types, depth = [-1], [-1], [0]
+    nodes = []
+    for sequence in sequences:
+        node = 0
+        path = np.empty(len(sequence), dtype=np.int64)
+        for k, kind in enumerate(sequence):
+            key = (node, kind)
+            child = children.get(key)
+            if child is None:
+                child = len(parent)
+                children[key] = child
+                parent.append(node)
+                types.append(kind)
+                depth.append(depth[node] + 1)
+            path[k] = child
+            node = child
+        nodes.append(path)
+
+    return np.array(parent), np.array(types), np.array(depth), nodes
+
+
+def build_ensemble(monomers, lengths=None, sequences=None, head_port="up", tail_port="down"):
+    """
+    Build an array-backed ensemble of linear chains.
+
+    Each chain is equivalent to ``architectures.Chain`` with the same sequence, and starts from the pose of its first
+    template. Chains are not packed, see :mod:`mbuild_polybuild.network` for random placement in a box.
+
+    Parameters
+    ----------
+    monomers : mb.Compound or list[mb.Compound]
+        Monomer templates.
+    lengths : numpy.ndarray, optional, default=None
+        Length of each chain of a homopolymer of the first template, e.g., from :func:`sample_lengths`.
+    sequences : list[str], optional, default=None
+        Sequence of each chain, where "A" is the first template, "B" the second, and so on, e.g., from
+        ``toolbox.random_sequence``. Either ``lengths`` or ``sequences`` is required.
+    head_port : str, optional, default="up"
+        Label of the port on each template bonded to the previous monomer.
+    tail_port : str, optional, default="down"
+        Label of the port on each template bonded to the next monomer.
+
+    Returns
+    -------
+    SystemArrays
+        All chains in order, with ``chain_index`` giving the chain of each particle.
+
+    Examples
+    --------
+    >>> from mbuild_polybuild.aa_monomers import Sbma
+    >>> lengths = sample_lengths(500, mn=40, dispersity=1.5, seed=2)
+    >>> ensemble = build_ensemble(Sbma(), lengths=lengths)
+    """
+
+    if not isinstance(monomers, (list, tuple)):
+        monomers = [monomers]
+    if sequences is None:
+        if lengths is None:
+            raise ValueError("Either lengths or sequences must be provided.")
+        sequences = [[0] * int(n) for n in lengths]
+    else:
+        sequences = [[ord(x) - ord("A") for x in sequence] for sequence in sequences]
+    flat = np.array([kind for sequence in sequences for kind in sequence], dtype=np.int64)
+    if min(len(x) for x in sequences) < 1:
+        raise ValueError("Every chain must have at least one monomer.")
+    if flat.min() < 0 or flat.max() >= len(monomers):
+        raise ValueError("Sequences must consist of the first {} capital letters.".format(len(monomers)))
+
+    # Templates are exported once, including the anchors of the ports joining consecutive monomers
+    templates = []
+    for monomer in monomers:
+        index = {id(particle): i for i, particle in enumerate(monomer.particles())}
+        templates.append(
+            (to_arrays(monomer), index[id(monomer[head_port].anchor)], index[id(monomer[tail_port].anchor)])
+        )
+
+    # Compose the pose of every prefix tree node level by level
+    parent, types, depth, nodes = _prefix_tree(sequences)
+    rotations = np.tile(np.eye(3), (len(parent), 1, 1))
+    translations = np.zeros((len(parent), 3))
+    relative = {}
+    for level in range(2, depth.max() + 1):
+        level_nodes = np.flatnonzero(depth == level)
+        pairs = np.column_stack([types[parent[level_nodes]], types[level_nodes]])
+        for pair in {tuple(x) for x in pairs}:
+            if pair not in relative:
+                relative[pair] = _relative_transform(monomers[pair[1]][head_port], monomers[pair[0]][tail_port])
+        rotation = np.array([relative[tuple(x)][0] for x in pairs])
+        translation = np.array([relative[tuple(x)][1] for x in pairs])
+        parents = parent[level_nodes]
+        rotations[level_nodes] = np.einsum("kij,kjl->kil", rotations[parents], rotation)
+        translations[level_nodes] = np.einsum("kij,kj->ki", rotations[parents], translation) + translations[parents]
+
+    # Every monomer of every chain is a slot with an atom and monomer offset
+    slot_nodes = np.concatenate(nodes)
+    slot_chain = np.repeat(np.arange(len(sequences)), [len(x) for x in sequences])
+    slot_first = np.concatenate([[True] + [False] * (len(x) - 1) for x in sequences])
+    n_atoms = np.array([x[0].n_particles for x in templates])[flat]
+    n_monomers = np.array([x[0].n_monomers for x in templates])[flat]
+    atom_offset = np.concatenate([[0], np.cumsum(n_atoms)[:-1]])
+    monomer_offset = np.concatenate([[0], np.cumsum(n_monomers)[:-1]])
+    n_links = len(flat) - len(sequences)
+    n_bonds = sum(x[0].n_bonds * np.count_nonzero(flat == i) for i, x in enumerate(templates)) + n_links
+
+    system = SystemArrays(int(n_atoms.sum()), int(n_bonds))
+    names = np.empty(system.n_particles, dtype=object)
+    monomer_names = np.empty(int(n_monomers.sum()), dtype=object)
+    bond_offset = 0
+    for i, (template, _, _) in enumerate(templates):
+        slots = np.flatnonzero(flat == i)
+        if len(slots) == 0:
+            continue
+        atoms = (atom_offset[slots][:, None] + np.arange(template.n_particles)).ravel()
+        system.positions[atoms] = apply_transform(
+            rotations[slot_nodes[slots]], translations[slot_nodes[slots]], template.positions
+        ).reshape(-1, 3)
+        for name in ["atomic_numbers", "masses", "charges"]:
+            getattr(system, name)[atoms] = np.tile(getattr(template, name), len(slots))
+        names[atoms] = np.tile(template.names, len(slots))
+        system.chain_index[atoms] = np.repeat(slot_chain[slots], template.n_particles)
+        local = template.monomer_index[None] + monomer_offset[slots][:, None]
+        system.monomer_index[atoms] = np.where(template.monomer_index[None] >= 0, local, -1).ravel()
+        if template.n_monomers > 0:
+            monomer_slots = (monomer_offset[slots][:, None] + np.arange(template.n_monomers)).ravel()
+            monomer_names[monomer_slots] = np.tile(np.array(template.monomer_names, dtype=object), len(slots))
+        count = len(slots) * template.n_bonds
+        system.bonds[bond_offset : bond_offset + count] = (
+            template.bonds[None] + atom_offset[slots][:, None, None]
+        ).reshape(-1, 2)
+        bond_offset += count
+
+    # Bond the tail anchor of each monomer to the head anchor of the next one in its chain
+    heads = np.array([x[1] for x in templates])
+    tails = np.array([x[2] for x in templates])
+    following = np.flatnonzero(~slot_first)
+    system.bonds[bond_offset:] = np.column_stack(
+        [atom_offset[following - 1] + tails[flat[following - 1]], atom_offset[following] + heads[flat[following]]]
+    )
+
+    system.names = names.astype(str)
+    system.monomer_names = list(monomer_names)
+
+    return system
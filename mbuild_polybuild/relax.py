@@ -0,0 +1,273 @@
+"""Relax Module
+
+This module removes close contacts from freshly built or packed systems before they are written, so that the first
+step of a simulation does not fail. Particles repel each other with a soft, finite potential, bonds are harmonic, and
+optionally the distance between the ends of each angle is restrained to its initial value to preserve the geometry of
+the monomer templates. Positions are relaxed with FIRE or steepest descent on the arrays of
+:class:`mbuild_polybuild.arrays.SystemArrays`.
+
+Neighbor pairs are found with a periodic KD-tree and reused until a particle has moved more than half the skin.
+
+Functions
+---------
+- relax: Remove overlaps from a system in place.
+
+Classes
+-------
+- RelaxReport: Convergence history of a relaxation.
+"""
+
+import time
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from mbuild_polybuild.topology import _graph, _angles, _unique_bonds
+
+
+def _minimum_image(vectors, box):
+    """Apply the minimum image convention for an orthorhombic box."""
+
+    if box is None:
+        return vectors
+    return vectors - box * np.round(vectors / box)
+
+
+def _pair_forces(positions, pairs, lengths, stiffness, box, repulsive):
+    """
+    Energy and forces of harmonic or soft repulsive pair terms.
+
+    Harmonic terms are ``k (r - r0)^2``. Repulsive terms are ``k (1 - r / r0)^2`` for ``r < r0`` and zero otherwise.
+    """
+
+    vectors = _minimum_image(positions[pairs[:, 1]] - positions[pairs[:, 0]], box)
+    distance = np.sqrt(np.einsum("ij,ij->i", vectors, vectors))
+    distance = np.maximum(distance, 1e-8)
+    if repulsive:
+        overlap = np.clip(1.0 - distance / lengths, 0.0, None)
+        energy = np.sum(stiffness * overlap**2)
+        # Force on the first particle of each pair, directed away from the second
+        magnitude = -2.0 * stiffness * overlap / lengths
+    else:
+        stretch = distance - lengths
+        energy = np.sum(stiffness * stretch**2)
+        magnitude = 2.0 * stiffness * stretch
+    directional = vectors * (magnitude / distance)[:, None]
+
+    forces = np.zeros_like(positions)
+    for k in range(3):
+        forces[:, k] = np.bincount(pairs[:, 0], weights=directional[:, k], minlength=len(positions))
+        forces[:, k] -= np.bincount(pairs[:, 1], weights=directional[:, k], minlength=len(positions))
+
+    return energy, forces
+
+
+class RelaxReport:
+    """
+    Convergence history of a relaxation.
+
+    Parameters
+    ----------
+    energies : list[float]
+        Total energy at each step.
+    max_forces : list[float]
+        Largest force magnitude at each step.
+    converged : bool
+        Whether the force tolerance was reached.
+    elapsed : float
+        Wall time in seconds.
+    n_neighbor_updates : int
+        Number of times the neighbor pairs were rebuilt.
+
+    Attributes
+    ----------
+    n_steps : int
+        Number of steps taken.
+    """
+
+    def __init__(self, energies, max_forces, converged, elapsed, n_neighbor_updates):
+        self.energies = np.asarray(energies)
+        self.max_forces = np.asarray(max_forces)
+        self.converged = converged
+        self.elapsed = elapsed
+        self.n_neighbor_updates = n_neighbor_updates
+
+    @property
+    def n_steps(self):
+        return len(self.energies)
+
+
+def relax(
+    system,
+    sigma=0.25,
+    epsilon=100.0,
+    bond_k=10000.0,
+    bond_lengths=None,
+    max_bond_length=None,
+    angle_k=1000.0,
+    method="fire",
+    max_steps=1000,
+    force_tolerance=10.0,
+    max_displacement=0.02,
+    skin=0.1,
+):
+    """
+    Remove overlaps from a system in place.
+
+    Parameters
+    ----------
+    system : SystemArrays
+        System to relax. Its ``positions`` are updated.
+    sigma : float or numpy.ndarray, optional, default=0.25
+        Range of the soft repulsion in nm, or an array of shape (n_particles,) of per-particle ranges combined as the
+        mean of each pair, e.g., about 1.0 for coarse-grained beads with ``bond_length=1.0``.
+    epsilon : float, optional, default=100.0
+        Strength of the soft repulsion, in kJ/mol.
+    bond_k : float, optional, default=10000.0
+        Force constant of the harmonic bonds in kJ/mol/nm^2.
+    bond_lengths : numpy.ndarray, optional, default=None
+        Array of shape (n_bonds,) of equilibrium bond lengths in nm. If None, the initial lengths are used.
+    max_bond_length : float, optional, default=None
+        Upper bound of the equilibrium bond lengths, e.g., to pull long crosslinks from
+        :func:`mbuild_polybuild.network.build_network` to a chemical bond length.
+    angle_k : float, optional, default=1000.0
+        Force constant in kJ/mol/nm^2 restraining the distance between the ends of each angle to its initial value. If
+        zero, angles are not restrained.
+    method : str, optional, default="fire"
+        Either "fire" for the fast inertial relaxation engine or "steepest" for steepest descent.
+    max_steps : int, optional, default=1000
+        Maximum number of steps.
+    force_tolerance : float, optional, default=10.0
+        Stop when the largest force magnitude is below this value in kJ/mol/nm.
+    max_displacement : float, optional, default=0.02
+        Largest displacement of any particle in one step in nm.
+    skin : float, optional, default=0.1
+        Extra range in nm of the neighbor pairs, which are rebuilt once a particle has moved half this distance.
+
+    Returns
+    -------
+    RelaxReport
+        Energy and force history.
+
+    Examples
+    --------
+    >>> from mbuild_polybuild.arrays import to_arrays
+    >>> system = to_arrays(box_of_chains)
+    >>> report = relax(system, max_steps=500)
+    >>> report.converged, report.energies[-1]
+    """
+
+    if method not in ["fire", "steepest"]:
+        raise ValueError("method must be 'fire' or 'steepest', not {}".format(method))
+
+    start = time.perf_counter()
+    positions = system.positions
+    n_particles = system.n_particles
+    box = None if system.box is None else np.asarray(system.box, dtype=float)
+
+    bonds = np.asarray(system.bonds, dtype=np.int64)
+    if bond_lengths is None:
+        bond_lengths = np.linalg.norm(_minimum_image(positions[bonds[:, 1]] - positions[bonds[:, 0]], box), axis=1)
+    bond_lengths = np.asarray(bond_lengths, dtype=float)
+    if max_bond_length is not None:
+        bond_lengths = np.minimum(bond_lengths, max_bond_length)
+
+    unique_bonds = _unique_bonds(bonds)
+    angles = _angles(_graph(unique_bonds, n_particles))
+    angle_pairs = angles[:, [0, 2]]
+    angle_lengths = np.linalg.norm(
+        _minimum_image(positions[angle_pairs[:, 1]] - positions[angle_pairs[:, 0]], box), axis=1
+    )
+
+    # Bonded and angle end pairs are excluded from the repulsion
+    excluded = np.sort(np.concatenate([unique_bonds, angle_pairs]), axis=1)
+    excluded = np.unique(excluded[:, 0] * n_particles + excluded[:, 1])
+
+    sigma = np.broadcast_to(np.asarray(sigma, dtype=float), (n_particles,))
+    cutoff = float(sigma.max()) + skin
+
+    def neighbor_pairs():
+        points = np.mod(positions, box) if box is not None else positions
+        tree = cKDTree(points, boxsize=box)
+        pairs = tree.query_pairs(cutoff, output_type="ndarray").astype(np.int64)
+        keys = pairs[:, 0] * n_particles + pairs[:, 1]
+        keys = np.sort(keys[~np.isin(keys, excluded)])
+        # Sorted pairs gather positions with far better memory locality
+        pairs = np.column_stack([keys // n_particles, keys % n_particles])
+        return pairs, 0.5 * (sigma[pairs[:, 0]] + sigma[pairs[:, 1]])
+
+    def evaluate():
+        energy, forces = _pair_forces(positions, pairs, pair_sigma, epsilon, box, repulsive=True)
+        bond_energy, bond_forces = _pair_forces(positions, bonds, bond_lengths, bond_k, box, repulsive=False)
+        energy += bond_energy
+        forces += bond_forces
+        if angle_k > 0 and len(angle_pairs) > 0:
+            angle_energy, angle_forces = _pair_forces(
+                positions, angle_pairs, angle_lengths, angle_k, box, repulsive=False
+            )
+            energy += angle_energy
+            forces += angle_forces
+        return energy, forces
+
+    pairs, pair_sigma = neighbor_pairs()
+    reference = positions.copy()
+    n_updates = 1
+
+    # FIRE parameters from Bitzek et al., Phys. Rev. Lett. 97, 170201 (2006)
+    dt, dt_max = 0.1 * max_displacement, max_displacement
+    alpha, alpha_start, f_alpha = 0.1, 0.1, 0.99
+    f_inc, f_dec, n_min = 1.1, 0.5, 5
+    velocities = np.zeros_like(positions)
+    n_positive = 0
+    step_size = max_displacement
+
+    energies, max_forces = [], []
+    converged = False
+    energy, forces = evaluate()
+    for _ in range(max_steps):
+        force_norms = np.linalg.norm(forces, axis=1)
+        max_force = float(force_norms.max()) if n_particles > 0 else 0.0
+        energies.append(energy)
+        max_forces.append(max_force)
+        if max_force < force_tolerance:
+            converged = True
+            break
+
+        if method == "fire":
+            power = np.sum(forces * velocities)
+            if power > 0:
+                velocity_norm = np.linalg.norm(velocities)
+                force_norm = np.linalg.norm(forces)
+                velocities = (1 - alpha) * velocities + alpha * velocity_norm * forces / force_norm
+                n_positive += 1
+                if n_positive > n_min:
+                    dt = min(dt * f_inc, dt_max)
+                    alpha *= f_alpha
+            else:
+                velocities[:] = 0.0
+                n_positive = 0
+                dt *= f_dec
+                alpha = alpha_start
+            velocities += dt * forces
+            step = dt * velocities
+        else:
+            step = forces / max_force * step_size
+
+        # Limit the largest displacement for stability
+        largest = np.linalg.norm(step, axis=1).max()
+        if largest > max_displacement:
+            step *= max_displacement / largest
+        positions += step
+
+        if np.linalg.norm(positions - reference, axis=1).max() > 0.5 * skin:
+            pairs, pair_sigma = neighbor_pairs()
+            reference[:] = positions
+            n_updates += 1
+
+        new_energy, forces = evaluate()
+        if method == "steepest":
+            # Shrink the step after an uphill move and let it recover after downhill moves
+            step_size = 0.5 * step_size if new_energy > energy else min(1.2 * step_size, max_displacement)
+        energy = new_energy
+
+    return RelaxReport(energies, max_forces, converged, time.perf_counter() - start, n_updates)
@@ -0,0 +1,488 @@
+"""Server Module
+
+This module runs a persistent local build server, so that many small builds share warm worker processes instead of
+each paying for importing mbuild and foyer, parsing forcefields, and building monomer templates.
+
+The server listens on localhost HTTP and keeps a pool of worker processes alive. Each worker loads the requested
+forcefields and monomer templates once when it starts, and keeps every template and forcefield it later uses. Clients
+post a specification in the format of :mod:`mbuild_polybuild.spec` and receive the result of each system, including
+the paths of the written files.
+
+Requests may write files and read the build cache, so every request must carry the token of the server in the
+``X-Polybuild-Token`` header, and bodies must be ``application/json``. The token is written to a file readable only
+by the user who started the server, see :func:`token_file`, where :func:`submit` and :func:`server_status` find it.
+Other local users and web pages open in a browser can therefore not use the server.
+
+Endpoints
+---------
+- GET /status: Server process, uptime, worker count, and number of completed systems.
+- POST /build: Build and write the systems of a JSON specification.
+- POST /shutdown: Stop the server.
+
+Functions
+---------
+- warm: Load forcefields and monomer templates into a worker process.
+- serve: Run a build server until it is shut down.
+- submit: Build the systems of a specification on a running server.
+- server_status: Status of a running server.
+- token_file: Path of the file holding the token of a server.
+
+Classes
+-------
+- BuildServer: Local HTTP build server with a warm process pool.
+"""
+
+import os
+import hmac
+import json
+import time
+import secrets
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import mbuild_polybuild.toolbox as tb
+from mbuild_polybuild.spec import _monomer_template, _system_task, load_spec
+from mbuild_polybuild.sweep import SweepReport
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_URL = "http://{}:{}".format(DEFAULT_HOST, DEFAULT_PORT)
+TOKEN_HEADER = "X-Polybuild-Token"
+
+
+def token_file(port=DEFAULT_PORT):
+    """
+    Path of the file holding the token of a server.
+
+    Parameters
+    ----------
+    port : int, optional, default=8765
+        Port the server listens on.
+
+    Returns
+    -------
+    str
+        Path in ``~/.mbuild_polybuild``, a directory readable only by its owner.
+    """
+
+    return os.path.join(os.path.expanduser("~"), ".mbuild_polybuild", "server-{}.token".format(port))
+
+
+def _write_token(filename, token):
+    """Write a token to a file readable only by the current user."""
+
+    os.makedirs(os.path.dirname(filename), mode=0o700, exist_ok=True)
+    fd = os.open(filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    # The mode of os.open only applies to new files, and os.fchmod is not available on Windows
+    os.chmod(filename, 0o600)
+    with os.fdopen(fd, "w") as f:
+        f.write(token)
+
+
+def warm(forcefields=("oplsaa.xml",), monomers=(), cache_dir=None):
+    """
+    Load forcefields and monomer templates into a worker process.
+
+    Parameters
+    ----------
+    forcefields : list[str], optional, default=("oplsaa.xml",)
+        Forcefields to parse, see :func:`mbuild_polybuild.toolbox.load_forcefield`.
+    monomers : list[str or dict], optional, default=()
+        Monomer templates to build, as in the "monomers" of a spec, e.g., ``{"type": "Sbma", "spacer_ion": 3}``.
+    cache_dir : str or bool, optional, default=None
+        Build cache directory, see :func:`mbuild_polybuild.cache.get_cache_dir`. If False, the cache is not used.
+
+    Returns
+    -------
+    int
+        Process id of the worker.
+    """
+
+    import mbuild_polybuild.aa_monomers
+    import mbuild_polybuild.cg_monomers  # noqa: F401
+
+    for forcefield in forcefields:
+        tb.load_forcefield(forcefield)
+    for options in monomers:
+        options = {"type": options} if isinstance(options, str) else dict(options)
+        name = options.pop("type")
+        _monomer_template(name, json.dumps(options, sort_keys=True), cache_dir)
+
+    return os.getpid()
+
+
+def _tasks(spec, cache_dir):
+    """Arguments of ``spec._system_task`` for each system of a validated spec."""
+
+    seed = spec["seed"]
+    return [
+        (
+            system,
+            None if seed is None else [seed, i],
+            spec["output"]["directory"],
+            spec["output"]["format"],
+            spec["forcefield"],
+            spec["nbfix"],
+            spec["nbfix_units"],
+            spec["cache_dir"] if spec["cache_dir"] is not None else cache_dir,
+            spec["name"],
+            spec["checkpoint"],
+        )
+        for i, system in enumerate(spec["systems"])
+    ]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Request handler of a :class:`BuildServer`."""
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.build_server.verbose:
+            super(_Handler, self).log_message(format, *args)
+
+    def _authorized(self):
+        """Check the token of a request, replying with an error if it is missing or wrong."""
+
+        token = self.headers.get(TOKEN_HEADER, "")
+        if not hmac.compare_digest(token.encode(), self.server.build_server.token.encode()):
+            self._reply(403, {"error": "Missing or invalid {} header".format(TOKEN_HEADER)})
+            return False
+        return True
+
+    def do_GET(self):
+        if not self._authorized():
+            return
+        if self.path != "/status":
+            self._reply(404, {"error": "Unknown path, {}".format(self.path)})
+            return
+        self._reply(200, self.server.build_server.status())
+
+    def do_POST(self):
+        build_server = self.server.build_server
+        if not self._authorized():
+            return
+        if self.headers.get("Content-Type", "").split(";")[0].strip().lower() != "application/json":
+            self._reply(415, {"error": "Request bodies must be application/json"})
+            return
+        if self.path == "/shutdown":
+            self._reply(200, {"ok": True})
+            threading.Thread(target=build_server.close, daemon=True).start()
+            return
+        if self.path != "/build":
+            self._reply(404, {"error": "Unknown path, {}".format(self.path)})
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            spec = load_spec(json.loads(self.rfile.read(length)))
+        except (ValueError, TypeError) as e:
+            self._reply(400, {"error": "{}: {}".format(type(e).__name__, e)})
+            return
+
+        start = time.perf_counter()
+        try:
+            results = build_server.build(spec)
+        except BrokenProcessPool as e:
+            self._reply(500, {"error": "{}: {}".format(type(e).__name__, e)})
+            return
+        self._reply(200, {"results": results, "elapsed": time.perf_counter() - start})
+
+
+class BuildServer:
+    """
+    Local HTTP build server with a warm process pool.
+
+    Parameters
+    ----------
+    host : str, optional, default="127.0.0.1"
+        Address to listen on. Only local addresses should be used, since requests may write files.
+    port : int, optional, default=8765
+        Port to listen on. If 0, a free port is chosen, see ``url``.
+    processes : int, optional, default=None
+        Number of worker processes. If None, ``os.cpu_count()`` is used.
+    forcefields : list[str], optional, default=("oplsaa.xml",)
+        Forcefields loaded by each worker at startup, see :func:`warm`.
+    monomers : list[str or dict], optional, default=()
+        Monomer templates built by each worker at startup, see :func:`warm`.
+    cache_dir : str or bool, optional, default=None
+        Build cache directory used when a spec does not set one.
+    verbose : bool, optional, default=False
+        If True, each request is logged to standard error.
+    token_path : str, optional, default=None
+        File the token of the server is written to. If None, :func:`token_file` of the port is used. The file is
+        removed when the server is closed.
+
+    Attributes
+    ----------
+    url : str
+        Address of the server, e.g., "http://127.0.0.1:8765".
+    token : str
+        Token that every request must carry in the ``X-Polybuild-Token`` header.
+
+    Examples
+    --------
+    >>> server = BuildServer(port=0, processes=4, monomers=["Sbma"]).start()
+    >>> report = submit("systems.yaml", url=server.url)
+    >>> server.close()
+    """
+
+    def __init__(
+        self,
+        host=DEFAULT_HOST,
+        port=DEFAULT_PORT,
+        processes=None,
+        forcefields=("oplsaa.xml",),
+        monomers=(),
+        cache_dir=None,
+        verbose=False,
+        token_path=None,
+    ):
+        self.processes = processes or os.cpu_count() or 1
+        self.cache_dir = cache_dir
+        self.verbose = verbose
+        self.n_systems = 0
+        self._started = time.time()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._serving = False
+        self._warm_args = (tuple(forcefields), tuple(monomers), cache_dir)
+        self._start_pool()
+
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.build_server = self
+        self.token = secrets.token_urlsafe(32)
+        self.token_path = token_file(self.httpd.server_address[1]) if token_path is None else token_path
+        _write_token(self.token_path, self.token)
+
+    def _start_pool(self):
+        """Start and warm a new worker pool."""
+
+        self.executor = ProcessPoolExecutor(max_workers=self.processes, initializer=warm, initargs=self._warm_args)
+        # Workers start on demand, so submitting one task per worker starts and warms all of them now
+        self.worker_pids = sorted(
+            {future.result() for future in [self.executor.submit(os.getpid) for _ in range(self.processes)]}
+        )
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return "http://{}:{}".format(host, port)
+
+    def status(self):
+        """
+        Server process, uptime, worker count, and number of completed systems.
+
+        Returns
+        -------
+        dict
+            Dictionary with keys "pid", "uptime", "processes", "worker_pids", and "n_systems".
+        """
+
+        return {
+            "pid": os.getpid(),
+            "uptime": time.time() - self._started,
+            "processes": self.processes,
+            "worker_pids": self.worker_pids,
+            "n_systems": self.n_systems,
+        }
+
+    def build(self, spec):
+        """
+        Build and write the systems of a validated spec on the worker pool.
+
+        Parameters
+        ----------
+        spec : dict
+            Specification from :func:`mbuild_polybuild.spec.load_spec`.
+
+        Returns
+        -------
+        list[dict]
+            Result of each system in the order of the spec.
+
+        Raises
+        ------
+        BrokenProcessPool
+            If a worker died during the builds. A new pool is started for later requests.
+        """
+
+        os.makedirs(spec["output"]["directory"], exist_ok=True)
+        executor = self.executor
+        try:
+            futures = [executor.submit(_system_task, *task) for task in _tasks(spec, self.cache_dir)]
+            wait(futures)
+            results = [future.result() for future in futures]
+        except BrokenProcessPool:
+            with self._lock:
+                # Concurrent requests share the broken pool, only the first one replaces it
+                if self.executor is executor:
+                    executor.shutdown(wait=False)
+                    self._start_pool()
+            raise
+        with self._lock:
+            self.n_systems += len(results)
+
+        return results
+
+    def start(self):
+        """
+        Serve requests in a background thread.
+
+        Returns
+        -------
+        BuildServer
+            This server.
+        """
+
+        self._serving = True
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+
+        return self
+
+    def serve_forever(self):
+        """Serve requests in this thread until the server is shut down."""
+
+        self._serving = True
+        try:
+            self.httpd.serve_forever()
+        finally:
+            self.httpd.server_close()
+            self.executor.shutdown()
+            self._remove_token()
+
+    def _remove_token(self):
+        if os.path.exists(self.token_path):
+            os.remove(self.token_path)
+
+    def close(self):
+        """Stop serving, if started, and shut down the worker pool."""
+
+        # shutdown waits for serve_forever to return, so it would block if the server was never started
+        if self._serving:
+            self.httpd.shutdown()
+        if self._thread is not None:
+            self._thread.join()
+        self.httpd.server_close()
+        self.executor.shutdown()
+        self._remove_token()
+
+
+def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, processes=None, forcefields=("oplsaa.xml",), monomers=(), **kwargs):
+    """
+    Run a build server until it is shut down.
+
+    Parameters
+    ----------
+    host : str, optional, default="127.0.0.1"
+        Address to listen on.
+    port : int, optional, default=8765
+        Port to listen on.
+    processes : int, optional, default=None
+        Number of worker processes. If None, ``os.cpu_count()`` is used.
+    forcefields : list[str], optional, default=("oplsaa.xml",)
+        Forcefields loaded by each worker at startup.
+    monomers : list[str or dict], optional, default=()
+        Monomer templates built by each worker at startup.
+    **kwargs
+        Other arguments of :class:`BuildServer`.
+    """
+
+    server = BuildServer(
+        host=host, port=port, processes=processes, forcefields=forcefields, monomers=monomers, **kwargs
+    )
+    print("Serving builds at {} with {} warm workers".format(server.url, server.processes), flush=True)
+    server.serve_forever()
+
+
+def _request(url, data=None, timeout=None, token=None):
+    """JSON response of a GET, or a POST of ``data``, raising a ValueError with the server's error message."""
+
+    if token is None:
+        filename = token_file(urllib.parse.urlsplit(url).port or DEFAULT_PORT)
+        if not os.path.exists(filename):
+            raise ValueError("No server token found at {}, is the server running?".format(filename))
+        with open(filename) as f:
+            token = f.read().strip()
+    request = urllib.request.Request(
+        url,
+        data=None if data is None else json.dumps(data).encode(),
+        headers={"Content-Type": "application/json", TOKEN_HEADER: token},
+        method="GET" if data is None else "POST",
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        raise ValueError(json.loads(e.read()).get("error", str(e)))
+
+
+def submit(spec, url=DEFAULT_URL, timeout=None, token=None):
+    """
+    Build the systems of a specification on a running server.
+
+    Relative output and cache directories, ``nbfix`` files, and forcefield files are resolved against the client's
+    working directory.
+
+    Parameters
+    ----------
+    spec : str or dict
+        Specification or the path to one, see :func:`mbuild_polybuild.spec.load_spec`.
+    url : str, optional, default="http://127.0.0.1:8765"
+        Address of the server.
+    timeout : float, optional, default=None
+        Seconds to wait for the builds. If None, wait indefinitely.
+    token : str, optional, default=None
+        Token of the server. If None, it is read from :func:`token_file` of the port of ``url``.
+
+    Returns
+    -------
+    SweepReport
+        Result of each system in the order of the spec, with timings measured by the workers.
+    """
+
+    spec = load_spec(spec)
+    spec["output"]["directory"] = os.path.abspath(spec["output"]["directory"])
+    if isinstance(spec["cache_dir"], str):
+        spec["cache_dir"] = os.path.abspath(spec["cache_dir"])
+    if spec["nbfix"] is not None:
+        spec["nbfix"] = os.path.abspath(spec["nbfix"])
+    if isinstance(spec["forcefield"], str) and os.path.isfile(spec["forcefield"]):
+        spec["forcefield"] = os.path.abspath(spec["forcefield"])
+    response = _request(url.rstrip("/") + "/build", data=spec, timeout=timeout, token=token)
+
+    return SweepReport(response["results"], response["elapsed"])
+
+
+def server_status(url=DEFAULT_URL, timeout=5.0, token=None):
+    """
+    Status of a running server.
+
+    Parameters
+    ----------
+    url : str, optional, default="http://127.0.0.1:8765"
+        Address of the server.
+    timeout : float, optional, default=5.0
+        Seconds to wait for a response.
+    token : str, optional, default=None
+        Token of the server. If None, it is read from :func:`token_file` of the port of ``url``.
+
+    Returns
+    -------
+    dict
+        Status, see :meth:`BuildServer.status`.
+    """
+
+    return _request(url.rstrip("/") + "/status", timeout=timeout, token=token)
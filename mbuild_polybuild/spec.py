@@ -0,0 +1,489 @@
+"""Spec Module
+
+This module builds systems from a declarative JSON or YAML specification, the input of the ``polybuild`` command.
+A spec lists one or more systems, each made of copies of a chain with a given sequence and tacticity, and ions, in a
+box, together with the forcefield, nbfix file, and output format shared by all systems. For example:
+
+.. code-block:: yaml
+
+    output:
+      directory: build
+      format: gromacs
+    forcefield: oplsaa.xml
+    processes: 4
+    seed: 1
+    checkpoint: true
+    systems:
+      - name: psbma
+        monomers:
+          A: {type: Sbma, spacer_backbone: 2, spacer_ion: 3}
+        sequence: A
+        repeat: 20
+        tacticity: syndiotactic
+        n_chains: 50
+        ions: {Na: 10, Cl: 10}
+        neutralize: [Na, Cl]
+        box: [8.0, 8.0, 8.0]
+        relax: true
+
+Monomer templates are built through :func:`mbuild_polybuild.cache.cached_build` and kept for the life of the
+process, each chain is built once with :class:`mbuild_polybuild.architectures.Chain`, and copies are placed with array
+operations. Systems are built in parallel worker processes and recorded in a ``manifest.jsonl`` file in the output
+directory. With ``checkpoint: true``, the result of each build stage is saved next to the output, see
+:mod:`mbuild_polybuild.checkpoint`, and a rerun resumes each system from its last completed stage. A system with
+``neutralize`` gets the cations or anions that cancel the net charge of its chains and ions, from forcefield charges
+resolved once per monomer variant, see :mod:`mbuild_polybuild.charges`.
+
+Functions
+---------
+- load_spec: Read and validate a system specification.
+- build_system: Build the arrays of one system of a specification.
+- run_spec: Build and write every system of a specification.
+"""
+
+import os
+import json
+import time
+import inspect
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
+
+import numpy as np
+
+import mbuild_polybuild.toolbox as tb
+from mbuild_polybuild.aa_molecules import MonatomicIon
+from mbuild_polybuild.architectures import Chain
+from mbuild_polybuild.arrays import concatenate, replicate, to_arrays
+from mbuild_polybuild.cache import build_key, cached_build
+from mbuild_polybuild.charges import ION_CHARGES, counterions, resolve_charges
+from mbuild_polybuild.checkpoint import run_stages
+from mbuild_polybuild.gromacs import write_gromacs
+from mbuild_polybuild.network import place_copies
+from mbuild_polybuild.relax import relax
+from mbuild_polybuild.sweep import SweepReport, _get_builder
+
+TACTICITIES = ["isotactic", "syndiotactic", "atactic"]
+
+_SPEC_DEFAULTS = {
+    "name": "polybuild",
+    "output": {},
+    "forcefield": None,
+    "nbfix": None,
+    "nbfix_units": "real",
+    "cache_dir": None,
+    "checkpoint": False,
+    "processes": None,
+    "seed": None,
+}
+_OUTPUT_DEFAULTS = {"directory": ".", "format": "gromacs"}
+_SYSTEM_DEFAULTS = {
+    "sequence": None,
+    "repeat": 1,
+    "length": None,
+    "tacticity": None,
+    "n_chains": 1,
+    "ions": {},
+    "box": None,
+    "relax": False,
+    "neutralize": None,
+}
+_CHIRAL_KEYWORDS = ["switch_backbone_chiral", "chiral_switch"]
+
+
+def _fill(values, defaults, name):
+    """Copy of ``values`` with defaults, raising a ValueError for unknown keys."""
+
+    unknown = set(values) - set(defaults)
+    if unknown:
+        raise ValueError("Unknown {} keys: {}".format(name, sorted(unknown)))
+
+    return {key: values.get(key, value) for key, value in defaults.items()}
+
+
+def load_spec(spec):
+    """
+    Read and validate a system specification.
+
+    Parameters
+    ----------
+    spec : str or dict
+        Path to a ``.json``, ``.yaml``, or ``.yml`` file, or an already parsed specification. YAML files require
+        PyYAML.
+
+    Returns
+    -------
+    dict
+        Specification with defaults filled in for every optional key.
+    """
+
+    if isinstance(spec, str):
+        with open(spec, "r") as f:
+            if os.path.splitext(spec)[1].lower() in [".yaml", ".yml"]:
+                try:
+                    import yaml
+                except ImportError:
+                    raise ImportError("PyYAML is required to read YAML specs, install it or use JSON instead.")
+                spec = yaml.safe_load(f)
+            else:
+                spec = json.load(f)
+    if not isinstance(spec, dict):
+        raise ValueError("A spec must be a mapping.")
+
+    systems = spec.get("systems")
+    if not systems:
+        raise ValueError("A spec requires a list of systems.")
+    spec = _fill({key: value for key, value in spec.items() if key != "systems"}, _SPEC_DEFAULTS, "spec")
+    spec["output"] = _fill(spec["output"], _OUTPUT_DEFAULTS, "output")
+
+    spec["systems"] = []
+    for i, system in enumerate(systems):
+        system = dict(system)
+        name = system.pop("name", "system{}".format(i))
+        # Names become output file names, so they must not reach outside the output directory
+        if not isinstance(name, str) or name in ["", ".", ".."] or "/" in name or "\\" in name:
+            raise ValueError("System name, {}, must be a file name without path separators.".format(name))
+        monomers = system.pop("monomers", None)
+        if not monomers:
+            raise ValueError("System, {}, requires monomers.".format(name))
+        system = _fill(system, _SYSTEM_DEFAULTS, "system")
+        system["name"] = name
+
+        system["monomers"] = {}
+        for letter, options in sorted(monomers.items()):
+            if isinstance(options, str):
+                options = {"type": options}
+            options = dict(options)
+            _get_builder(options.get("type", ""))
+            system["monomers"][letter] = options
+        letters = "".join(system["monomers"])
+        if letters != "ABCDEFGHIJK"[: len(letters)]:
+            raise ValueError("Monomers of system, {}, must be labeled A, B, C, and so on.".format(name))
+
+        if system["sequence"] is None and system["length"] is None:
+            system["sequence"] = "A"
+        if system["sequence"] is not None and set(system["sequence"]) - set(letters):
+            raise ValueError("Sequence, {}, must consist of the letters {}.".format(system["sequence"], letters))
+        if system["tacticity"] is not None and system["tacticity"] not in TACTICITIES:
+            raise ValueError("Tacticity, {}, is not one of {}".format(system["tacticity"], TACTICITIES))
+        if system["box"] is None:
+            raise ValueError("System, {}, requires a box.".format(name))
+        if system["neutralize"] is True:
+            system["neutralize"] = ["Na", "Cl"]
+        if system["neutralize"]:
+            if (
+                len(system["neutralize"]) != 2
+                or ION_CHARGES.get(system["neutralize"][0], 0) <= 0
+                or ION_CHARGES.get(system["neutralize"][1], 0) >= 0
+            ):
+                raise ValueError("Neutralize, {}, must be a cation and an anion.".format(system["neutralize"]))
+            if spec["forcefield"] is None:
+                raise ValueError("System, {}, requires a forcefield to be neutralized.".format(name))
+            system["neutralize"] = list(system["neutralize"])
+        else:
+            system["neutralize"] = None
+        box = np.broadcast_to(np.asarray(system["box"], dtype=float), (3,))
+        system["box"] = [float(x) for x in box]
+        spec["systems"].append(system)
+
+    return spec
+
+
+def _switched(n, tacticity, rng):
+    """Whether the backbone stereocenter of each of ``n`` monomers is switched."""
+
+    if tacticity == "syndiotactic":
+        return np.arange(n) % 2 == 1
+    if tacticity == "atactic":
+        return rng.random(n) < 0.5
+    return np.zeros(n, dtype=bool)
+
+
+@lru_cache(maxsize=None)
+def _monomer_template(name, options, cache_dir):
+    """
+    Monomer template, built or loaded from the build cache once per process.
+
+    The template must not be modified, clone it instead.
+
+    Parameters
+    ----------
+    name : str
+        Class name of a monomer in ``aa_monomers`` or ``cg_monomers``.
+    options : str
+        JSON object of keyword arguments, a string so that it can be part of the cache key.
+    cache_dir : str or bool
+        Build cache directory, see :func:`mbuild_polybuild.cache.get_cache_dir`. If False, the cache is not used.
+
+    Returns
+    -------
+    mb.Compound
+        The monomer.
+    """
+
+    builder = _get_builder(name)
+    if cache_dir is False:
+        return builder(**json.loads(options))
+
+    return cached_build(builder, cache_dir=cache_dir, **json.loads(options))
+
+
+def _templates(monomers, sequence, tacticity, rng, cache_dir):
+    """Monomer templates and the chain sequence over them, with chiral variants for the requested tacticity."""
+
+    switched = _switched(len(sequence), tacticity, rng)
+    templates, index, letters = [], {}, []
+    for letter, switch in zip(sequence, switched):
+        key = (letter, bool(switch))
+        if key not in index:
+            options = dict(monomers[letter])
+            name = options.pop("type")
+            if switch:
+                keywords = [x for x in _CHIRAL_KEYWORDS if x in inspect.signature(_get_builder(name)).parameters]
+                if not keywords:
+                    raise ValueError("Monomer, {}, has no backbone stereocenter to switch.".format(name))
+                options[keywords[0]] = True
+            templates.append(_monomer_template(name, json.dumps(options, sort_keys=True), cache_dir))
+            index[key] = len(index)
+        letters.append("ABCDEFGHIJKLMNOPQRSTUVWXYZ"[index[key]])
+
+    return templates, "".join(letters)
+
+
+def build_system(system, seed=None, cache_dir=None, forcefield=None):
+    """
+    Build the arrays of one system of a specification.
+
+    Parameters
+    ----------
+    system : dict
+        One entry of the "systems" list of a spec from :func:`load_spec`.
+    seed : int or list[int], optional, default=None
+        Seed of the random sequence, tacticity, and placement.
+    cache_dir : str or bool, optional, default=None
+        Build cache directory, see :func:`mbuild_polybuild.cache.get_cache_dir`. If False, the cache is not used.
+    forcefield : str, optional, default=None
+        Forcefield of the charges of a system with "neutralize", see :func:`mbuild_polybuild.charges.resolve_charges`.
+
+    Returns
+    -------
+    SystemArrays
+        The chains followed by the ions, in the box of the system.
+    """
+
+    chain_rng, pack_rng = _streams(seed)
+    result = _pack(_build_chain(system, chain_rng, cache_dir, forcefield), system, pack_rng)
+    if system["relax"]:
+        _relax(result, system)
+
+    return result
+
+
+def _streams(seed):
+    """Independent random streams of the chain and packing stages, so either can be rerun on its own."""
+
+    return [np.random.default_rng(x) for x in np.random.SeedSequence(seed).spawn(2)]
+
+
+def _build_chain(system, rng, cache_dir, forcefield=None):
+    """Arrays of one chain of a system, with forcefield charges if the system is neutralized."""
+
+    if system["sequence"] is not None:
+        sequence = system["sequence"] * int(system["repeat"])
+    else:
+        sequence = tb.random_sequence(len(system["monomers"]), int(system["length"]), seed=rng)
+
+    templates, chain_sequence = _templates(system["monomers"], sequence, system["tacticity"], rng, cache_dir)
+
+    chain = to_arrays(Chain(templates, sequence=chain_sequence))
+    if system["neutralize"]:
+        if forcefield is None:
+            raise ValueError("System, {}, requires a forcefield to be neutralized.".format(system["name"]))
+        resolve_charges(chain, forcefield)
+
+    return chain
+
+
+def _pack(chain, system, rng):
+    """Copies of a chain and the ions of a system at random positions in its box."""
+
+    box = np.asarray(system["box"], dtype=float)
+    positions, _ = place_copies(chain, np.zeros((0, 3)), int(system["n_chains"]), box, rng)
+    parts = [replicate(chain, positions)]
+    ions = dict(system["ions"])
+    if system["neutralize"]:
+        charge = chain.charges.sum() * int(system["n_chains"])
+        charge += sum(ION_CHARGES.get(element, 0) * int(count) for element, count in ions.items())
+        for element, count in counterions(charge, *system["neutralize"]).items():
+            ions[element] = int(ions.get(element, 0)) + count
+    for element, count in ions.items():
+        ion = to_arrays(MonatomicIon(element=element))
+        parts.append(replicate(ion, rng.uniform(0.0, 1.0, size=(int(count), 1, 3)) * box))
+
+    return concatenate(parts, box=box)
+
+
+def _relax(arrays, system):
+    """Relax a packed system in place and return it."""
+
+    relax(arrays, **(system["relax"] if isinstance(system["relax"], dict) else {}))
+
+    return arrays
+
+
+def _stages(system, seed, stem, file_format, forcefield, nbfix, nbfix_units, cache_dir, title):
+    """Named stages of the build of one system, each taking the result of the previous one."""
+
+    chain_rng, pack_rng = _streams(seed)
+    stages = [
+        ("chain", lambda _: _build_chain(system, chain_rng, cache_dir, forcefield)),
+        ("pack", lambda chain: _pack(chain, system, pack_rng)),
+    ]
+    if system["relax"]:
+        stages.append(("relax", lambda arrays: _relax(arrays, system)))
+
+    if file_format == "gromacs":
+
+        def write(arrays):
+            paths = [stem + ".top", stem + ".gro"]
+            write_gromacs(
+                arrays,
+                paths[0],
+                paths[1],
+                forcefield=forcefield,
+                title=title,
+                nbfix=nbfix,
+                nbfix_units=nbfix_units,
+            )
+            return paths
+
+        stages.append(("write", write))
+        return stages
+
+    stages.append(("structure", lambda arrays: arrays.to_parmed()))
+    if forcefield is not None:
+        stages.append(("type", lambda structure: tb.load_forcefield(forcefield).apply(structure)))
+        if nbfix is not None:
+            stages.append(("nbfix", lambda structure: tb.apply_nbfix(structure, nbfix, units=nbfix_units)))
+
+    def write(structure):
+        path = "{}.{}".format(stem, file_format)
+        structure.save(path, overwrite=True)
+        return path
+
+    stages.append(("write", write))
+
+    return stages
+
+
+def _system_task(system, seed, output_dir, file_format, forcefield, nbfix, nbfix_units, cache_dir, title, checkpoint):
+    """Build, type, and write one system. Errors are returned rather than raised."""
+
+    result = {"name": system["name"], "pid": os.getpid(), "path": None, "error": None, "resumed": []}
+    timings = {}
+    start = time.perf_counter()
+    try:
+        stem = os.path.join(output_dir, system["name"])
+        title = "{} {}".format(title, system["name"])
+        stages = _stages(system, seed, stem, file_format, forcefield, nbfix, nbfix_units, cache_dir, title)
+        if checkpoint:
+            # Checkpoints of a system built with other inputs or another version are not resumed
+            key = build_key(
+                _stages, args=(system, seed, stem, file_format, forcefield, nbfix, nbfix_units, cache_dir, title)
+            )
+            path, timings, result["resumed"] = run_stages(stages, stem + ".checkpoint", key=key)
+        else:
+            path = None
+            for name, function in stages:
+                tic = time.perf_counter()
+                path = function(path)
+                timings[name] = time.perf_counter() - tic
+        result["path"] = path
+        # Stage totals in the categories of the sweep report
+        timings["build"] = sum(timings.get(x, 0.0) for x in ["chain", "pack", "relax"])
+        if forcefield is not None and file_format != "gromacs":
+            timings["type"] = sum(timings.get(x, 0.0) for x in ["type", "nbfix"])
+    except Exception as e:
+        result["error"] = "{}: {}".format(type(e).__name__, e)
+
+    timings["total"] = time.perf_counter() - start
+    result["timings"] = timings
+
+    return result
+
+
+def run_spec(spec, processes=None, output_dir=None, cache_dir=None, callback=None):
+    """
+    Build and write every system of a specification.
+
+    Parameters
+    ----------
+    spec : str or dict
+        Specification or the path to one, see :func:`load_spec`.
+    processes : int, optional, default=None
+        Number of worker processes, overriding the spec. If both are None, ``os.cpu_count()`` is used. With 1, systems
+        are built in this process.
+    output_dir : str, optional, default=None
+        Output directory, overriding the spec.
+    cache_dir : str or bool, optional, default=None
+        Build cache directory, overriding the spec. If False, the cache is not used.
+    callback : callable, optional, default=None
+        Function called with each result as it completes.
+
+    Returns
+    -------
+    SweepReport
+        Results in order of completion, with per-system timings.
+
+    Examples
+    --------
+    >>> report = run_spec("systems.yaml", processes=8)
+    >>> print(report.summary())
+    """
+
+    spec = load_spec(spec)
+    if processes is None:
+        processes = spec["processes"] or os.cpu_count() or 1
+    if output_dir is None:
+        output_dir = spec["output"]["directory"]
+    if cache_dir is None:
+        cache_dir = spec["cache_dir"]
+    os.makedirs(output_dir, exist_ok=True)
+
+    # Each system draws from its own stream, so results do not depend on the number of processes
+    seed = spec["seed"]
+    tasks = [
+        (
+            system,
+            None if seed is None else [seed, i],
+            output_dir,
+            spec["output"]["format"],
+            spec["forcefield"],
+            spec["nbfix"],
+            spec["nbfix_units"],
+            cache_dir,
+            spec["name"],
+            spec["checkpoint"],
+        )
+        for i, system in enumerate(spec["systems"])
+    ]
+
+    results = []
+    start = time.perf_counter()
+    with open(os.path.join(output_dir, "manifest.jsonl"), "a") as manifest:
+
+        def record(result):
+            manifest.write(json.dumps(result) + "\n")
+            manifest.flush()
+            results.append(result)
+            if callback is not None:
+                callback(result)
+
+        if processes == 1:
+            for task in tasks:
+                record(_system_task(*task))
+        else:
+            with ProcessPoolExecutor(max_workers=min(processes, len(tasks))) as executor:
+                for future in as_completed([executor.submit(_system_task, *task) for task in tasks]):
+                    record(future.result())
+
+    return SweepReport(results, time.perf_counter() - start)
@@ -0,0 +1,586 @@
+"""Store Module
+
+This module assembles systems that do not fit in memory. Chains are appended to a `SystemStore` as they are built,
+which writes their arrays to flat binary files in a directory, and writers read those files back as memory maps in
+blocks of whole chains. Only the chains being appended and one block being written are held in memory, so the peak
+memory of assembling and writing a system is bounded by the ``memory_budget`` of the store rather than by its size.
+
+Each chain is hashed when it is appended, see :func:`mbuild_polybuild.gromacs.chain_types`, and the first chain of
+each type is kept, so GROMACS topologies are written without reading the coordinates.
+
+Functions
+---------
+- open_store: Open an existing store for reading or appending.
+
+Classes
+-------
+- SystemStore: Out-of-core system of chains backed by memory-mapped files.
+"""
+
+import os
+import json
+
+import numpy as np
+
+from mbuild_polybuild.arrays import SystemArrays, concatenate, replicate, to_arrays
+from mbuild_polybuild.gromacs import _chain_keys, _write_gro_atoms, write_top
+
+METADATA = "store.json"
+
+_PARTICLE_FIELDS = [
+    # name, dtype, number of columns
+    ("positions", np.float64, 3),
+    ("atomic_numbers", np.int64, 1),
+    ("masses", np.float64, 1),
+    ("charges", np.float64, 1),
+    ("monomer_index", np.int64, 1),
+    ("chain_index", np.int64, 1),
+    ("name_codes", np.int32, 1),
+]
+_OTHER_FIELDS = [
+    ("bonds", np.int64, 2),
+    ("monomer_codes", np.int32, 1),
+    # Offsets of the first particle, bond, and monomer of each chain, and its molecule type
+    ("chain_particles", np.int64, 1),
+    ("chain_bonds", np.int64, 1),
+    ("chain_monomers", np.int64, 1),
+    ("chain_types", np.int64, 1),
+]
+_PARTICLE_BYTES = sum(np.dtype(dtype).itemsize * ncol for _, dtype, ncol in _PARTICLE_FIELDS)
+_BOND_BYTES = 2 * np.dtype(np.int64).itemsize
+
+
+class SystemStore:
+    """
+    Out-of-core system of chains backed by memory-mapped files.
+
+    Particles are stored in chain order with global bond, monomer, and chain indices, so a range of chains is one
+    contiguous slice of every file.
+
+    Parameters
+    ----------
+    directory : str
+        Store directory, created if it does not exist.
+    mode : str, optional, default="w"
+        "w" to start an empty store, removing the files of a previous one, "a" to append to an existing store, or "r"
+        to read one. In "a" mode, data appended after the metadata was last written, see :meth:`flush`, is discarded.
+    box : numpy.ndarray, optional, default=None
+        Box lengths in nm. If None when writing, the bounds of the positions are used. Ignored unless mode is "w".
+    memory_budget : int, optional, default=268435456
+        Approximate number of bytes of arrays held in memory at once when replicating or reading blocks of chains.
+
+    Attributes
+    ----------
+    n_particles, n_bonds, n_monomers, n_chains : int
+        Size of the stored system.
+    n_types : int
+        Number of unique chains.
+
+    Examples
+    --------
+    >>> with SystemStore("big.store", box=[100.0, 100.0, 100.0], memory_budget=2**30) as store:
+    ...     for block in blocks_of_positions:
+    ...         store.extend(chain, block)
+    ...     store.write_gromacs("big.top", "big.gro", forcefield="oplsaa.xml")
+    """
+
+    def __init__(self, directory, mode="w", box=None, memory_budget=2**28):
+        if mode not in ["w", "a", "r"]:
+            raise ValueError("Mode, {}, is not one of 'w', 'a', or 'r'".format(mode))
+        self.directory = directory
+        self.mode = mode
+        self.memory_budget = int(memory_budget)
+        self._files = {}
+
+        path = os.path.join(directory, METADATA)
+        if mode == "w":
+            os.makedirs(os.path.join(directory, "types"), exist_ok=True)
+            for name in os.listdir(os.path.join(directory, "types")):
+                os.remove(os.path.join(directory, "types", name))
+            for name, _, _ in _PARTICLE_FIELDS + _OTHER_FIELDS:
+                open(os.path.join(directory, name + ".bin"), "wb").close()
+            self.box = None if box is None else np.asarray(box, dtype=float)
+            self.n_particles, self.n_bonds, self.n_monomers, self.n_chains = 0, 0, 0, 0
+            self._names, self._monomer_names, self._type_keys = [], [], []
+            self._write_metadata()
+        else:
+            if not os.path.isfile(path):
+                raise ValueError("No store found in {}".format(directory))
+            with open(path, "r") as f:
+                metadata = json.load(f)
+            self.box = None if metadata["box"] is None else np.asarray(metadata["box"], dtype=float)
+            self.n_particles, self.n_bonds, self.n_monomers, self.n_chains = metadata["shape"]
+            self._names, self._monomer_names = metadata["names"], metadata["monomer_names"]
+            self._type_keys = [bytes.fromhex(x) for x in metadata["types"]]
+            if mode == "a":
+                self._truncate()
+        self._name_codes = {name: i for i, name in enumerate(self._names)}
+        self._monomer_name_codes = {name: i for i, name in enumerate(self._monomer_names)}
+        self._type_codes = {key: i for i, key in enumerate(self._type_keys)}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def n_types(self):
+        return len(self._type_keys)
+
+    def _write_metadata(self):
+        """Replace the metadata atomically, so that an interrupted write leaves the previous one intact."""
+
+        path = os.path.join(self.directory, METADATA)
+        metadata = {
+            "shape": [self.n_particles, self.n_bonds, self.n_monomers, self.n_chains],
+            "box": None if self.box is None else self.box.tolist(),
+            "names": self._names,
+            "monomer_names": self._monomer_names,
+            "types": [x.hex() for x in self._type_keys],
+        }
+        with open(path + ".tmp", "w") as f:
+            json.dump(metadata, f)
+        os.replace(path + ".tmp", path)
+
+    def _rows(self, name):
+        """Number of rows of a field."""
+
+        return {
+            "bonds": self.n_bonds,
+            "monomer_codes": self.n_monomers,
+            "chain_particles": self.n_chains,
+            "chain_bonds": self.n_chains,
+            "chain_monomers": self.n_chains,
+            "chain_types": self.n_chains,
+        }.get(name, self.n_particles)
+
+    def _truncate(self):
+        """
+        Discard data appended after the metadata was last written, e.g., by a process that was killed, so that new
+        chains are appended directly after the recorded ones.
+        """
+
+        for name, dtype, ncol in _PARTICLE_FIELDS + _OTHER_FIELDS:
+            path = os.path.join(self.directory, name + ".bin")
+            size = self._rows(name) * ncol * np.dtype(dtype).itemsize
+            if os.path.getsize(path) < size:
+                raise ValueError("Store, {}, is missing data of {}".format(self.directory, name))
+            os.truncate(path, size)
+        for name in os.listdir(os.path.join(self.directory, "types")):
+            if int(os.path.splitext(name)[0]) >= self.n_types:
+                os.remove(os.path.join(self.directory, "types", name))
+
+    def _file(self, name):
+        """Open append handle of a field."""
+
+        if name not in self._files:
+            self._files[name] = open(os.path.join(self.directory, name + ".bin"), "ab")
+        return self._files[name]
+
+    def _codes(self, values, codes, table):
+        """Integer codes of strings, adding new strings to the table."""
+
+        unique, inverse = np.unique(np.asarray(values, dtype=str), return_inverse=True)
+        for value in unique.tolist():
+            if value not in codes:
+                codes[value] = len(table)
+                table.append(value)
+        lookup = np.array([codes[x] for x in unique.tolist()], dtype=np.int32)
+
+        return lookup[inverse.ravel()]
+
+    def _append(self, system, keys):
+        """Append a system whose particles and monomers are in chain order, with the type key of each chain."""
+
+        if self.mode == "r":
+            raise ValueError("Store, {}, is open for reading".format(self.directory))
+        chain_particles = np.searchsorted(system.chain_index, np.arange(system.n_chains))
+        bond_chain = system.chain_index[system.bonds[:, 0]]
+        bond_order = np.argsort(bond_chain, kind="stable")
+        chain_bonds = np.searchsorted(bond_chain[bond_order], np.arange(system.n_chains))
+        in_monomer = system.monomer_index >= 0
+        _, first = np.unique(system.monomer_index[in_monomer], return_index=True)
+        monomer_chain = system.chain_index[in_monomer][first]
+        chain_monomers = np.searchsorted(monomer_chain, np.arange(system.n_chains))
+
+        types = np.empty(system.n_chains, dtype=np.int64)
+        for chain, key in enumerate(keys):
+            if key not in self._type_codes:
+                self._type_codes[key] = len(self._type_keys)
+                self._type_keys.append(key)
+                path = os.path.join(self.directory, "types", "{}.npz".format(self._type_codes[key]))
+                _chains(system, chain, chain + 1).save(path)
+            types[chain] = self._type_codes[key]
+
+        fields = {
+            "positions": system.positions,
+            "atomic_numbers": system.atomic_numbers,
+            "masses": system.masses,
+            "charges": system.charges,
+            "monomer_index": np.where(system.monomer_index >= 0, system.monomer_index + self.n_monomers, -1),
+            "chain_index": system.chain_index + self.n_chains,
+            "name_codes": self._codes(system.names, self._name_codes, self._names),
+            "bonds": system.bonds[bond_order] + self.n_particles,
+            "monomer_codes": self._codes(system.monomer_names, self._monomer_name_codes, self._monomer_names),
+            "chain_particles": chain_particles + self.n_particles,
+            "chain_bonds": chain_bonds + self.n_bonds,
+            "chain_monomers": chain_monomers + self.n_monomers,
+            "chain_types": types,
+        }
+        for name, dtype, _ in _PARTICLE_FIELDS + _OTHER_FIELDS:
+            self._file(name).write(np.ascontiguousarray(fields[name], dtype=dtype).tobytes())
+
+        self.n_particles += system.n_particles
+        self.n_bonds += system.n_bonds
+        self.n_monomers += system.n_monomers
+        self.n_chains += system.n_chains
+
+    def append(self, system):
+        """
+        Append the chains of a system.
+
+        Parameters
+        ----------
+        system : SystemArrays or mb.Compound
+            Chains to append. Particles are reordered by chain and monomers are numbered in that order.
+        """
+
+        if not isinstance(system, SystemArrays):
+            system = to_arrays(system)
+        if system.n_particles > 0:
+            system = _chain_order(system)
+            self._append(system, _chain_keys(system))
+
+    def extend(self, system, positions):
+        """
+        Append copies of a system with new positions, replicating as many at a time as fit in the memory budget.
+
+        Parameters
+        ----------
+        system : SystemArrays or mb.Compound
+            System to copy, e.g., one chain.
+        positions : numpy.ndarray
+            Array of shape (K, n_particles, 3) of the positions of each copy, which may itself be a memory map.
+        """
+
+        if not isinstance(system, SystemArrays):
+            system = to_arrays(system)
+        if system.n_particles == 0:
+            return
+        system = _chain_order(system)
+        keys = _chain_keys(system)
+        copy_bytes = system.n_particles * _PARTICLE_BYTES + system.n_bonds * _BOND_BYTES
+        step = max(1, self.memory_budget // copy_bytes)
+        for start in range(0, len(positions), step):
+            copies = replicate(system, positions[start : start + step])
+            self._append(copies, keys * (copies.n_chains // system.n_chains))
+
+    def flush(self):
+        """Write buffered data and the metadata to disk, so that the store can be read or reopened."""
+
+        for f in self._files.values():
+            f.flush()
+        if self.mode != "r":
+            self._write_metadata()
+
+    def close(self):
+        """Flush and close the store."""
+
+        self.flush()
+        for f in self._files.values():
+            f.close()
+        self._files = {}
+
+    def _map(self, name):
+        """Read-only memory map of a field."""
+
+        dtype, ncol = {x[0]: x[1:] for x in _PARTICLE_FIELDS + _OTHER_FIELDS}[name]
+        rows = self._rows(name)
+        shape = (rows, ncol) if ncol > 1 else (rows,)
+        if rows == 0:
+            return np.zeros(shape, dtype=dtype)
+        if name in self._files:
+            self._files[name].flush()
+
+        return np.memmap(os.path.join(self.directory, name + ".bin"), dtype=dtype, mode="r", shape=shape)
+
+    @property
+    def chain_types(self):
+        """Array of shape (n_chains,) with the molecule type of each chain."""
+
+        return np.array(self._map("chain_types"))
+
+    def _offsets(self, name, total):
+        """Offsets of a chain field with the total appended."""
+
+        return np.concatenate([self._map(name), [total]])
+
+    def read(self, start=0, stop=None):
+        """
+        Read a range of chains into memory.
+
+        Parameters
+        ----------
+        start : int, optional, default=0
+            First chain.
+        stop : int, optional, default=None
+            Chain after the last one. If None, all remaining chains are read.
+
+        Returns
+        -------
+        SystemArrays
+            The chains, with bond, monomer, and chain indices starting from zero.
+        """
+
+        stop = self.n_chains if stop is None else min(stop, self.n_chains)
+        start = min(start, stop)
+        particles = self._offsets("chain_particles", self.n_particles)[[start, stop]]
+        bonds = self._offsets("chain_bonds", self.n_bonds)[[start, stop]]
+        monomers = self._offsets("chain_monomers", self.n_monomers)[[start, stop]]
+        atoms = slice(*particles)
+
+        names = np.array(self._names, dtype=str)
+        monomer_names = np.array(self._monomer_names, dtype=object)
+        system = SystemArrays(
+            particles[1] - particles[0],
+            bonds[1] - bonds[0],
+            names=names[self._map("name_codes")[atoms]] if len(names) > 0 else None,
+            monomer_names=monomer_names[self._map("monomer_codes")[slice(*monomers)]].tolist(),
+            box=self.box,
+        )
+        for name in ["positions", "atomic_numbers", "masses", "charges"]:
+            getattr(system, name)[:] = self._map(name)[atoms]
+        monomer_index = self._map("monomer_index")[atoms]
+        system.monomer_index[:] = np.where(monomer_index >= 0, monomer_index - monomers[0], -1)
+        system.chain_index[:] = self._map("chain_index")[atoms] - start
+        system.bonds[:] = self._map("bonds")[slice(*bonds)] - particles[0]
+
+        return system
+
+    def blocks(self, memory_budget=None):
+        """
+        Read the chains in consecutive blocks that fit in a memory budget.
+
+        Parameters
+        ----------
+        memory_budget : int, optional, default=None
+            Approximate bytes of arrays per block. If None, the budget of the store is used. A chain larger than the
+            budget is read as a block of its own.
+
+        Yields
+        ------
+        start : int
+            First chain of the block.
+        system : SystemArrays
+            Chains of the block, see :meth:`read`.
+        """
+
+        budget = self.memory_budget if memory_budget is None else memory_budget
+        cost = (
+            self._offsets("chain_particles", self.n_particles) * _PARTICLE_BYTES
+            + self._offsets("chain_bonds", self.n_bonds) * _BOND_BYTES
+        )
+        start = 0
+        while start < self.n_chains:
+            stop = max(start + 1, int(np.searchsorted(cost, cost[start] + budget, side="right")) - 1)
+            stop = min(stop, self.n_chains)
+            yield start, self.read(start, stop)
+            start = stop
+
+    def representatives(self):
+        """
+        First chain of each molecule type.
+
+        Returns
+        -------
+        SystemArrays
+            One chain per type, in order of the type numbers of :attr:`chain_types`.
+        """
+
+        return concatenate(
+            [SystemArrays.load(os.path.join(self.directory, "types", "{}.npz".format(i))) for i in range(self.n_types)],
+            box=self.box,
+        )
+
+    def bounds(self):
+        """
+        Minimum and maximum of the positions, read in blocks.
+
+        Returns
+        -------
+        numpy.ndarray
+            Array of shape (2, 3) of the lower and upper bounds, zero if the store is empty.
+        """
+
+        positions = self._map("positions")
+        if len(positions) == 0:
+            return np.zeros((2, 3))
+        step = max(1, self.memory_budget // positions.itemsize // 3)
+        lower = np.min([positions[i : i + step].min(axis=0) for i in range(0, len(positions), step)], axis=0)
+        upper = np.max([positions[i : i + step].max(axis=0) for i in range(0, len(positions), step)], axis=0)
+
+        return np.array([lower, upper])
+
+    def write_gro(self, filename, title="mbuild_polybuild system", chunk=100000):
+        """
+        Stream the coordinates to a GROMACS ``.gro`` file, reading one block of chains at a time.
+
+        Parameters
+        ----------
+        filename : str or file-like
+            Output ``.gro`` file.
+        title : str, optional, default="mbuild_polybuild system"
+            Title line.
+        chunk : int, optional, default=100000
+            Number of particles formatted and written at a time.
+        """
+
+        self.flush()
+        box = self.box if self.box is not None else np.ptp(self.bounds(), axis=0)
+        f = filename if hasattr(filename, "write") else open(filename, "w")
+        try:
+            f.write("{}\n{:5d}\n".format(title, self.n_particles))
+            atoms, residues = 0, 0
+            for _, system in self.blocks():
+                residues += _write_gro_atoms(f, system, chunk=chunk, first_atom=atoms, first_residue=residues)
+                atoms += system.n_particles
+            f.write("{:10.5f}{:10.5f}{:10.5f}\n".format(*box))
+        finally:
+            if f is not filename:
+                f.close()
+
+    def write_gromacs(
+        self,
+        top,
+        gro,
+        forcefield=None,
+        title="mbuild_polybuild system",
+        chunk=100000,
+        nbfix=None,
+        nbfix_units="real",
+    ):
+        """
+        Write the topology and coordinates of the stored system.
+
+        The topology is written from the representative chains, see
+        :func:`mbuild_polybuild.gromacs.write_top`, and the coordinates with :meth:`write_gro`.
+
+        Parameters
+        ----------
+        top : str or file-like
+            Output ``.top`` file.
+        gro : str or file-like
+            Output ``.gro`` file.
+        forcefield : str or foyer.Forcefield, optional, default=None
+            Forcefield applied to the representative chains.
+        title : str, optional, default="mbuild_polybuild system"
+            Title of both files.
+        chunk : int, optional, default=100000
+            Number of particles written to the ``.gro`` file at a time.
+        nbfix : str, optional, default=None
+            File of pair-specific nonbonded parameters applied after typing.
+        nbfix_units : str, optional, default="real"
+            Unit system of the ``nbfix`` parameters.
+
+        Returns
+        -------
+        list[tuple[str, int]]
+            Entries of the ``[ molecules ]`` section.
+        """
+
+        self.flush()
+        molecules = write_top(
+            self.representatives(),
+            top,
+            forcefield=forcefield,
+            title=title,
+            types=(self.chain_types, np.arange(self.n_types)),
+            nbfix=nbfix,
+            nbfix_units=nbfix_units,
+        )
+        self.write_gro(gro, title=title, chunk=chunk)
+
+        return molecules
+
+
+def _chain_order(system):
+    """System with particles ordered by chain and monomers numbered in order of their first particle."""
+
+    order = np.argsort(system.chain_index, kind="stable")
+    monomer_index = system.monomer_index[order]
+    monomers, first, inverse = np.unique(monomer_index, return_index=True, return_inverse=True)
+    inverse = inverse.ravel()
+    has_monomers = monomers >= 0
+    # Rank of each monomer by its first particle, with -1 kept for particles outside monomers
+    rank = np.full(len(monomers), -1, dtype=np.int64)
+    rank[has_monomers] = np.argsort(np.argsort(first[has_monomers], kind="stable"), kind="stable")
+    if np.array_equal(order, np.arange(system.n_particles)) and np.array_equal(rank[inverse], monomer_index):
+        return system
+
+    position = np.empty(system.n_particles, dtype=np.int64)
+    position[order] = np.arange(system.n_particles)
+    monomer_names = np.array(system.monomer_names, dtype=object)[monomers[has_monomers]]
+    result = SystemArrays(
+        system.n_particles,
+        system.n_bonds,
+        names=system.names[order],
+        monomer_names=monomer_names[np.argsort(rank[has_monomers])].tolist(),
+        box=system.box,
+    )
+    for name in ["positions", "atomic_numbers", "masses", "charges", "chain_index"]:
+        getattr(result, name)[:] = getattr(system, name)[order]
+    result.monomer_index[:] = rank[inverse]
+    result.bonds[:] = position[system.bonds]
+
+    return result
+
+
+def _chains(system, start, stop):
+    """Chains ``start`` to ``stop`` of a system in chain order, with indices starting from zero."""
+
+    particles = np.flatnonzero((system.chain_index >= start) & (system.chain_index < stop))
+    bonds = system.bonds[np.isin(system.bonds[:, 0], particles)] - particles[0]
+    monomer_index = system.monomer_index[particles]
+    used = monomer_index[monomer_index >= 0]
+    first = used.min() if len(used) > 0 else 0
+
+    result = SystemArrays(
+        len(particles),
+        len(bonds),
+        names=system.names[particles],
+        monomer_names=system.monomer_names[first : first + len(np.unique(used))],
+        box=system.box,
+    )
+    for name in ["positions", "atomic_numbers", "masses", "charges"]:
+        getattr(result, name)[:] = getattr(system, name)[particles]
+    result.monomer_index[:] = np.where(monomer_index >= 0, monomer_index - first, -1)
+    result.chain_index[:] = system.chain_index[particles] - start
+    result.bonds[:] = bonds
+
+    return result
+
+
+def open_store(directory, mode="r", memory_budget=2**28):
+    """
+    Open an existing store for reading or appending.
+
+    Parameters
+    ----------
+    directory : str
+        Store directory.
+    mode : str, optional, default="r"
+        "r" to read or "a" to append.
+    memory_budget : int, optional, default=268435456
+        Approximate number of bytes of arrays held in memory at once.
+
+    Returns
+    -------
+    SystemStore
+        The opened store.
+    """
+
+    if mode not in ["r", "a"]:
+        raise ValueError("Mode, {}, is not one of 'r' or 'a'".format(mode))
+
+    return SystemStore(directory, mode=mode, memory_budget=memory_budget)
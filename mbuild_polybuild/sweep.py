@@ -0,0 +1,305 @@
+"""Parameter Sweep Module
+
+This module drives parameter sweeps over monomer libraries, e.g., every combination of ``spacer_backbone``,
+``spacer_ion``, and ``switch_backbone_chiral`` for ``Sbma``, ``Sbaa``, and ``Cbma``. Each configuration is built,
+optionally typed with a forcefield, and written to a file.
+
+Configurations are deduplicated by their cache key, scheduled over a process pool with a bounded number of pending
+tasks, and recorded in a ``manifest.jsonl`` file in the output directory as each one completes.
+
+Functions
+---------
+- expand_grid: Expand a grid definition into unique configurations.
+- sweep: Build, type, and write every configuration in a grid.
+
+Classes
+-------
+- SweepReport: Per-task results, timings, and throughput of a sweep.
+"""
+
+import os
+import json
+import time
+import itertools
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import numpy as np
+
+import mbuild_polybuild.aa_monomers as aa_monomers
+import mbuild_polybuild.cg_monomers as cg_monomers
+import mbuild_polybuild.toolbox as tb
+from mbuild_polybuild.cache import build_key, cached_build
+
+
+def _get_builder(name):
+    """Return the monomer class named ``name`` from ``aa_monomers`` or ``cg_monomers``."""
+
+    for module in (aa_monomers, cg_monomers):
+        if hasattr(module, name):
+            return getattr(module, name)
+
+    raise ValueError("Monomer, {}, is not found in aa_monomers or cg_monomers.".format(name))
+
+
+def expand_grid(grid):
+    """
+    Expand a grid definition into unique configurations.
+
+    Parameters
+    ----------
+    grid : dict or list[dict]
+        Mapping of monomer class names to a dictionary of parameter names and lists of values. Scalar values are
+        treated as a single option. A list of such mappings is combined.
+
+    Returns
+    -------
+    list[tuple]
+        Unique ``(name, kwargs, key)`` tuples, where ``key`` is the cache key of the configuration. Configurations
+        that only differ by explicitly stating a default value are counted once.
+
+    Examples
+    --------
+    >>> grid = {"Sbma": {"spacer_backbone": [1, 2, 3], "spacer_ion": [2, 3], "switch_backbone_chiral": [False, True]}}
+    >>> len(expand_grid(grid))
+    12
+    """
+
+    if isinstance(grid, dict):
+        grid = [grid]
+
+    configurations = []
+    keys = set()
+    for subgrid in grid:
+        for name, parameters in subgrid.items():
+            builder = _get_builder(name)
+            names = list(parameters.keys())
+            values = [val if isinstance(val, (list, tuple)) else [val] for val in parameters.values()]
+            for combination in itertools.product(*values):
+                kwargs = dict(zip(names, combination))
+                key = build_key(builder, kwargs=kwargs)
+                if key not in keys:
+                    keys.add(key)
+                    configurations.append((name, kwargs, key))
+
+    return configurations
+
+
+def _filename(name, kwargs, file_format):
+    """Readable output filename for a configuration."""
+
+    parameters = "_".join("{}-{}".format(key, kwargs[key]) for key in sorted(kwargs))
+    if parameters:
+        return "{}_{}.{}".format(name, parameters, file_format)
+    return "{}.{}".format(name, file_format)
+
+
+def _build_task(name, kwargs, key, output_dir, file_format, forcefield, cache_dir):
+    """Build, optionally type, and write one configuration. Errors are returned rather than raised."""
+
+    result = {"name": name, "kwargs": kwargs, "key": key, "pid": os.getpid(), "path": None, "error": None}
+    timings = {}
+    start = time.perf_counter()
+    try:
+        builder = _get_builder(name)
+        if cache_dir is False:
+            compound = builder(**kwargs)
+        else:
+            compound = cached_build(builder, cache_dir=cache_dir, **kwargs)
+        timings["build"] = time.perf_counter() - start
+        result["n_particles"] = compound.n_particles
+
+        path = os.path.join(output_dir, _filename(name, kwargs, file_format))
+        if forcefield is not None:
+            tmp = time.perf_counter()
+            structure = tb.load_forcefield(forcefield).apply(compound)
+            timings["type"] = time.perf_counter() - tmp
+            tmp = time.perf_counter()
+            structure.save(path, overwrite=True)
+        else:
+            tmp = time.perf_counter()
+            compound.save(path, overwrite=True)
+        timings["write"] = time.perf_counter() - tmp
+        result["path"] = path
+    except Exception as e:
+        result["error"] = "{}: {}".format(type(e).__name__, e)
+
+    timings["total"] = time.perf_counter() - start
+    result["timings"] = timings
+
+    return result
+
+
+class SweepReport:
+    """
+    Per-task results, timings, and throughput of a sweep.
+
+    Parameters
+    ----------
+    results : list[dict]
+        Result of each task in order of completion.
+    elapsed : float
+        Wall time of the sweep in seconds.
+    n_duplicates : int, optional, default=0
+        Number of requested configurations skipped as duplicates.
+
+    Attributes
+    ----------
+    throughput : float
+        Completed tasks per second of wall time.
+    failed : list[dict]
+        Results of tasks that raised an error.
+    """
+
+    def __init__(self, results, elapsed, n_duplicates=0):
+        self.results = results
+        self.elapsed = elapsed
+        self.n_duplicates = n_duplicates
+
+    @property
+    def throughput(self):
+        return len(self.results) / self.elapsed if self.elapsed > 0 else float("inf")
+
+    @property
+    def failed(self):
+        return [result for result in self.results if result["error"] is not None]
+
+    def timings(self, stage="total"):
+        """
+        Array of the time in seconds each successful task spent in ``stage``.
+
+        Parameters
+        ----------
+        stage : str, optional, default="total"
+            One of "build", "type", "write", or "total".
+
+        Returns
+        -------
+        numpy.ndarray
+            Stage timings.
+        """
+
+        return np.array([x["timings"][stage] for x in self.results if x["error"] is None and stage in x["timings"]])
+
+    def summary(self):
+        """
+        Summarize the sweep as a printable table.
+
+        Returns
+        -------
+        str
+            Counts, throughput, and the mean, median, and maximum time per stage.
+        """
+
+        lines = [
+            "Tasks: {}, failed: {}, duplicates skipped: {}".format(
+                len(self.results), len(self.failed), self.n_duplicates
+            ),
+            "Elapsed: {:.2f} s, throughput: {:.2f} tasks/s".format(self.elapsed, self.throughput),
+            "{:>8} {:>10} {:>10} {:>10}".format("stage", "mean (s)", "median (s)", "max (s)"),
+        ]
+        for stage in ["build", "type", "write", "total"]:
+            timings = self.timings(stage)
+            if len(timings) > 0:
+                lines.append(
+                    "{:>8} {:>10.3f} {:>10.3f} {:>10.3f}".format(
+                        stage, np.mean(timings), np.median(timings), np.max(timings)
+                    )
+                )
+
+        return "\n".join(lines)
+
+
+def sweep(
+    grid,
+    output_dir,
+    processes=None,
+    max_pending=None,
+    file_format="mol2",
+    forcefield=None,
+    cache_dir=None,
+    callback=None,
+):
+    """
+    Build, type, and write every configuration in a grid.
+
+    Parameters
+    ----------
+    grid : dict or list[dict]
+        Grid definition, see :func:`expand_grid`.
+    output_dir : str
+        Directory for the output files and ``manifest.jsonl``.
+    processes : int, optional, default=None
+        Number of worker processes. If None, ``os.cpu_count()`` is used. With 1, tasks run in this process.
+    max_pending : int, optional, default=None
+        Maximum number of tasks submitted but not yet completed, bounding memory use for large grids. If None, twice
+        the number of processes is used.
+    file_format : str, optional, default="mol2"
+        Extension of the output files, e.g., "mol2", "pdb", or "gro" (the latter requires a forcefield).
+    forcefield : str, optional, default=None
+        Forcefield file to type each configuration with, see :func:`mbuild_polybuild.toolbox.load_forcefield`. If None,
+        the untyped compound is written.
+    cache_dir : str or bool, optional, default=None
+        Build cache directory, see :func:`mbuild_polybuild.cache.get_cache_dir`. If False, the cache is not used.
+    callback : callable, optional, default=None
+        Function called with each task result as it completes.
+
+    Returns
+    -------
+    SweepReport
+        Results in order of completion, with per-task timing and overall throughput.
+
+    Examples
+    --------
+    >>> grid = {
+    ...     "Sbma": {"spacer_backbone": [1, 2, 3], "spacer_ion": [2, 3]},
+    ...     "Cbma": {"spacer_backbone": [1, 2, 3], "spacer_ion": [1, 2]},
+    ... }
+    >>> report = sweep(grid, "library", processes=8, forcefield="oplsaa.xml")
+    >>> print(report.summary())
+    """
+
+    if processes is None:
+        processes = os.cpu_count() or 1
+    if max_pending is None:
+        max_pending = 2 * processes
+
+    os.makedirs(output_dir, exist_ok=True)
+    configurations = expand_grid(grid)
+    if isinstance(grid, dict):
+        grid = [grid]
+    n_requested = sum(
+        int(np.prod([len(val) if isinstance(val, (list, tuple)) else 1 for val in parameters.values()]))
+        for subgrid in grid
+        for parameters in subgrid.values()
+    )
+
+    results = []
+    start = time.perf_counter()
+    with open(os.path.join(output_dir, "manifest.jsonl"), "a") as manifest:
+
+        def record(result):
+            manifest.write(json.dumps(result) + "\n")
+            manifest.flush()
+            results.append(result)
+            if callback is not None:
+                callback(result)
+
+        tasks = (
+            (name, kwargs, key, output_dir, file_format, forcefield, cache_dir) for name, kwargs, key in configurations
+        )
+        if processes == 1:
+            for task in tasks:
+                record(_build_task(*task))
+        else:
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                pending = set()
+                for task in tasks:
+                    if len(pending) >= max_pending:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            record(future.result())
+                    pending.add(executor.submit(_build_task, *task))
+                for future in wait(pending).done:
+                    record(future.result())
+
+    return SweepReport(results, time.perf_counter() - start, n_duplicates=n_requested - len(configurations))
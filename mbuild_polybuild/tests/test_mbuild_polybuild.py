@@ -2,9 +2,15 @@
 Unit and regression test for the mbuild_polybuild package.
 """
 
+import os
+import json
+import functools
 import pytest
 import sys
+import urllib.error
+import urllib.request
 import mbuild as mb
+import numpy as np
 
 # Import all classes for comprehensive testing
 from mbuild_polybuild.aa_functional_groups import (
@@ -14,9 +20,32 @@ from mbuild_polybuild.aa_functional_groups import (
 from mbuild_polybuild.aa_monomers import (
     Acrylamide, Cbma, Ethylene, Methacrylate, Sbaa, Sbma
 )
-from mbuild_polybuild.aa_fragments import C
+from mbuild_polybuild.aa_fragments import C, Spacer
 from mbuild_polybuild.aa_molecules import MonatomicIon
 from mbuild_polybuild.cg_monomers import Bead, Betaine
+from mbuild_polybuild.analysis import (
+    chain_dimensions, dyad_sequence, find_stereocenters, internal_distances, persistence_length, tacticity
+)
+from mbuild_polybuild.architectures import Bottlebrush, Chain, Comb, Star
+from mbuild_polybuild.arrays import SystemArrays, concatenate, replicate, tile, to_arrays
+from mbuild_polybuild.brush import build_brush, grafting_points
+from mbuild_polybuild.cache import build_key, cached_build, clear_cache, structure_hash
+from mbuild_polybuild.charges import charge_report, clear_charge_cache, counterions, resolve_charges, unit_variants
+from mbuild_polybuild.checkpoint import run_stages
+from mbuild_polybuild.cli import main
+from mbuild_polybuild.conformers import ConformerLibrary, rotate_torsions, torsion_tree
+from mbuild_polybuild.functionalize import functionalize, select_sites, site_ports
+from mbuild_polybuild.gromacs import chain_types, write_gromacs, write_tiled_gromacs
+from mbuild_polybuild.mapping import backmap, build_mapping, monomer_beads
+from mbuild_polybuild.network import build_network, match_sites
+from mbuild_polybuild.polydisperse import build_ensemble, length_statistics, sample_lengths
+from mbuild_polybuild.relax import relax
+from mbuild_polybuild.server import BuildServer, server_status, submit
+from mbuild_polybuild.spec import build_system, load_spec, run_spec
+from mbuild_polybuild.store import SystemStore, open_store
+from mbuild_polybuild.sweep import expand_grid, sweep
+from mbuild_polybuild.topology import perceive_topology
+from mbuild_polybuild.validate import validate_topology
 
 def test_mbuild_polybuild_imported():
     """ Sample test, will always pass so long as import statement worked """
@@ -49,6 +78,8 @@ def test_ammonium_substituents(substituents):
     else:
         instance = Ammonium(substituents=substituents, alkane=[2])
         assert isinstance(instance, mb.Compound)
+        assert len(instance.available_ports()) == 4 - substituents
+        assert instance.n_bonds == instance.n_particles - 1
 
 
 @pytest.mark.parametrize("class_type,params", [
@@ -124,6 +155,19 @@ def test_aa_fragments():
     assert isinstance(c_fragment, mb.Compound)
 
 
+@pytest.mark.parametrize("n", [1, 2, 5, 25])
+def test_spacer_lengths(n):
+    """Test that spacers sliced from the methylene template have the expected topology."""
+
+    spacer = Spacer(n=n)
+    assert spacer.n_particles == 3 * n
+    assert spacer.n_bonds == 3 * n - 1
+    assert len(spacer.available_ports()) == 2
+
+    with pytest.raises(ValueError):
+        Spacer(n=0)
+
+
 @pytest.mark.parametrize("element", ["Na", "K", "Cl"])
 def test_aa_molecules_ion(element):
     """Test MonatomicIon class with different elements."""
@@ -158,3 +202,747 @@ def test_error_handling():
     # Test invalid Betaine polar configuration
     with pytest.raises(ValueError):
         Betaine(spacer_backbone=0, polar_backbone=True)
+
+
+def test_cached_build(tmp_path):
+    """Test that cached builds are reused and keyed on bound arguments."""
+
+    assert build_key(Sbma) == build_key(Sbma, kwargs={"spacer_backbone": 2})
+    assert build_key(Sbma) != build_key(Sbma, kwargs={"switch_backbone_chiral": True})
+
+    first = cached_build(Sbma, spacer_backbone=3, spacer_ion=2, cache_dir=str(tmp_path))
+    second = cached_build(Sbma, spacer_backbone=3, spacer_ion=2, cache_dir=str(tmp_path))
+    assert first is not second
+    assert structure_hash(first) == structure_hash(second)
+    # An entry being written by another process is kept
+    open(tmp_path / ".tmp-writing.pkz", "wb").close()
+    assert clear_cache(str(tmp_path)) == 1
+    assert os.path.exists(tmp_path / ".tmp-writing.pkz")
+
+    def nested():
+        pass
+
+    for value in [lambda: None, nested]:
+        with pytest.raises(TypeError):
+            build_key(mb.Compound, kwargs={"name": value})
+    keys = [build_key(mb.Compound, kwargs={"name": functools.partial(Sbma, spacer_ion=n)}) for n in [2, 3]]
+    assert keys[0] != keys[1]
+
+
+def test_sweep(tmp_path):
+    """Test that a sweep deduplicates configurations and writes each one."""
+
+    grid = [{"Sbma": {"spacer_backbone": [1, 2], "spacer_ion": 2}}, {"Sbma": {"spacer_ion": [2]}}]
+    assert len(expand_grid(grid)) == 2
+
+    report = sweep(grid, str(tmp_path / "library"), processes=1, cache_dir=str(tmp_path / "cache"))
+    assert len(report.results) == 2
+    assert report.n_duplicates == 1
+    assert not report.failed
+    assert all(os.path.isfile(result["path"]) for result in report.results)
+
+
+def test_sweep_processes(tmp_path):
+    """Test that a sweep over a bounded process pool deduplicates configurations and writes the manifest."""
+
+    grid = [{"Sbma": {"spacer_backbone": [1, 2, 3], "spacer_ion": 2}}, {"Sbma": {"spacer_ion": [2]}}]
+    output_dir = tmp_path / "library"
+    report = sweep(grid, str(output_dir), processes=2, max_pending=1, cache_dir=False)
+    assert len(report.results) == 3
+    assert report.n_duplicates == 1
+    assert not report.failed
+    assert all(result["pid"] != os.getpid() for result in report.results)
+    assert all(os.path.isfile(result["path"]) for result in report.results)
+
+    with open(output_dir / "manifest.jsonl") as f:
+        manifest = [json.loads(line) for line in f]
+    assert len(manifest) == 3
+    assert sorted(x["key"] for x in manifest) == sorted(x[2] for x in expand_grid(grid))
+    assert [x["path"] for x in manifest] == [x["path"] for x in report.results]
+
+
+def test_to_arrays():
+    """Test that exported arrays share one buffer and round trip to ParmEd."""
+
+    monomer = Sbma()
+    system = to_arrays(monomer)
+    assert system.positions.shape == (monomer.n_particles, 3)
+    assert system.n_bonds == monomer.n_bonds
+    assert system.positions.base is system.bonds.base
+    assert system.n_monomers == 1 and system.n_chains == 1
+    assert (system.monomer_index == 0).all()
+
+    structure = system.to_parmed()
+    assert len(structure.atoms) == monomer.n_particles
+    assert len(structure.bonds) == monomer.n_bonds
+    assert len(structure.residues) == 1
+
+
+def test_perceive_topology():
+    """Test angle and dihedral perception on isobutane-like and ring-containing bond graphs."""
+
+    # Central atom 0 bonded to 1, 2, 3, with 4 bonded to 1; a duplicate and a self bond are ignored
+    bonds = [[0, 1], [0, 2], [0, 3], [1, 4], [1, 0], [2, 2]]
+    topology = perceive_topology(bonds)
+    assert len(topology["bonds"]) == 4
+    assert sorted(map(tuple, topology["angles"].tolist())) == [(0, 1, 4), (1, 0, 2), (1, 0, 3), (2, 0, 3)]
+    assert sorted(map(tuple, topology["dihedrals"].tolist())) == [(2, 0, 1, 4), (3, 0, 1, 4)]
+    assert topology["impropers"].tolist() == [[0, 1, 2, 3]]
+
+    # Three-membered ring has angles but no proper dihedrals
+    topology = perceive_topology([[0, 1], [1, 2], [2, 0]])
+    assert len(topology["angles"]) == 3
+    assert len(topology["dihedrals"]) == 0
+
+
+@pytest.mark.parametrize("switch", [False, True])
+def test_tacticity(switch):
+    """Test that consecutive monomers with equal chirality switches form meso dyads."""
+
+    first = Methacrylate()
+    second = Methacrylate(chiral_switch=switch)
+    chain = mb.Compound()
+    chain.add(first)
+    chain.add(second)
+    mb.force_overlap(move_this=second, from_positions=second["up"], to_positions=first["down"])
+
+    centers = find_stereocenters(chain)
+    assert len(centers) == 2
+    assert centers.stereogenic.all()
+    assert centers.dyads.tolist() == [[0, 1]]
+
+    stats = tacticity(chain.xyz, centers)
+    assert stats["m"][0] == (0.0 if switch else 1.0)
+    assert dyad_sequence(stats["chirality"][0], centers) == ("r" if switch else "m")
+
+
+def test_chain_matches_force_overlap():
+    """Test that a batched chain matches joining monomers one by one with force_overlap."""
+
+    templates = [Methacrylate(), Methacrylate(chiral_switch=True)]
+    chain = Chain(templates, n=2, sequence="AB")
+    assert chain.sequence == "ABAB"
+
+    reference = mb.Compound()
+    previous = None
+    for i in [0, 1, 0, 1]:
+        monomer = templates[i].clone()
+        reference.add(monomer)
+        if previous is not None:
+            mb.force_overlap(move_this=monomer, from_positions=monomer["up"], to_positions=previous["down"])
+        previous = monomer
+
+    assert chain.n_particles == reference.n_particles
+    assert chain.n_bonds == reference.n_bonds
+    assert np.allclose(chain.xyz, reference.xyz, atol=1e-6)
+
+
+def test_branched_architectures():
+    """Test star, comb, and bottlebrush particle and bond counts."""
+
+    arm = Chain(Bead(name="_B"), n=3)
+    star = Star(Bead(name="_C", Nports=4), arm)
+    assert star.n_particles == 13
+    assert star.n_bonds == 12
+    assert len(star.available_ports()) == 4
+
+    backbone = Chain(Bead(name="_B", Nports=3), n=6)
+    comb = Comb(backbone, Chain(Bead(name="_S"), n=2), graft_port="branch_up", graft_every=2)
+    assert comb.grafted.tolist() == [0, 2, 4]
+    assert comb.n_particles == 12
+    assert comb.n_bonds == 11
+    assert len(comb.available_ports()) == 2 + 3 + 3
+    assert [comb["graft_site"][i].anchor for i in range(3)] == [backbone.monomers[i][0] for i in [1, 3, 5]]
+    assert [comb["side_chain_end"][i].anchor for i in range(3)] == [x.monomers[-1][0] for x in comb.side_chains]
+
+    backbone = Chain(Bead(name="_B", Nports=4), n=4)
+    brush = Bottlebrush(backbone, Bead(name="_S"), graft_port=["branch_up", "branch_down"])
+    assert len(brush.side_chains) == 8
+    assert brush.n_bonds == 3 + 8
+    assert len(brush.available_ports()) == 2 + 8
+    assert "graft_site" not in brush.labels
+
+
+def test_build_network():
+    """Test that crosslinks pair each chain and crosslinker site at most once."""
+
+    pairs = match_sites([[0.0, 0.0, 0.0], [1.0, 0.0, 0.0]], [[0.1, 0.0, 0.0], [0.2, 0.0, 0.0]], cutoff=0.5)
+    assert pairs.tolist() == [[0, 0]]
+
+    chain = Chain(Bead(name="_B"), n=4)
+    network = build_network(chain, Bead(name="_X", Nports=4), 20, 10, box=[3.0, 3.0, 3.0], cutoff=1.0, seed=0)
+    system = network.system
+    assert system.n_particles == 20 * 4 + 10
+    assert system.n_bonds == 20 * 3 + len(network.crosslinks)
+    assert len(np.unique(network.crosslinks[:, 0])) == len(network.crosslinks)
+    assert len(network.unreacted) + 2 * len(network.crosslinks) == 40 + 40
+    assert 0.0 < network.conversion <= 1.0
+
+
+@pytest.mark.parametrize("method", ["fire", "steepest"])
+def test_relax(method):
+    """Test that relaxation separates overlapping molecules while keeping bond lengths."""
+
+    template = SystemArrays(3, 2)
+    assert list(template.monomer_index) == [-1, -1, -1]
+    template.positions[:] = [[0.0, 0.0, 0.0], [0.15, 0.0, 0.0], [0.3, 0.0, 0.0]]
+    template.bonds[:] = [[0, 1], [1, 2]]
+    system = replicate(template, [template.positions, template.positions + [0.05, 0.02, 0.0]])
+    system.box = np.array([3.0, 3.0, 3.0])
+
+    report = relax(system, sigma=0.25, method=method, max_steps=2000)
+    assert report.converged
+    assert report.energies[-1] < report.energies[0]
+
+    positions = system.positions
+    distances = np.linalg.norm(positions[:3, None] - positions[None, 3:], axis=2)
+    assert distances.min() > 0.2
+    bond_lengths = np.linalg.norm(positions[system.bonds[:, 1]] - positions[system.bonds[:, 0]], axis=1)
+    assert np.allclose(bond_lengths, 0.15, atol=0.01)
+
+
+@pytest.mark.parametrize("distribution", ["schulz-zimm", "log-normal", "poisson", "flory"])
+def test_sample_lengths(distribution):
+    """Test that sampled chain lengths are reproducible and match the target averages."""
+
+    lengths = sample_lengths(20000, 40, dispersity=1.5, distribution=distribution, seed=1)
+    assert np.array_equal(lengths, sample_lengths(20000, 40, dispersity=1.5, distribution=distribution, seed=1))
+    assert lengths.min() >= 1
+
+    stats = length_statistics(lengths)
+    expected = {"schulz-zimm": 1.5, "log-normal": 1.5, "poisson": 1 + 1 / 40, "flory": 2 - 1 / 40}[distribution]
+    assert stats["mn"] == pytest.approx(40, rel=0.05)
+    assert stats["dispersity"] == pytest.approx(expected, rel=0.05)
+
+
+def test_build_ensemble():
+    """Test that a polydisperse ensemble matches chains built independently."""
+
+    monomers = [Bead(name="_A"), Bead(name="_B")]
+    sequences = ["AB", "ABAA", "BA"]
+    ensemble = build_ensemble(monomers, sequences=sequences)
+
+    reference = [to_arrays(Chain(monomers, sequence=x)) for x in sequences]
+    assert ensemble.n_particles == sum(x.n_particles for x in reference)
+    assert ensemble.n_bonds == sum(x.n_bonds for x in reference)
+    assert ensemble.n_chains == len(sequences)
+    assert np.allclose(ensemble.positions, np.concatenate([x.positions for x in reference]))
+    assert list(ensemble.names) == [name for x in reference for name in x.names]
+
+    lengths = sample_lengths(50, 10, dispersity=1.2, seed=3)
+    homopolymers = build_ensemble(monomers[0], lengths=lengths)
+    assert np.array_equal(np.bincount(homopolymers.chain_index), lengths)
+
+
+def test_select_sites():
+    """Test site selection by fraction, pattern, and seeded random choice."""
+
+    assert np.array_equal(select_sites(10, pattern="100"), [0, 3, 6, 9])
+    assert np.array_equal(select_sites(10, fraction=0.5), [0, 2, 4, 6, 8])
+    first = select_sites(100, fraction=0.3, random=True, seed=4)
+    assert len(first) == 30
+    assert np.array_equal(first, select_sites(100, fraction=0.3, random=True, seed=4))
+    with pytest.raises(ValueError):
+        select_sites(10, pattern="1x")
+
+
+@pytest.mark.parametrize("group,class_type", [("MEA", MEA), ("MHTA", MHTA), ("TFTB", TFTB)])
+def test_functionalize(group, class_type):
+    """Test that thiol-ene groups are grafted onto the selected ester ports of a methacrylate backbone."""
+
+    chain = Chain(Methacrylate(cap_branch=False), n=10)
+    n_particles, n_bonds = chain.n_particles, chain.n_bonds
+    template = class_type()
+    assert len(site_ports(chain)) == 10
+
+    grafted = functionalize(chain, group, label="port[1]", pattern="10")
+    assert np.array_equal(grafted, [0, 2, 4, 6, 8])
+    assert chain.n_particles == n_particles + 5 * template.n_particles
+    assert chain.n_bonds == n_bonds + 5 * (template.n_bonds + 1)
+    assert len(site_ports(chain, label="port[1]")) == 5
+
+
+@pytest.mark.parametrize("pattern", ["square", "hexagonal", "random"])
+def test_grafting_points(pattern):
+    """Test that grafting points match the target density and minimum distance."""
+
+    points = grafting_points([20.0, 20.0], 0.5, pattern=pattern, min_distance=1.0, seed=1)
+    assert len(points) / 400.0 == pytest.approx(0.5, rel=0.1)
+    assert np.all((points >= 0) & (points < 20.0))
+    delta = points[:, None] - points[None]
+    delta -= 20.0 * np.round(delta / 20.0)
+    distances = np.linalg.norm(delta, axis=2) + np.eye(len(points)) * 100
+    assert distances.min() >= 1.0
+
+
+def test_build_brush():
+    """Test that tethered chains stand up from the surface without contacts."""
+
+    brush = build_brush(
+        Bead(name="_B"),
+        [10.0, 10.0],
+        0.16,
+        lengths=[5, 10] * 8,
+        pattern="square",
+        tether=Bead(name="_S", Nports=1),
+        seed=1,
+    )
+    system = brush.system
+    assert brush.n_chains == 16
+    assert brush.grafting_density == pytest.approx(0.16)
+    assert brush.n_contacts == 0
+    assert system.n_chains == brush.n_chains
+    assert system.n_particles == brush.n_chains + 120
+    assert np.allclose(system.positions[: brush.n_chains, 2], -0.5)
+    assert np.all(system.positions[brush.n_chains :, 2] > 0.0)
+    assert np.allclose(system.positions[brush.anchors, :2], brush.grafting_points)
+
+
+@pytest.mark.parametrize("monomer_type", [Sbma, Sbaa, Cbma])
+def test_build_mapping(monomer_type):
+    """Test that all-atom betaine chains map onto the beads of the coarse-grained model."""
+
+    chain = Chain(monomer_type(), n=3)
+    mapping = build_mapping(chain)
+    reference = to_arrays(Chain(Betaine(spacer_backbone=2, spacer_ion=2), n=3))
+    assert list(mapping.names) == list(reference.names)
+    assert len(mapping.bonds) == reference.n_bonds
+    assert np.allclose(np.asarray(mapping.matrix.sum(axis=1)).ravel(), 1.0)
+    assert mapping.charges.sum() == pytest.approx(to_arrays(chain).charges.sum())
+
+    names, groups = monomer_beads(chain.monomers[0], polar_backbone=True, spacer_backbone=2, spacer_ion=1)
+    assert names == ["_B", "_P", "_BP", "_C", "_BP", "_A"]
+    assert sum(len(x) for x in groups) == chain.monomers[0].n_particles
+
+    system = to_arrays(chain)
+    cation = [i for i, name in enumerate(mapping.names) if name == "_C"][0]
+    atoms = mapping.matrix[cation].indices
+    center = np.average(system.positions[atoms], axis=0, weights=system.masses[atoms])
+    beads = mapping.apply(np.stack([system.positions, system.positions + 1.0]), box=[50.0, 50.0, 50.0])
+    assert np.allclose(beads[0, cation], center)
+    assert np.allclose(beads[1] - beads[0], 1.0)
+
+
+@pytest.mark.parametrize("monomer_type", [Sbma, Cbma])
+def test_backmap(monomer_type):
+    """Test that mapping to beads and back recovers an all-atom chain."""
+
+    chain = Chain(monomer_type(), n=4)
+    system = to_arrays(chain)
+    mapping = build_mapping(chain)
+    cg = mapping.to_system(system.positions)
+
+    result = backmap(cg, monomer_type=monomer_type)
+    assert result.n_particles == system.n_particles
+    assert result.n_bonds == system.n_bonds
+    assert result.n_chains == 1
+    assert list(result.names) == list(system.names)
+    assert np.allclose(result.positions, system.positions, atol=1e-6)
+    assert np.allclose(mapping.apply(result.positions), cg.positions)
+
+    with pytest.raises(ValueError):
+        backmap(to_arrays(Chain(Betaine(spacer_backbone=0), n=2)))
+
+
+def test_backmap_tacticity():
+    """Test that backmapping keeps the backbone handedness of each monomer of a syndiotactic chain."""
+
+    chain = Chain([Sbma(), Sbma(switch_backbone_chiral=True)], n=3, sequence="AB")
+    system = to_arrays(chain)
+    cg = build_mapping(chain).to_system(system.positions)
+
+    result = backmap(cg)
+    centers = find_stereocenters(chain)
+    expected = tacticity(system.positions, centers)
+    stats = tacticity(result.positions, centers)
+    assert expected["rr"][0] == pytest.approx(1.0)
+    assert np.array_equal(stats["meso"], expected["meso"])
+    assert stats["rr"][0] == pytest.approx(1.0)
+    assert np.allclose(result.positions, system.positions, atol=1e-6)
+
+
+def test_chain_dimensions():
+    """Test conformation statistics of straight bead chains, across periodic boundaries, and of built chains."""
+
+    lengths = [10, 5]
+    system = SystemArrays(15, 13, box=[1.0, 5.0, 5.0])
+    x = np.concatenate([np.arange(n) * 0.3 for n in lengths])
+    system.positions[:] = np.column_stack([x, np.repeat([0.0, 1.0], lengths), np.zeros(15)])
+    system.positions[:] %= system.box
+    system.chain_index[:] = np.repeat([0, 1], lengths)
+    system.monomer_index[:] = -1
+    system.masses[:] = 1.0
+
+    stats = chain_dimensions(system)
+    assert list(stats["n_units"]) == lengths
+    assert np.allclose(stats["ree"], [2.7, 1.2])
+    assert np.allclose(stats["rg"], 0.3 * np.sqrt((np.array(lengths) ** 2 - 1) / 12))
+
+    separation, distances = internal_distances(system)
+    assert np.allclose(distances, 0.09 * separation)
+    persistence, correlation = persistence_length(system)
+    assert np.isinf(persistence) and np.allclose(correlation, 1.0)
+
+    frames = chain_dimensions(system, positions=np.stack([system.positions] * 3))
+    assert frames["rg"].shape == (3, 2)
+
+    stats = chain_dimensions(Chain(Sbma(), n=3))
+    assert list(stats["n_units"]) == [3]
+    assert stats["rg"][0] > 0
+
+
+def test_validate_topology():
+    """Test that valence, bond, placeholder, and port problems are reported by monomer."""
+
+    assert validate_topology(Chain(Sbma(), n=3)).ok
+
+    chain = Chain(Methacrylate(cap_branch=False), n=4)
+    report = validate_topology(chain)
+    assert not report.ok
+    assert list(report.monomers()["open_ports"]) == [0, 1, 2, 3]
+    assert validate_topology(chain, allowed_ports=["up", "down", "port[1]"]).ok
+
+    system = to_arrays(Chain(Sbma(), n=3))
+    carbon = int(np.flatnonzero(system.atomic_numbers == 6)[0])
+    hydrogens = np.flatnonzero(system.atomic_numbers == 1)[:5]
+    system = system.add_bonds([[carbon, carbon]] + [[carbon, x] for x in hydrogens] + [list(system.bonds[0][::-1])])
+    system.names[hydrogens[0]] = "No"
+    report = validate_topology(system)
+    particles = report.particles()
+    assert carbon in particles["overbonded"]
+    assert list(particles["self_bonds"]) == [carbon]
+    assert len(report.duplicate_bonds) >= 1
+    assert list(particles["placeholders"]) == [hydrogens[0]]
+    assert system.monomer_index[carbon] in report.monomers()["overbonded"]
+    with pytest.raises(ValueError):
+        validate_topology(system, raise_error=True)
+
+
+def test_write_gromacs(tmp_path):
+    """Test that identical chains share one molecule type and coordinates are written in chain order."""
+
+    sbma = to_arrays(Chain(Sbma(), n=2))
+    cbma = to_arrays(Chain(Cbma(), n=2))
+    offsets = np.arange(3)[:, None, None] * np.array([1.0, 0.0, 0.0])
+    system = concatenate(
+        [replicate(sbma, sbma.positions + offsets), replicate(cbma, cbma.positions + offsets[:2])], box=[4.0, 4.0, 4.0]
+    )
+
+    types, representatives = chain_types(system)
+    assert list(types) == [0, 0, 0, 1, 1]
+    assert list(representatives) == [0, 3]
+
+    top, gro = tmp_path / "system.top", tmp_path / "system.gro"
+    molecules = write_gromacs(system, str(top), str(gro), chunk=7)
+    assert [count for _, count in molecules] == [3, 2]
+    assert open(top).read().count("[ moleculetype ]") == 2
+
+    lines = open(gro).read().splitlines()
+    assert int(lines[1]) == system.n_particles
+    assert len(lines) == system.n_particles + 3
+    xyz = np.array([[float(line[20 + 8 * k : 28 + 8 * k]) for k in range(3)] for line in lines[2:-1]])
+    assert np.allclose(xyz, system.positions, atol=1e-3)
+
+
+def test_spec(tmp_path):
+    """Test that a spec is validated, built with the requested tacticity and ions, and written by the command."""
+
+    spec = {
+        "seed": 1,
+        "output": {"directory": str(tmp_path), "format": "gromacs"},
+        "systems": [
+            {
+                "name": "psbma",
+                "monomers": {"A": {"type": "Sbma", "spacer_ion": 3}},
+                "repeat": 4,
+                "tacticity": "syndiotactic",
+                "n_chains": 3,
+                "ions": {"Na": 2, "Cl": 2},
+                "box": 5.0,
+            }
+        ],
+    }
+    loaded = load_spec(spec)
+    assert loaded["systems"][0]["sequence"] == "A"
+    assert loaded["systems"][0]["box"] == [5.0, 5.0, 5.0]
+    for bad in [{"systems": []}, {"systems": [{"monomers": {"A": "Foo"}, "box": 1.0}]}, {"bogus": 1, **spec}]:
+        with pytest.raises(ValueError):
+            load_spec(bad)
+
+    system = build_system(loaded["systems"][0], seed=1, cache_dir=False)
+    assert system.n_chains == 3 + 4
+    assert system.n_monomers == 12
+    chain = Chain([Sbma(spacer_ion=3), Sbma(spacer_ion=3, switch_backbone_chiral=True)], n=2, sequence="AB")
+    assert system.n_particles == 3 * chain.n_particles + 4
+
+    path = tmp_path / "spec.json"
+    path.write_text(json.dumps(spec))
+    assert main([str(path), "--check"]) == 0
+    assert main([str(path), "--processes", "1", "--no-cache"]) == 0
+    assert (tmp_path / "psbma.top").exists() and (tmp_path / "psbma.gro").exists()
+
+
+def test_run_spec(tmp_path):
+    """Test that every system of a spec is written, with one manifest line per system."""
+
+    spec = {
+        "seed": 2,
+        "output": {"directory": str(tmp_path), "format": "gro"},
+        "systems": [
+            {"name": "chain{}".format(i), "monomers": {"A": "Sbma"}, "repeat": 2, "box": 3.0} for i in range(2)
+        ]
+        + [{"name": "broken", "monomers": {"A": {"type": "Sbma", "spacer_ion": "two"}}, "box": 3.0}],
+    }
+    completed = []
+    report = run_spec(spec, processes=1, cache_dir=False, callback=completed.append)
+    assert [result["name"] for result in report.results] == ["chain0", "chain1", "broken"]
+    assert [result["name"] for result in report.failed] == ["broken"]
+    assert len(completed) == 3
+    for name in ["chain0", "chain1"]:
+        assert (tmp_path / "{}.gro".format(name)).exists()
+
+    manifest = [json.loads(line) for line in (tmp_path / "manifest.jsonl").read_text().splitlines()]
+    assert [result["name"] for result in manifest] == ["chain0", "chain1", "broken"]
+    assert manifest[0]["path"] == str(tmp_path / "chain0.gro")
+    assert manifest[2]["error"] is not None
+
+
+def test_build_server(tmp_path):
+    """Test that a warm build server builds submitted specs and reports its status."""
+
+    server = BuildServer(port=0, processes=1, forcefields=(), monomers=["Sbma"], cache_dir=False).start()
+    try:
+        spec = {
+            "output": {"directory": str(tmp_path), "format": "gro"},
+            "systems": [
+                {"name": "chain{}".format(i), "monomers": {"A": "Sbma"}, "repeat": 2, "box": 3.0} for i in range(2)
+            ],
+        }
+        report = submit(spec, url=server.url)
+        assert not report.failed
+        assert [result["name"] for result in report.results] == ["chain0", "chain1"]
+        assert (tmp_path / "chain1.gro").exists()
+
+        status = server_status(server.url)
+        assert status["n_systems"] == 2
+        assert len(status["worker_pids"]) == 1
+        assert {result["pid"] for result in report.results} == set(status["worker_pids"])
+        with pytest.raises(ValueError):
+            submit({"systems": []}, url=server.url)
+        with pytest.raises(ValueError):
+            submit(dict(spec, systems=[dict(spec["systems"][0], name="../escape")]), url=server.url)
+        with pytest.raises(ValueError):
+            server_status(server.url, token="wrong")
+        assert oct(os.stat(server.token_path).st_mode & 0o777) == "0o600"
+
+        # A cross-origin form post can neither set the token header nor an application/json body
+        request = urllib.request.Request(
+            server.url + "/shutdown",
+            data=b"{}",
+            headers={"Content-Type": "text/plain", "X-Polybuild-Token": server.token},
+            method="POST",
+        )
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(request)
+        assert error.value.code == 415
+    finally:
+        server.close()
+    assert not os.path.exists(server.token_path)
+
+    # A server that was never started closes without waiting for it to serve
+    idle = BuildServer(port=0, processes=1, forcefields=(), cache_dir=False)
+    idle.close()
+    assert not os.path.exists(idle.token_path)
+
+
+def test_checkpoint(tmp_path):
+    """Test that a build interrupted after a stage resumes from its saved arrays."""
+
+    system = to_arrays(Chain(Sbma(), n=3))
+    system.save(str(tmp_path / "system.npz"))
+    loaded = SystemArrays.load(str(tmp_path / "system.npz"))
+    assert np.array_equal(loaded.buffer, system.buffer)
+    assert list(loaded.names) == list(system.names)
+    assert loaded.monomer_names == system.monomer_names
+
+    calls = []
+
+    def shift(arrays):
+        calls.append("shift")
+        if len(calls) == 1:
+            raise RuntimeError("Interrupted")
+        arrays.positions[:] += 1.0
+        return arrays
+
+    stages = [("build", lambda _: to_arrays(Chain(Sbma(), n=3))), ("shift", shift), ("count", lambda x: x.n_particles)]
+    with pytest.raises(RuntimeError):
+        run_stages(stages, str(tmp_path / "checkpoint"), key="a")
+    result, timings, resumed = run_stages(stages, str(tmp_path / "checkpoint"), key="a")
+    assert result == system.n_particles
+    assert resumed == ["build"]
+    assert timings["build"] == 0.0 and set(timings) == {"build", "shift", "count"}
+
+    _, _, resumed = run_stages(stages, str(tmp_path / "checkpoint"), key="a")
+    assert resumed == ["build", "shift", "count"]
+    _, _, resumed = run_stages(stages, str(tmp_path / "checkpoint"), key="b")
+    assert resumed == []
+
+
+def test_system_store(tmp_path):
+    """Test that a store assembled out of core reads back and writes the same files as the in-memory system."""
+
+    sbma = to_arrays(Chain(Sbma(), n=2))
+    ion = to_arrays(MonatomicIon(element="Na"))
+    offsets = np.arange(4)[:, None, None] * np.array([1.0, 0.0, 0.0])
+    system = concatenate(
+        [replicate(sbma, sbma.positions + offsets), replicate(ion, np.full((3, 1, 3), 2.0))], box=[5.0, 5.0, 5.0]
+    )
+
+    with SystemStore(str(tmp_path / "store"), box=[5.0, 5.0, 5.0], memory_budget=1) as store:
+        store.extend(sbma, sbma.positions + offsets)
+        store.append(replicate(ion, np.full((3, 1, 3), 2.0)))
+
+    store = open_store(str(tmp_path / "store"), memory_budget=1)
+    assert (store.n_particles, store.n_chains, store.n_types) == (system.n_particles, 7, 2)
+    assert list(store.chain_types) == [0, 0, 0, 0, 1, 1, 1]
+    assert [block.n_chains for _, block in store.blocks()] == [1] * 7
+    loaded = store.read()
+    assert np.array_equal(loaded.buffer, system.buffer)
+    assert loaded.monomer_names == system.monomer_names
+
+    store.write_gromacs(str(tmp_path / "store.top"), str(tmp_path / "store.gro"))
+    write_gromacs(system, str(tmp_path / "system.top"), str(tmp_path / "system.gro"))
+    assert open(tmp_path / "store.gro").read() == open(tmp_path / "system.gro").read()
+    # Comment lines of the topology include the time it was written
+    top = [[line for line in open(tmp_path / name) if not line.startswith(";")] for name in ["store.top", "system.top"]]
+    assert top[0] == top[1]
+    with pytest.raises(ValueError):
+        store.append(sbma)
+
+
+def test_system_store_reopen(tmp_path):
+    """Test that reopening a store to append discards data written after its metadata, e.g., by a killed process."""
+
+    sbma = to_arrays(Chain(Sbma(), n=2))
+    ion = to_arrays(MonatomicIon(element="Na"))
+    directory = str(tmp_path / "store")
+    with SystemStore(directory, box=[5.0, 5.0, 5.0]) as store:
+        store.append(sbma)
+    metadata = open(os.path.join(directory, "store.json")).read()
+
+    # Data of a second chain reaches the disk, but the process is killed before the metadata is written
+    with open_store(directory, mode="a") as store:
+        store.append(replicate(ion, np.full((1, 1, 3), 1.0)))
+    with open(os.path.join(directory, "store.json"), "w") as f:
+        f.write(metadata)
+
+    with open_store(directory, mode="a") as store:
+        assert (store.n_chains, store.n_types) == (1, 1)
+        assert os.listdir(os.path.join(directory, "types")) == ["0.npz"]
+        store.append(replicate(ion, np.full((1, 1, 3), 2.0)))
+
+    store = open_store(directory)
+    system = concatenate([sbma, replicate(ion, np.full((1, 1, 3), 2.0))], box=[5.0, 5.0, 5.0])
+    loaded = store.read()
+    assert np.array_equal(loaded.buffer, system.buffer)
+    assert list(store.chain_types) == [0, 1]
+    assert np.array_equal(store.representatives().buffer, system.buffer)
+
+
+def test_charges():
+    """Test that charges are resolved once per monomer variant and summed into a net charge report."""
+
+    class ElementCharges:
+        """Forcefield stand-in that charges nitrogen +1, sulfur and chlorine -1, and sodium +1."""
+
+        def __init__(self):
+            self.n_typed = 0
+
+        def apply(self, structure):
+            self.n_typed += len(structure.atoms)
+            for atom in structure.atoms:
+                atom.charge = {7: 1.0, 11: 1.0, 16: -1.0, 17: -1.0}.get(atom.atomic_number, 0.0)
+            return structure
+
+    chain = to_arrays(Chain(Sbma(), n=4))
+    ion = to_arrays(MonatomicIon(element="Na"))
+    offsets = np.arange(3)[:, None, None] * np.array([2.0, 0.0, 0.0])
+    system = concatenate([replicate(chain, chain.positions + offsets), replicate(ion, np.zeros((2, 1, 3)))])
+
+    variants, keys = unit_variants(system)
+    assert len(keys) >= 2 and len(keys) < system.n_monomers
+    assert np.all(variants[: system.n_monomers] >= 0)
+
+    clear_charge_cache()
+    forcefield = ElementCharges()
+    resolve_charges(system, forcefield)
+    assert forcefield.n_typed == chain.n_particles + 1
+    assert np.allclose(system.charges, [{7: 1.0, 11: 1.0, 16: -1.0}.get(x, 0.0) for x in system.atomic_numbers])
+    resolve_charges(system, forcefield)
+    assert forcefield.n_typed == chain.n_particles + 1
+
+    report = charge_report(system)
+    assert len(report.charged_monomers()) == 0
+    assert report.net_charge == pytest.approx(2.0)
+    assert not report.neutral
+    assert report.counterions() == {"Cl": 2}
+    assert counterions(-2.0, cation="Ca") == {"Ca": 1}
+    with pytest.raises(ValueError):
+        counterions(0.5)
+
+
+def test_conformers():
+    """Test that conformers keep bond lengths and port anchors, and are used when grafting and chaining."""
+
+    template = TFTP()
+    system = to_arrays(template)
+    anchor = [i for i, x in enumerate(template.particles()) if x is template.available_ports()[0].anchor]
+    axes, moving = torsion_tree(system.bonds, system.n_particles, fixed=anchor, atomic_numbers=system.atomic_numbers)
+    assert len(axes) > 0
+    assert not np.any(moving[:, anchor])
+
+    rotated = rotate_torsions(system.positions, axes, moving, np.full((4, len(axes)), np.pi / 3))
+    bonds = np.concatenate([system.positions[None], rotated])[:, system.bonds]
+    lengths = np.linalg.norm(bonds[:, :, 0] - bonds[:, :, 1], axis=2)
+    assert np.allclose(lengths, lengths[0])
+    assert np.allclose(rotated[:, anchor], system.positions[anchor])
+
+    library = ConformerLibrary(template, n_conformers=8, seed=1)
+    assert library.positions.shape == (8,) + template.xyz_with_ports.shape
+    assert np.allclose(library.positions[0], template.xyz_with_ports)
+    assert not np.allclose(library.positions[1], library.positions[0])
+    assert len(library.sample(20, rng=1)) == 20
+
+    chain = Chain(Bead(name="_B", Nports=3), n=10)
+    functionalize(chain, "TFTP", label="branch_up", seed=1, conformers=library)
+    assert chain.n_bonds == 10 - 1 + 10 * (template.n_bonds + 1)
+
+    reference = Chain(Sbma(), n=5)
+    chain = Chain(Sbma(), n=5, conformers=4, seed=1)
+    assert chain.n_particles == reference.n_particles
+    assert np.allclose(chain["up"].anchor.pos, reference["up"].anchor.pos)
+    assert np.allclose(chain["down"].anchor.pos, reference["down"].anchor.pos)
+
+
+def test_tile(tmp_path):
+    """Test that tiled copies are shifted by the box and written without building the tiling."""
+
+    sbma = to_arrays(Chain(Sbma(), n=2))
+    ion = to_arrays(MonatomicIon(element="Na"))
+    unit = concatenate([sbma, replicate(ion, np.full((2, 1, 3), 1.0))], box=[2.0, 3.0, 4.0])
+
+    tiled = tile(unit, [2, 1, 3])
+    assert tiled.n_particles == 6 * unit.n_particles
+    assert tiled.n_chains == 6 * unit.n_chains
+    assert np.allclose(tiled.box, [4.0, 3.0, 12.0])
+    assert np.allclose(tiled.positions[unit.n_particles : 2 * unit.n_particles], unit.positions + [0.0, 0.0, 4.0])
+    with pytest.raises(ValueError):
+        tile(unit, [1, 0, 1])
+    with pytest.raises(ValueError):
+        tile(sbma, 2)
+
+    molecules = write_tiled_gromacs(unit, [2, 1, 3], str(tmp_path / "tiled.top"), str(tmp_path / "tiled.gro"))
+    assert molecules == write_gromacs(tiled, str(tmp_path / "system.top"), str(tmp_path / "system.gro"))
+    assert open(tmp_path / "tiled.gro").read() == open(tmp_path / "system.gro").read()
+    top = [[line for line in open(tmp_path / name) if not line.startswith(";")] for name in ["tiled.top", "system.top"]]
+    assert top[0] == top[1]
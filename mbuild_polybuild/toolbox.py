@@ -5,6 +5,8 @@ This module contains helper functions for forming molecules, generating sequence
 Functions
 ---------
 - _import_pdb: Retrieve the file path of a PDB file distributed with mbuild-polybuild.
+- _import_forcefield: Retrieve the file path of a forcefield XML file distributed with mbuild-polybuild.
+- load_forcefield: Load a forcefield once per process.
 - atom2port: Replace specific atom types with ports in a given trajectory.
 - random_sequence: Generate a random copolymer sequence.
 - apply_nbfix: Apply non-bonded interaction fixes to a structure using parameters from a file.
@@ -14,8 +16,10 @@ import os
 import json
 import numpy as np
 from collections import OrderedDict
+from functools import lru_cache
 
 import mbuild as mb
+import foyer
 from foyer.utils.nbfixes import apply_nbfix as foyer_apply_nbfix
 
 import mbuild_polybuild
@@ -45,6 +49,59 @@ def _import_pdb(filename):
     return os.path.join(mbuild_polybuild.__file__[:-12], "_pdb_files", filename)
 
 
+def _import_forcefield(filename):
+    """
+    Retrieve the file path of a forcefield XML file distributed with mbuild-polybuild.
+
+    Parameters
+    ----------
+    filename : str
+        Filename of the desired forcefield.
+
+    Returns
+    -------
+    str
+        Full file path to the forcefield file.
+
+    Examples
+    --------
+    >>> path = _import_forcefield("oplsaa.xml")
+    >>> print(path)
+    "/path/to/forcefields/oplsaa.xml"
+    """
+
+    return os.path.join(mbuild_polybuild.__file__[:-12], "forcefields", filename)
+
+
+@lru_cache(maxsize=None)
+def load_forcefield(filename="oplsaa.xml"):
+    """
+    Load a forcefield once per process.
+
+    Parameters
+    ----------
+    filename : str, optional, default="oplsaa.xml"
+        Path to a forcefield XML file, or the name of one distributed with mbuild-polybuild.
+
+    Returns
+    -------
+    foyer.Forcefield
+        The parsed forcefield. The same object is returned for repeated calls.
+
+    Examples
+    --------
+    >>> ff = load_forcefield("oplsaa.xml")
+    >>> structure = ff.apply(compound)
+    """
+
+    if not os.path.isfile(filename):
+        filename = _import_forcefield(filename)
+        if not os.path.isfile(filename):
+            raise ImportError("File, {}, does not exist.".format(filename))
+
+    return foyer.Forcefield(forcefield_files=filename)
+
+
 def atom2port(Obj, atom_type="NO"):
     """
     Replace specific atom types with ports in the given trajectory.
@@ -114,7 +171,7 @@ def atom2port(Obj, atom_type="NO"):
         Obj.labels = new_labels
 
 
-def random_sequence(Ncopolymers, Nmonomers):
+def random_sequence(Ncopolymers, Nmonomers, seed=None):
     """
     Generate a random copolymer sequence.
 
@@ -124,6 +181,8 @@ def random_sequence(Ncopolymers, Nmonomers):
         Number of distinct copolymers.
     Nmonomers : int
         Number of monomers in the chain.
+    seed : int or numpy.random.Generator, optional, default=None
+        Seed or generator for a reproducible sequence.
 
     Returns
     -------
@@ -140,7 +199,7 @@ def random_sequence(Ncopolymers, Nmonomers):
     copolymer_options = "ABCDEFGHIJK"
     cut_off = 1 / Ncopolymers
 
-    Rng = np.random.default_rng()
+    Rng = np.random.default_rng(seed)
     tmp = Rng.random((Nmonomers,))
     sequence_numbers = tmp // cut_off
     sequence_letters = "".join([copolymer_options[int(x)] for x in sequence_numbers])
@@ -0,0 +1,225 @@
+"""Topology Module
+
+This module perceives angles and proper and improper dihedrals from bond index arrays, such as
+``SystemArrays.bonds`` from :func:`mbuild_polybuild.arrays.to_arrays`. The bond graph is stored as a compressed sparse
+row (CSR) adjacency matrix, and each term is enumerated by expanding its rows with ``numpy.repeat``, so the cost is
+linear in the number of terms rather than a Python loop over atoms.
+
+Functions
+---------
+- adjacency: Symmetric CSR adjacency matrix of a bond array.
+- perceive_angles: Angle index array from a bond array.
+- perceive_dihedrals: Proper dihedral index array from a bond array.
+- perceive_impropers: Improper dihedral index array from a bond array.
+- perceive_topology: Angles, proper dihedrals, and improper dihedrals from a bond array.
+"""
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+
+def _unique_bonds(bonds):
+    """Return bonds as an (M, 2) array with ``i < j``, without self or duplicate bonds."""
+
+    bonds = np.asarray(bonds, dtype=np.int64).reshape(-1, 2)
+    bonds = np.sort(bonds, axis=1)
+    bonds = bonds[bonds[:, 0] != bonds[:, 1]]
+    if len(bonds) == 0:
+        return bonds
+
+    # Deduplicate on a scalar key, which is much faster than ``np.unique(..., axis=0)``
+    stride = int(bonds[:, 1].max()) + 1
+    key = np.unique(bonds[:, 0] * stride + bonds[:, 1])
+
+    return np.column_stack([key // stride, key % stride])
+
+
+def adjacency(bonds, n_particles=None):
+    """
+    Symmetric CSR adjacency matrix of a bond array.
+
+    Parameters
+    ----------
+    bonds : numpy.ndarray
+        Array of shape (M, 2) of particle indices. Self and duplicate bonds are ignored.
+    n_particles : int, optional, default=None
+        Number of particles. If None, one more than the largest index in ``bonds`` is used.
+
+    Returns
+    -------
+    scipy.sparse.csr_matrix
+        Matrix of shape (n_particles, n_particles) with sorted column indices in each row.
+    """
+
+    return _graph(_unique_bonds(bonds), n_particles)
+
+
+def _graph(bonds, n_particles=None):
+    """CSR adjacency matrix of bonds already processed by ``_unique_bonds``."""
+
+    if n_particles is None:
+        n_particles = int(bonds.max()) + 1 if len(bonds) > 0 else 0
+
+    rows = np.concatenate([bonds[:, 0], bonds[:, 1]])
+    cols = np.concatenate([bonds[:, 1], bonds[:, 0]])
+    graph = csr_matrix((np.ones(len(rows), dtype=np.int8), (rows, cols)), shape=(n_particles, n_particles))
+    graph.sort_indices()
+
+    return graph
+
+
+def _expand(rows, graph):
+    """
+    Pair each entry of ``rows`` with every neighbor of that particle.
+
+    Returns the position in ``rows`` and the neighbor index of each pair.
+    """
+
+    indptr, indices = graph.indptr, graph.indices
+    counts = indptr[rows + 1] - indptr[rows]
+    owner = np.repeat(np.arange(len(rows)), counts)
+    start = np.repeat(indptr[rows] - (np.cumsum(counts) - counts), counts)
+
+    return owner, indices[start + np.arange(len(owner))].astype(np.int64)
+
+
+def perceive_angles(bonds, n_particles=None):
+    """
+    Angle index array from a bond array.
+
+    Parameters
+    ----------
+    bonds : numpy.ndarray
+        Array of shape (M, 2) of particle indices.
+    n_particles : int, optional, default=None
+        Number of particles. If None, one more than the largest index in ``bonds`` is used.
+
+    Returns
+    -------
+    numpy.ndarray
+        Array of shape (A, 3) of ``(i, j, k)`` with ``j`` the central particle and ``i < k``, each angle once.
+    """
+
+    return _angles(adjacency(bonds, n_particles))
+
+
+def _angles(graph):
+    """Angles from a CSR adjacency matrix, see :func:`perceive_angles`."""
+
+    indptr, indices = graph.indptr, graph.indices
+    degree = np.diff(indptr)
+
+    # Pair each neighbor entry with the neighbor entries after it in the same row
+    center = np.repeat(np.arange(len(degree)), degree)
+    position = np.arange(len(indices)) - indptr[center]
+    counts = degree[center] - 1 - position
+    first = np.repeat(np.arange(len(indices)), counts)
+    offset = np.arange(len(first)) - np.repeat(np.cumsum(counts) - counts, counts) + 1
+
+    return np.column_stack([indices[first], center[first], indices[first + offset]]).astype(np.int64)
+
+
+def perceive_dihedrals(bonds, n_particles=None):
+    """
+    Proper dihedral index array from a bond array.
+
+    Parameters
+    ----------
+    bonds : numpy.ndarray
+        Array of shape (M, 2) of particle indices.
+    n_particles : int, optional, default=None
+        Number of particles. If None, one more than the largest index in ``bonds`` is used.
+
+    Returns
+    -------
+    numpy.ndarray
+        Array of shape (D, 4) of ``(i, j, k, l)`` with central bond ``j < k``, each dihedral once. Dihedrals with
+        ``i == l``, i.e., through a three-membered ring, are excluded.
+    """
+
+    central = _unique_bonds(bonds)
+    return _dihedrals(_graph(central, n_particles), central)
+
+
+def _dihedrals(graph, central):
+    """Proper dihedrals around each of the ``central`` bonds, see :func:`perceive_dihedrals`."""
+
+    owner, i = _expand(central[:, 0], graph)
+    keep = i != central[owner, 1]
+    owner, i = owner[keep], i[keep]
+
+    second, last = _expand(central[owner, 1], graph)
+    i = i[second]
+    owner = owner[second]
+    j, k = central[owner, 0], central[owner, 1]
+    keep = (last != j) & (last != i)
+
+    return np.column_stack([i[keep], j[keep], k[keep], last[keep]])
+
+
+def perceive_impropers(bonds, n_particles=None):
+    """
+    Improper dihedral index array from a bond array.
+
+    An improper is generated for each particle with exactly three bonded neighbors, e.g., sp2 carbons and nitrogens.
+
+    Parameters
+    ----------
+    bonds : numpy.ndarray
+        Array of shape (M, 2) of particle indices.
+    n_particles : int, optional, default=None
+        Number of particles. If None, one more than the largest index in ``bonds`` is used.
+
+    Returns
+    -------
+    numpy.ndarray
+        Array of shape (I, 4) of ``(center, i, j, k)`` with the neighbors in ascending order.
+    """
+
+    return _impropers(adjacency(bonds, n_particles))
+
+
+def _impropers(graph):
+    """Impropers from a CSR adjacency matrix, see :func:`perceive_impropers`."""
+
+    indptr, indices = graph.indptr, graph.indices
+    centers = np.flatnonzero(np.diff(indptr) == 3)
+    neighbors = indices[indptr[centers][:, None] + np.arange(3)]
+
+    return np.column_stack([centers, neighbors]).astype(np.int64)
+
+
+def perceive_topology(bonds, n_particles=None):
+    """
+    Angles, proper dihedrals, and improper dihedrals from a bond array.
+
+    Parameters
+    ----------
+    bonds : numpy.ndarray
+        Array of shape (M, 2) of particle indices.
+    n_particles : int, optional, default=None
+        Number of particles. If None, one more than the largest index in ``bonds`` is used.
+
+    Returns
+    -------
+    dict
+        Dictionary with keys "bonds", "angles", "dihedrals", and "impropers" of index arrays, see
+        :func:`perceive_angles`, :func:`perceive_dihedrals`, and :func:`perceive_impropers`.
+
+    Examples
+    --------
+    >>> from mbuild_polybuild.arrays import to_arrays
+    >>> system = to_arrays(chain)
+    >>> topology = perceive_topology(system.bonds, system.n_particles)
+    >>> topology["dihedrals"].shape
+    """
+
+    bonds = _unique_bonds(bonds)
+    graph = _graph(bonds, n_particles)
+
+    return {
+        "bonds": bonds,
+        "angles": _angles(graph),
+        "dihedrals": _dihedrals(graph, bonds),
+        "impropers": _impropers(graph),
+    }
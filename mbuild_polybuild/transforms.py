@@ -0,0 +1,277 @@
+"""Transforms Module
+
+This module contains vectorized rigid-body transforms used to place many copies of a template at once instead of
+calling ``mb.force_overlap`` once per copy.
+
+Functions
+---------
+- rigid_transform: Batched, optionally weighted, Kabsch fit between point sets.
+- apply_transform: Apply one or more rigid transforms to point sets.
+- port_transform: Batched equivalent of the transform ``mb.force_overlap`` computes between two ports.
+- batch_force_overlap: Move, bond, and consume ports for many compounds with one batched transform.
+- connect_ports: Bond the anchors of overlapping port pairs and remove both ports.
+- open_ports: Unused ports anywhere in a compound, with the labels they have up to it.
+"""
+
+import numpy as np
+
+
+def rigid_transform(from_points, to_points, weights=None):
+    """
+    Batched Kabsch fit of the rotation and translation mapping ``from_points`` onto ``to_points``.
+
+    Parameters
+    ----------
+    from_points : numpy.ndarray
+        Array of shape (P, 3) or (B, P, 3) with the points to be moved.
+    to_points : numpy.ndarray
+        Array with the same shape as ``from_points`` with the target points.
+    weights : numpy.ndarray, optional, default=None
+        Array of shape (P,) or (B, P) with non-negative weights for each point, e.g., masses.
+
+    Returns
+    -------
+    rotation : numpy.ndarray
+        Array of shape (3, 3) or (B, 3, 3) of proper rotation matrices.
+    translation : numpy.ndarray
+        Array of shape (3,) or (B, 3) such that ``to ~= from @ rotation.T + translation``.
+
+    Examples
+    --------
+    >>> R, t = rigid_transform(template_xyz, target_xyz)
+    >>> fitted = apply_transform(R, t, template_xyz)
+    """
+
+    from_points = np.asarray(from_points, dtype=float)
+    to_points = np.asarray(to_points, dtype=float)
+    if from_points.shape != to_points.shape:
+        raise ValueError(
+            "Shapes of from_points, {}, and to_points, {}, must match.".format(from_points.shape, to_points.shape)
+        )
+
+    single = from_points.ndim == 2
+    if single:
+        from_points = from_points[None]
+        to_points = to_points[None]
+
+    if weights is None:
+        weights = np.ones(from_points.shape[:2])
+    else:
+        weights = np.broadcast_to(np.asarray(weights, dtype=float), from_points.shape[:2])
+    weights = weights / np.sum(weights, axis=1, keepdims=True)
+
+    from_center = np.einsum("bp,bpi->bi", weights, from_points)
+    to_center = np.einsum("bp,bpi->bi", weights, to_points)
+    covariance = np.einsum(
+        "bp,bpi,bpj->bij", weights, from_points - from_center[:, None], to_points - to_center[:, None]
+    )
+
+    U, _, Vt = np.linalg.svd(covariance)
+    # Flip the smallest singular direction where needed so that only proper rotations are returned
+    sign = np.sign(np.linalg.det(np.einsum("bji,bkj->bik", Vt, U)))
+    sign[sign == 0] = 1.0
+    Vt[:, 2, :] *= sign[:, None]
+    rotation = np.einsum("bji,bkj->bik", Vt, U)
+    translation = to_center - np.einsum("bij,bj->bi", rotation, from_center)
+
+    if single:
+        return rotation[0], translation[0]
+    return rotation, translation
+
+
+def apply_transform(rotation, translation, points):
+    """
+    Apply one or more rigid transforms to point sets.
+
+    Parameters
+    ----------
+    rotation : numpy.ndarray
+        Array of shape (3, 3) or (B, 3, 3).
+    translation : numpy.ndarray
+        Array of shape (3,) or (B, 3).
+    points : numpy.ndarray
+        Array of shape (N, 3) or (B, N, 3). A single point set is broadcast across all transforms.
+
+    Returns
+    -------
+    numpy.ndarray
+        Transformed points, of shape (N, 3) for a single transform, otherwise (B, N, 3).
+    """
+
+    rotation = np.asarray(rotation, dtype=float)
+    translation = np.asarray(translation, dtype=float)
+    points = np.asarray(points, dtype=float)
+
+    if rotation.ndim == 2:
+        return points @ rotation.T + translation
+
+    if points.ndim == 2:
+        return np.einsum("bij,nj->bni", rotation, points) + translation[:, None, :]
+    return np.einsum("bij,bnj->bni", rotation, points) + translation[:, None, :]
+
+
+def _port_points(port):
+    """Return the 'up' and 'down' ghost particle positions of a port and the position of its anchor."""
+
+    anchor = port.anchor.pos if port.anchor is not None else port.center
+    return port["up"].xyz_with_ports, port["down"].xyz_with_ports, anchor
+
+
+def port_transform(from_up, from_down, from_anchor, to_up, to_anchor):
+    """
+    Batched equivalent of the transform ``mb.force_overlap`` computes between two ports.
+
+    As in mBuild, both the 'up' and 'down' ghost particles of the moving port are fit onto the 'up' ghost particles
+    of the target port, and the fit that places the two anchors further apart is kept.
+
+    Parameters
+    ----------
+    from_up, from_down : numpy.ndarray
+        Arrays of shape (B, 4, 3) with the ghost particles of the moving ports.
+    from_anchor : numpy.ndarray
+        Array of shape (B, 3) with the anchor positions of the moving ports.
+    to_up : numpy.ndarray
+        Array of shape (B, 4, 3) with the 'up' ghost particles of the target ports.
+    to_anchor : numpy.ndarray
+        Array of shape (B, 3) with the anchor positions of the target ports.
+
+    Returns
+    -------
+    rotation : numpy.ndarray
+        Array of shape (B, 3, 3).
+    translation : numpy.ndarray
+        Array of shape (B, 3).
+    """
+
+    from_anchor = np.asarray(from_anchor, dtype=float)
+    to_anchor = np.asarray(to_anchor, dtype=float)
+
+    rotation_up, translation_up = rigid_transform(from_up, to_up)
+    rotation_down, translation_down = rigid_transform(from_down, to_up)
+
+    anchor_up = np.einsum("bij,bj->bi", rotation_up, from_anchor) + translation_up
+    anchor_down = np.einsum("bij,bj->bi", rotation_down, from_anchor) + translation_down
+    use_down = np.linalg.norm(anchor_down - to_anchor, axis=1) > np.linalg.norm(anchor_up - to_anchor, axis=1)
+
+    rotation = np.where(use_down[:, None, None], rotation_down, rotation_up)
+    translation = np.where(use_down[:, None], translation_down, translation_up)
+
+    return rotation, translation
+
+
+def batch_force_overlap(move_these, from_ports, to_ports, add_bond=True, positions=None):
+    """
+    Move, bond, and consume ports for many compounds with one batched transform.
+
+    This is equivalent to calling ``mb.force_overlap(move_this, from_port, to_port)`` for each triplet, but the
+    transforms are fit together, and compounds that share a template are moved with a single array operation.
+
+    Parameters
+    ----------
+    move_these : list[mb.Compound]
+        Compounds to move.
+    from_ports : list[mb.Port]
+        Port on each compound in ``move_these`` to overlap.
+    to_ports : list[mb.Port]
+        Target port for each compound in ``move_these``.
+    add_bond : bool, optional, default=True
+        If True, bond the port anchors and remove both ports, as ``mb.force_overlap`` does.
+    positions : list[numpy.ndarray], optional, default=None
+        Current ``xyz_with_ports`` of each compound. Compounds cloned from the same template may share the same array
+        object, and they are then transformed together. If None, positions are read from each compound.
+
+    Notes
+    -----
+    All transforms are computed from the current positions before any compound is moved, so the target ports must
+    not belong to compounds moved in the same call.
+
+    Examples
+    --------
+    >>> batch_force_overlap(arms, [arm["up"] for arm in arms], [core["port[0]"], core["port[1]"]])
+    """
+
+    if not (len(move_these) == len(from_ports) == len(to_ports)):
+        raise ValueError("The same number of compounds, from_ports, and to_ports must be provided.")
+    if len(move_these) == 0:
+        return
+
+    from_points = [_port_points(port) for port in from_ports]
+    to_points = [_port_points(port) for port in to_ports]
+    rotation, translation = port_transform(
+        np.array([x[0] for x in from_points]),
+        np.array([x[1] for x in from_points]),
+        np.array([x[2] for x in from_points]),
+        np.array([x[0] for x in to_points]),
+        np.array([x[2] for x in to_points]),
+    )
+
+    if positions is None:
+        positions = [compound.xyz_with_ports for compound in move_these]
+
+    groups = {}
+    for i, xyz in enumerate(positions):
+        groups.setdefault(id(xyz), []).append(i)
+    for indices in groups.values():
+        new_xyz = apply_transform(rotation[indices], translation[indices], positions[indices[0]])
+        for i, xyz in zip(indices, new_xyz):
+            move_these[i].xyz_with_ports = xyz
+
+    if add_bond:
+        connect_ports(from_ports, to_ports)
+
+
+def connect_ports(from_ports, to_ports):
+    """
+    Bond the anchors of overlapping port pairs and remove both ports, as ``mb.force_overlap`` does after moving.
+
+    Parameters
+    ----------
+    from_ports : list[mb.Port]
+        First port of each pair.
+    to_ports : list[mb.Port]
+        Second port of each pair.
+    """
+
+    for from_port, to_port in zip(from_ports, to_ports):
+        from_port.anchor.parent.add_bond((from_port.anchor, to_port.anchor))
+        from_port.anchor.parent.remove(from_port)
+        to_port.anchor.parent.remove(to_port)
+
+
+def open_ports(compound):
+    """
+    Unused ports anywhere in a compound, with the labels they have up to it.
+
+    ``compound.available_ports()`` only returns ports labeled by the compound itself, so the ports of the monomers
+    of a chain are missed. Here every unused port below the compound is returned, with the labels given to it by its
+    parent and each ancestor up to ``compound``, nearest first, e.g., ``["port[3]", "up"]`` for the head of a chain
+    of methacrylates, since a hoisted port keeps its original parent.
+
+    Parameters
+    ----------
+    compound : mb.Compound
+        A monomer, chain, or box of chains.
+
+    Returns
+    -------
+    list[tuple[mb.Port, list[str]]]
+        Each unused port in order of appearance in the compound, and its labels.
+    """
+
+    labels = {}
+    result = []
+    for port in compound.all_ports():
+        if port.used:
+            continue
+        names = []
+        for ancestor in port.ancestors():
+            if id(ancestor) not in labels:
+                labels[id(ancestor)] = {}
+                for key, value in ancestor.labels.items():
+                    labels[id(ancestor)].setdefault(id(value), []).append(key)
+            names.extend(x for x in labels[id(ancestor)].get(id(port), []) if x not in names)
+            if ancestor is compound:
+                break
+        result.append((port, names))
+
+    return result
@@ -0,0 +1,239 @@
+"""Validate Module
+
+This module checks the topology of built monomers, chains, and boxes before they are typed or simulated. Over-bonded
+atoms, self and duplicate bonds, leftover "No" placeholder atoms from ``toolbox.atom2port``, and unbound ports
+otherwise surface as typing failures long after the build.
+
+All checks are one vectorized pass over the bond array of :class:`mbuild_polybuild.arrays.SystemArrays`, and each
+problem is reported with the monomers that contain it.
+
+Functions
+---------
+- validate_topology: Check valence, bonds, placeholders, and open ports of a system.
+
+Classes
+-------
+- TopologyReport: Problems found in a system and the monomers that contain them.
+"""
+
+import numpy as np
+
+from mbuild_polybuild.arrays import to_arrays
+from mbuild_polybuild.transforms import open_ports
+
+# Largest number of bonds for each atomic number, without bond orders a lower count cannot be flagged
+MAX_VALENCE = {
+    1: 1,
+    3: 0,
+    5: 4,
+    6: 4,
+    7: 4,
+    8: 2,
+    9: 1,
+    11: 0,
+    12: 0,
+    14: 4,
+    15: 5,
+    16: 6,
+    17: 1,
+    19: 0,
+    20: 0,
+    35: 1,
+    53: 1,
+}
+
+PLACEHOLDER = "no"
+
+_MAX_VALENCE = np.full(119, -1, dtype=np.int64)
+_MAX_VALENCE[list(MAX_VALENCE)] = list(MAX_VALENCE.values())
+
+
+class TopologyReport:
+    """
+    Problems found in a system and the monomers that contain them.
+
+    Parameters
+    ----------
+    overbonded : numpy.ndarray
+        Indices of particles with more bonds than the valence of their element, see ``MAX_VALENCE``.
+    degree : numpy.ndarray
+        Array of shape (N,) with the number of distinct bonded neighbors of each particle.
+    self_bonds : numpy.ndarray
+        Rows of the bond array that bond a particle to itself.
+    duplicate_bonds : numpy.ndarray
+        Rows of the bond array that repeat an earlier bond, in either order.
+    placeholders : numpy.ndarray
+        Indices of leftover placeholder particles named "No".
+    open_ports : numpy.ndarray
+        Indices of the anchor particles of unbound ports that are not allowed, or -1 for ports without an anchor.
+    port_labels : list[str]
+        Label of each unbound port within its parent compound.
+    monomer_index : numpy.ndarray
+        Array of shape (N,) with the monomer of each particle, see :class:`mbuild_polybuild.arrays.SystemArrays`.
+    bonds : numpy.ndarray
+        Array of shape (M, 2) of the checked bonds.
+
+    Attributes
+    ----------
+    ok : bool
+        True if no problems were found.
+    """
+
+    def __init__(
+        self,
+        overbonded,
+        degree,
+        self_bonds,
+        duplicate_bonds,
+        placeholders,
+        open_ports,
+        port_labels,
+        monomer_index,
+        bonds,
+    ):
+        self.overbonded = np.asarray(overbonded, dtype=np.int64)
+        self.degree = np.asarray(degree, dtype=np.int64)
+        self.self_bonds = np.asarray(self_bonds, dtype=np.int64)
+        self.duplicate_bonds = np.asarray(duplicate_bonds, dtype=np.int64)
+        self.placeholders = np.asarray(placeholders, dtype=np.int64)
+        self.open_ports = np.asarray(open_ports, dtype=np.int64)
+        self.port_labels = list(port_labels)
+        self.monomer_index = np.asarray(monomer_index, dtype=np.int64)
+        self.bonds = np.asarray(bonds, dtype=np.int64).reshape(-1, 2)
+
+    @property
+    def ok(self):
+        return len(self.open_ports) == 0 and not any(len(x) > 0 for x in self.particles().values())
+
+    def particles(self):
+        """
+        Particles involved in each kind of problem.
+
+        Returns
+        -------
+        dict
+            Dictionary with keys "overbonded", "self_bonds", "duplicate_bonds", "placeholders", and "open_ports" of
+            sorted particle indices.
+        """
+
+        anchors = self.open_ports[self.open_ports >= 0]
+        return {
+            "overbonded": self.overbonded,
+            "self_bonds": np.unique(self.bonds[self.self_bonds]),
+            "duplicate_bonds": np.unique(self.bonds[self.duplicate_bonds]),
+            "placeholders": self.placeholders,
+            "open_ports": np.unique(anchors),
+        }
+
+    def monomers(self):
+        """
+        Monomers containing each kind of problem.
+
+        Returns
+        -------
+        dict
+            Dictionary with the keys of :meth:`particles` of sorted monomer indices. Problems on particles outside
+            monomers are reported as -1.
+        """
+
+        return {key: np.unique(self.monomer_index[value]) for key, value in self.particles().items()}
+
+    def __str__(self):
+        if self.ok:
+            return "No topology problems found"
+        lines = []
+        for (key, particles), monomers in zip(self.particles().items(), self.monomers().values()):
+            if len(particles) > 0:
+                lines.append(
+                    "{}: {} particles in monomers {}".format(key.replace("_", " "), len(particles), monomers.tolist())
+                )
+        return "\n".join(lines)
+
+
+def _open_ports(compound, allowed_ports):
+    """Anchor particle indices and labels of unbound ports without an allowed label."""
+
+    index = {id(particle): i for i, particle in enumerate(compound.particles())}
+    anchors, names = [], []
+    for port, labels in open_ports(compound):
+        if any(label in allowed_ports for label in labels):
+            continue
+        anchor = port.anchor
+        anchors.append(-1 if anchor is None else index.get(id(anchor), -1))
+        names.append(labels[-1] if labels else port.name)
+
+    return np.array(anchors, dtype=np.int64), names
+
+
+def validate_topology(system, allowed_ports=("up", "down"), raise_error=False):
+    """
+    Check valence, bonds, placeholders, and open ports of a system.
+
+    Parameters
+    ----------
+    system : mb.Compound or SystemArrays
+        A monomer, chain, or box of chains. Ports are only checked for compounds, since arrays do not store them.
+    allowed_ports : list[str], optional, default=("up", "down")
+        Labels of ports that may remain unbound, by default the head and tail of chains. A port is allowed if it has
+        one of these labels in any compound between it and ``system``, see
+        :func:`mbuild_polybuild.transforms.open_ports`. Use an empty list to report every unbound port.
+    raise_error : bool, optional, default=False
+        If True, a ValueError listing the problems is raised unless the system is valid.
+
+    Returns
+    -------
+    TopologyReport
+        The problems found.
+
+    Examples
+    --------
+    >>> from mbuild_polybuild.aa_monomers import Methacrylate
+    >>> from mbuild_polybuild.architectures import Chain
+    >>> report = validate_topology(Chain(Methacrylate(cap_branch=False), n=10))
+    >>> report.monomers()["open_ports"]
+    """
+
+    if hasattr(system, "chain_index"):
+        arrays = system
+        port_anchors, port_labels = np.zeros(0, dtype=np.int64), []
+    else:
+        arrays = to_arrays(system)
+        port_anchors, port_labels = _open_ports(system, allowed_ports)
+
+    n = arrays.n_particles
+    bonds = arrays.bonds
+    self_bonds = np.flatnonzero(bonds[:, 0] == bonds[:, 1])
+
+    # Duplicates share a scalar key of the sorted pair, the first occurrence is kept
+    ordered = np.sort(bonds, axis=1)
+    key = ordered[:, 0] * max(n, 1) + ordered[:, 1]
+    _, first = np.unique(key, return_index=True)
+    duplicates = np.ones(len(bonds), dtype=bool)
+    duplicates[first] = False
+    duplicates[self_bonds] = False
+    duplicate_bonds = np.flatnonzero(duplicates)
+
+    distinct = np.ones(len(bonds), dtype=bool)
+    distinct[duplicate_bonds] = False
+    distinct[self_bonds] = False
+    degree = np.bincount(ordered[distinct].ravel(), minlength=n)
+    valence = _MAX_VALENCE[np.clip(arrays.atomic_numbers, 0, len(_MAX_VALENCE) - 1)]
+    overbonded = np.flatnonzero((valence >= 0) & (degree > valence))
+
+    placeholders = np.flatnonzero(np.char.lower(arrays.names.astype(str)) == PLACEHOLDER)
+
+    report = TopologyReport(
+        overbonded,
+        degree,
+        self_bonds,
+        duplicate_bonds,
+        placeholders,
+        port_anchors,
+        port_labels,
+        arrays.monomer_index,
+        bonds,
+    )
+    if raise_error and not report.ok:
+        raise ValueError("Invalid topology\n{}".format(report))
+
+    return report